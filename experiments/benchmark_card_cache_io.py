@@ -0,0 +1,83 @@
+"""Benchmark the number of bytes of file I/O per consumed card for each card cache.
+
+The bytes are measured using the `rchar` and `wchar` counters in /proc/self/io, so this
+benchmark only runs on Linux. Run it with:
+
+    INIT_PHRASIFY_ADDON=false python experiments/benchmark_card_cache_io.py
+"""
+
+import asyncio
+import tempfile
+from pathlib import Path
+
+from phrasify.caches.append_log import AppendLogCardCache
+from phrasify.caches.json_file import JSONFileCardCache
+from phrasify.card import TranslationCard
+
+N_CARDS = [5, 20, 100]
+CARD = TranslationCard(source="friend", target="друг")
+
+
+def read_io_counters():
+    counters = {}
+    with open("/proc/self/io") as f:
+        for line in f:
+            key, value = line.split(":")
+            counters[key] = int(value)
+    return counters["rchar"], counters["wchar"]
+
+
+def make_cards(n_cards: int):
+    return [
+        TranslationCard(
+            source=f"She has had many good friends since she was a child ({i}).",
+            target=f"У неї було багато хороших друзів з дитинства ({i}).",  # noqa: RUF001
+        )
+        for i in range(n_cards)
+    ]
+
+
+async def measure(card_cache, n_cards: int):
+    """Fill the cache with `n_cards` cards, then consume them one by one."""
+    cards = make_cards(n_cards)
+
+    rchar, wchar = read_io_counters()
+    await card_cache.extend("bench", CARD, cards)
+    rchar_extend, wchar_extend = read_io_counters()
+
+    for _ in range(n_cards):
+        await card_cache.popleft("bench", CARD)
+        await card_cache.count("bench", CARD)
+    rchar_pop, wchar_pop = read_io_counters()
+
+    return {
+        "extend_read": rchar_extend - rchar,
+        "extend_written": wchar_extend - wchar,
+        "pop_read_per_card": (rchar_pop - rchar_extend) / n_cards,
+        "pop_written_per_card": (wchar_pop - wchar_extend) / n_cards,
+    }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        caches = {
+            "json": JSONFileCardCache(directory=Path(tmp_dir)),
+            "log": AppendLogCardCache(directory=Path(tmp_dir)),
+        }
+        print(
+            f"{'cache':<6} {'n_cards':>8} {'read/card':>10} {'written/card':>13} "
+            f"{'extend read':>12} {'extend written':>15}"
+        )
+        for n_cards in N_CARDS:
+            for cache_name, card_cache in caches.items():
+                result = asyncio.run(measure(card_cache, n_cards))
+                print(
+                    f"{cache_name:<6} {n_cards:>8} "
+                    f"{result['pop_read_per_card']:>10.0f} "
+                    f"{result['pop_written_per_card']:>13.0f} "
+                    f"{result['extend_read']:>12} {result['extend_written']:>15}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark the latency of OpenAI's async calls with a new HTTP session for every
+call, versus the long-lived session that reuses its connections.
+
+The calls go to a local mock of the chat completions endpoint, so the difference is
+only the cost of opening a connection on the loopback interface. Against the real API,
+every new connection also pays for a DNS lookup and a TLS handshake, which adds tens
+to hundreds of milliseconds per call. Run it with:
+
+    INIT_PHRASIFY_ADDON=false python experiments/benchmark_openai_session.py
+"""
+
+import asyncio
+import time
+
+from aiohttp import web
+
+from phrasify.llms.openai import OpenAI
+from phrasify.sessions import ClientSessionPool
+
+N_CALLS = 200
+COMPLETION = {"choices": [{"message": {"content": "Hello, world!"}}]}
+
+
+async def handle_completion(request: web.Request) -> web.Response:
+    await request.json()
+    return web.json_response(COMPLETION)
+
+
+async def measure_new_session_per_call(url: str) -> float:
+    """Average seconds per call when every call opens and closes its own session."""
+    start = time.perf_counter()
+    for _ in range(N_CALLS):
+        llm = OpenAI(api_key="sk-xxx", url=url, sessions=ClientSessionPool())
+        await llm.acall("How are you?")
+        await llm.sessions.close()
+    return (time.perf_counter() - start) / N_CALLS
+
+
+async def measure_pooled_session(url: str) -> float:
+    """Average seconds per call when all calls share the session of the loop."""
+    llm = OpenAI(api_key="sk-xxx", url=url)
+    await llm.acall("How are you?")  # Open the connection before measuring
+
+    start = time.perf_counter()
+    for _ in range(N_CALLS):
+        await llm.acall("How are you?")
+    elapsed = time.perf_counter() - start
+
+    await llm.sessions.close()
+    return elapsed / N_CALLS
+
+
+async def run_benchmark():
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", handle_completion)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    url = f"http://{host}:{port}/v1/chat/completions"
+
+    try:
+        new_session = await measure_new_session_per_call(url)
+        pooled_session = await measure_pooled_session(url)
+    finally:
+        await runner.cleanup()
+
+    print(f"{'session':<12} {'ms/call':>8}")
+    print(f"{'per call':<12} {new_session * 1000:>8.2f}")
+    print(f"{'pooled':<12} {pooled_session * 1000:>8.2f}")
+    print(f"Saved {(new_session - pooled_session) * 1000:.2f} ms per call")
+
+
+def main():
+    asyncio.run(run_benchmark())
+
+
+if __name__ == "__main__":
+    main()
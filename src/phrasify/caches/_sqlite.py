@@ -0,0 +1,28 @@
+import asyncio
+import sqlite3
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def connect(path: Path, schema: str) -> sqlite3.Connection:
+    """Open a connection to the SQLite database at `path`, creating the database and
+    its `schema` if necessary.
+
+    The database is put in write-ahead logging mode. The connection can be used from
+    any thread, so the callers must serialize its use, and it doesn't start
+    transactions implicitly.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(schema)
+    return connection
+
+
+async def run_in_executor(func: Callable[..., T], *args: Any) -> T:
+    """Run the blocking database operation in the default executor."""
+    return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
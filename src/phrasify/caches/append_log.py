@@ -0,0 +1,188 @@
+import json
+import os
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Iterable, Optional, Tuple
+
+import aiofiles
+import aiofiles.os as aos
+
+from ..card import TranslationCard
+from .files import FileCardCache
+
+# Each state record holds the byte offset of the first unconsumed card in the log and
+# the number of unconsumed cards, both as 16 hexadecimal digits.
+_RECORD_SIZE = 32
+
+
+def _encode_state(offset: int, n_cards: int) -> bytes:
+    return f"{offset:016x}{n_cards:016x}".encode()
+
+
+def _decode_state(record: bytes) -> Tuple[int, int]:
+    return int(record[:16], 16), int(record[16:], 16)
+
+
+def _encode_cards(cards: Iterable[TranslationCard]) -> bytes:
+    return b"".join(f"{card.to_json()}\n".encode() for card in cards)
+
+
+@dataclass
+class AppendLogCardCache(FileCardCache):
+    """Card cache that stores the cards for each (name, card) in an append-only log.
+
+    The cards are appended as JSON lines to a `.log` file. A separate `.offset` file
+    keeps track of which cards were consumed: every change appends a fixed-size record
+    with the byte offset of the first unconsumed card in the log and the number of
+    unconsumed cards. Consuming or adding cards is therefore a constant amount of I/O,
+    no matter how many cards are in the cache.
+
+    Once the consumed part of the log or the offset file exceeds `compact_bytes`, the
+    remaining cards are moved to a fresh log. When all cards are consumed, both files
+    are simply truncated.
+    """
+
+    suffix = ".log"
+    incremental = True
+
+    compact_bytes: int = 64 * 1024
+
+    def get_paths(self, name: str, card: TranslationCard) -> Tuple[Path, Path]:
+        """Get the paths to the log file and the offset file."""
+        log_path = self.get_entry_path(name, card, self.suffix)
+        return log_path, log_path.with_suffix(".offset")
+
+    async def _read_state(self, offset_path: Path) -> Tuple[int, int, int]:
+        """Read the last state record from the offset file.
+
+        Returns the offset of the first unconsumed card in the log, the number of
+        unconsumed cards and the size of the offset file.
+        """
+        try:
+            async with aiofiles.open(offset_path, "rb") as f:
+                size = await f.seek(0, os.SEEK_END)
+                # Ignore a partially written record at the end of the file
+                n_records = size // _RECORD_SIZE
+                if n_records == 0:
+                    return 0, 0, size
+                await f.seek((n_records - 1) * _RECORD_SIZE)
+                record = await f.read(_RECORD_SIZE)
+        except FileNotFoundError:
+            return 0, 0, 0
+
+        offset, n_cards = _decode_state(record)
+        return offset, n_cards, size
+
+    async def _append_state(self, offset_path: Path, offset: int, n_cards: int):
+        async with aiofiles.open(offset_path, "ab") as f:
+            await f.write(_encode_state(offset, n_cards))
+
+    async def _reset(
+        self,
+        name: str,
+        card: TranslationCard,
+        content: bytes,
+        n_cards: int,
+    ):
+        """Replace the log with the given content and reset the offset file."""
+        log_path, offset_path = self.get_paths(name, card)
+        await self._prepare_entry(name, card)
+        tmp_log_path = log_path.with_suffix(".log.tmp")
+        async with aiofiles.open(tmp_log_path, "wb") as f:
+            await f.write(content)
+        await aos.replace(tmp_log_path, log_path)
+        async with aiofiles.open(offset_path, "wb") as f:
+            await f.write(_encode_state(0, n_cards))
+
+    async def _read_unconsumed(self, log_path: Path, offset: int) -> bytes:
+        try:
+            async with aiofiles.open(log_path, "rb") as f:
+                await f.seek(offset)
+                return await f.read()
+        except FileNotFoundError:
+            return b""
+
+    async def get(self, name: str, card: TranslationCard) -> Deque[TranslationCard]:
+        """Get the cards from the cache, if they exist."""
+        log_path, offset_path = self.get_paths(name, card)
+        offset, n_cards, _ = await self._read_state(offset_path)
+        if n_cards == 0:
+            return deque()
+
+        content = await self._read_unconsumed(log_path, offset)
+        lines = content.splitlines()[:n_cards]
+        return deque(
+            TranslationCard.from_dict(json.loads(line)) for line in lines if line
+        )
+
+    async def write(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Write the cards to the cache, replacing the cards that were there."""
+        cards = list(cards)
+        await self._reset(name, card, _encode_cards(cards), len(cards))
+
+    async def extend(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Append the cards to the log."""
+        cards = list(cards)
+        if not cards:
+            return
+
+        log_path, offset_path = self.get_paths(name, card)
+        offset, n_cards, _ = await self._read_state(offset_path)
+        await self._prepare_entry(name, card)
+        async with aiofiles.open(log_path, "ab") as f:
+            await f.write(_encode_cards(cards))
+        await self._append_state(offset_path, offset, n_cards + len(cards))
+
+    async def popleft(
+        self, name: str, card: TranslationCard
+    ) -> Optional[TranslationCard]:
+        """Consume the first card by reading it from the log and moving the offset."""
+        log_path, offset_path = self.get_paths(name, card)
+        offset, n_cards, state_size = await self._read_state(offset_path)
+        if n_cards == 0:
+            return None
+
+        async with aiofiles.open(log_path, "rb") as f:
+            await f.seek(offset)
+            line = await f.readline()
+
+        first_card = TranslationCard.from_dict(json.loads(line))
+        offset += len(line)
+        n_cards -= 1
+
+        if n_cards == 0:
+            # Nothing left to keep, so start from scratch without copying anything
+            await self._reset(name, card, b"", 0)
+        elif offset >= self.compact_bytes or state_size >= self.compact_bytes:
+            await self.compact(name, card, offset=offset, n_cards=n_cards)
+        else:
+            await self._append_state(offset_path, offset, n_cards)
+
+        return first_card
+
+    async def count(self, name: str, card: TranslationCard) -> int:
+        """Count the number of unconsumed cards, reading only the offset file."""
+        _, offset_path = self.get_paths(name, card)
+        _, n_cards, _ = await self._read_state(offset_path)
+        return n_cards
+
+    async def compact(
+        self,
+        name: str,
+        card: TranslationCard,
+        offset: Optional[int] = None,
+        n_cards: Optional[int] = None,
+    ):
+        """Move the unconsumed cards to a fresh log and reset the offset file."""
+        log_path, offset_path = self.get_paths(name, card)
+        if offset is None or n_cards is None:
+            offset, n_cards, _ = await self._read_state(offset_path)
+
+        content = await self._read_unconsumed(log_path, offset)
+        lines = content.splitlines(keepends=True)[:n_cards]
+        await self._reset(name, card, b"".join(lines), len(lines))
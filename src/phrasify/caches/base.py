@@ -0,0 +1,81 @@
+from abc import ABC, abstractmethod
+from typing import Deque, Hashable, Iterable, Optional
+
+from ..card import TranslationCard
+
+
+class CardCache(ABC):
+    """Base CardCache abstract class.
+
+    A card cache stores a queue of generated cards for each (name, card) pair. Here
+    `name` identifies the card generator (and its configuration) that generated the
+    cards and `card` is the input card that they were generated from.
+    """
+
+    # Whether `extend` and `popleft` only touch the cards that are added or taken,
+    # instead of rewriting all cards of the entry
+    incremental = False
+
+    def get_key(self, name: str, card: TranslationCard) -> Hashable:
+        """Get a key that uniquely identifies the cached cards for (name, card).
+
+        The key is used to share locks and tasks between users of the same cache entry.
+        """
+        return (name, card)
+
+    @abstractmethod
+    async def get(self, name: str, card: TranslationCard) -> Deque[TranslationCard]:
+        """Get the cards from the cache, if they exist."""
+
+    @abstractmethod
+    async def write(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Write the cards to the cache, replacing the cards that were there."""
+
+    async def extend(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Add the cards to the end of the cache."""
+        cached_cards = await self.get(name, card)
+        cached_cards.extend(cards)
+        await self.write(name, card, cached_cards)
+
+    async def popleft(
+        self, name: str, card: TranslationCard
+    ) -> Optional[TranslationCard]:
+        """Remove the first card from the cache and return it.
+
+        Returns None if there are no cards in the cache.
+        """
+        cached_cards = await self.get(name, card)
+        if not cached_cards:
+            return None
+
+        first_card = cached_cards.popleft()
+        await self.write(name, card, cached_cards)
+        return first_card
+
+    async def count(self, name: str, card: TranslationCard) -> int:
+        """Count the number of cards in the cache."""
+        cached_cards = await self.get(name, card)
+        return len(cached_cards)
+
+    async def claim_refill(
+        self, name: str, card: TranslationCard, ttl: float = 60.0  # noqa: ARG002
+    ) -> bool:
+        """Claim the right to generate new cards for (name, card), until released or
+        for at most `ttl` seconds. Returns False if someone else holds the claim.
+
+        Caches that are shared between processes use this to avoid generating cards
+        for the same (name, card) in several processes at once. By default, the claim
+        is always granted.
+        """
+        return True
+
+    async def release_refill(self, name: str, card: TranslationCard) -> None:
+        """Release a claim on generating new cards for (name, card)."""
+
+    @abstractmethod
+    def clear(self, name: str) -> None:
+        """Clear all cards that were cached under the given name."""
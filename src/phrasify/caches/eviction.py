@@ -0,0 +1,297 @@
+import asyncio
+import heapq
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+from ..logging import get_logger
+from .files import get_name_directory_name
+
+logger = get_logger(__name__)
+
+# Suffixes of the files that belong to a cache entry in a file-based card cache
+CACHE_FILE_SUFFIXES = (".json", ".log", ".offset")
+
+
+@dataclass
+class EvictionPolicy:
+    """Policy that decides which entries to evict from a file-based card cache.
+
+    Parameters
+    ----------
+    max_total_bytes : Optional[int]
+        Maximum total size of all entries. The least recently used entries are evicted
+        until the cache fits.
+    max_entries : Optional[int]
+        Maximum number of entries. The least recently used entries are evicted until
+        there are at most this many.
+    ttl : Dict[str, float]
+        Time to live in seconds for the entries of each card generator name. Entries
+        that have not been used for longer are evicted.
+    default_ttl : Optional[float]
+        Time to live in seconds for entries whose name is not in `ttl`.
+    """
+
+    max_total_bytes: Optional[int] = None
+    max_entries: Optional[int] = None
+    ttl: Dict[str, float] = field(default_factory=dict)
+    default_ttl: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "EvictionPolicy":
+        """Create an EvictionPolicy from the `cacheEviction` section of the config."""
+        max_size_mb = config.get("maxSizeMB")
+        ttl_days = dict(config.get("ttlDays") or {})
+        default_ttl_days = ttl_days.pop("*", None)
+        return cls(
+            max_total_bytes=None if max_size_mb is None else int(max_size_mb * 2**20),
+            max_entries=config.get("maxEntries"),
+            ttl={name: days * 24 * 60 * 60 for name, days in ttl_days.items()},
+            default_ttl=(
+                None if default_ttl_days is None else default_ttl_days * 24 * 60 * 60
+            ),
+        )
+
+    @property
+    def is_bounded(self) -> bool:
+        """Whether the policy evicts anything at all."""
+        return (
+            self.max_total_bytes is not None
+            or self.max_entries is not None
+            or bool(self.ttl)
+            or self.default_ttl is not None
+        )
+
+    def get_ttl(self, name_directory_name: str) -> Optional[float]:
+        """Get the time to live for the entries in the directory of a card generator
+        name, see `get_name_directory_name`."""
+        for name, ttl in self.ttl.items():
+            if get_name_directory_name(name) == name_directory_name:
+                return ttl
+
+        return self.default_ttl
+
+
+@dataclass
+class _IndexedEntry:
+    paths: Set[Path]
+    size: int
+    last_access: float
+
+
+def _iter_files(directory: Path) -> Iterator[os.DirEntry]:
+    """Lazily iterate over the files in the directory and its subdirectories."""
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _iter_files(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+    except FileNotFoundError:
+        return
+
+
+@dataclass
+class CacheEvictor:
+    """Evicts entries from a file-based card cache according to an EvictionPolicy.
+
+    The evictor keeps an index of the entries in `directory`, which it builds up
+    incrementally by scanning `batch_size` files every `step_interval` seconds in the
+    background. The last access time of an entry is the last time that one of its
+    files was modified, which happens every time a card is taken from the cache. After
+    every full pass over the directory, the expired entries and the least recently
+    used entries beyond the size limits are removed.
+    """
+
+    directory: Path
+    policy: EvictionPolicy
+    batch_size: int = 200
+    step_interval: float = 1.0
+    pass_interval: float = 60.0
+    _index: Dict[Path, _IndexedEntry] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _seen: Set[Path] = field(default_factory=set, init=False, repr=False)
+    _scanner: Optional[Iterator[os.DirEntry]] = field(
+        default=None, init=False, repr=False
+    )
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+    _task: Optional[asyncio.Task] = field(default=None, init=False, repr=False)
+
+    @property
+    def n_entries(self) -> int:
+        """Number of entries in the index."""
+        return len(self._index)
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of the entries in the index."""
+        return sum(entry.size for entry in self._index.values())
+
+    def step(self) -> bool:
+        """Scan the next batch of files. Returns True if a full pass was completed,
+        in which case entries have been evicted where necessary."""
+        with self._lock:
+            if self._scanner is None:
+                self._scanner = _iter_files(self.directory)
+                self._seen = set()
+
+            for _ in range(self.batch_size):
+                try:
+                    dir_entry = next(self._scanner)
+                except StopIteration:
+                    break
+                self._add_to_index(dir_entry)
+            else:
+                return False
+
+            # Forget the entries that were removed by someone else since the last pass
+            for key in set(self._index) - self._seen:
+                del self._index[key]
+            self._scanner = None
+
+            self._evict()
+            return True
+
+    def _add_to_index(self, dir_entry: os.DirEntry):
+        path = Path(dir_entry.path)
+        if path.suffix not in CACHE_FILE_SUFFIXES:
+            return
+
+        try:
+            stat = dir_entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            return
+
+        key = path.with_suffix("")
+        if key not in self._seen:
+            # Start counting the size of the entry from scratch in this pass
+            self._seen.add(key)
+            self._index[key] = _IndexedEntry(
+                paths=set(), size=0, last_access=stat.st_mtime
+            )
+
+        entry = self._index[key]
+        entry.paths.add(path)
+        entry.size += stat.st_size
+        entry.last_access = max(entry.last_access, stat.st_mtime)
+
+    def _refresh(self, key: Path) -> Optional[_IndexedEntry]:
+        """Refresh the size and last access of the entry right before evicting it."""
+        entry = self._index[key]
+        paths = set()
+        size = 0
+        last_access = 0.0
+        for path in entry.paths:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            paths.add(path)
+            size += stat.st_size
+            last_access = max(last_access, stat.st_mtime)
+
+        if not paths:
+            del self._index[key]
+            return None
+
+        entry.paths, entry.size, entry.last_access = paths, size, last_access
+        return entry
+
+    def _remove(self, key: Path):
+        entry = self._index.pop(key)
+        # Remove the offset file before the log, so that a concurrent reader sees an
+        # empty cache rather than a missing log.
+        for path in sorted(entry.paths, key=lambda p: p.suffix != ".offset"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        logger.debug(f"Evicted cache entry {key.name}")
+
+    def _evict(self):
+        now = time.time()
+        n_evicted = 0
+
+        for key in list(self._index):
+            ttl = self.policy.get_ttl(key.relative_to(self.directory).parts[0])
+            if ttl is None or now - self._index[key].last_access <= ttl:
+                continue
+            entry = self._refresh(key)
+            if entry is not None and now - entry.last_access > ttl:
+                self._remove(key)
+                n_evicted += 1
+
+        # Keep track of the total size while evicting, instead of summing the sizes
+        # of all entries after every eviction
+        total_bytes = self.total_bytes
+
+        def is_too_big():
+            return (
+                self.policy.max_entries is not None
+                and len(self._index) > self.policy.max_entries
+            ) or (
+                self.policy.max_total_bytes is not None
+                and total_bytes > self.policy.max_total_bytes
+            )
+
+        if is_too_big():
+            lru_heap: List = [
+                (entry.last_access, str(key), key) for key, entry in self._index.items()
+            ]
+            heapq.heapify(lru_heap)
+            while lru_heap and is_too_big():
+                last_access, _, key = heapq.heappop(lru_heap)
+                if key not in self._index:
+                    continue
+                indexed_size = self._index[key].size
+                entry = self._refresh(key)
+                if entry is None:
+                    total_bytes -= indexed_size
+                    continue
+                total_bytes += entry.size - indexed_size
+                if entry.last_access > last_access:
+                    # Used since it was indexed, so look at it again later
+                    heapq.heappush(lru_heap, (entry.last_access, str(key), key))
+                    continue
+                self._remove(key)
+                total_bytes -= entry.size
+                n_evicted += 1
+
+        if n_evicted > 0:
+            logger.info(f"Evicted {n_evicted} entries from the card cache")
+
+    def run_pass(self):
+        """Scan all files and evict the entries where necessary, blocking until
+        done."""
+        while not self.step():
+            pass
+
+    async def run(self):
+        """Keep evicting entries in the background."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                completed_pass = await loop.run_in_executor(None, self.step)
+            except Exception:
+                logger.exception("Error while evicting entries from the card cache")
+                completed_pass = True
+
+            await asyncio.sleep(
+                self.pass_interval if completed_pass else self.step_interval
+            )
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start evicting entries in the background on the given event loop."""
+
+        def create_task():
+            if self._task is None or self._task.done():
+                self._task = loop.create_task(self.run())
+
+        loop.call_soon_threadsafe(create_task)
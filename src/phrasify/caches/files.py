@@ -0,0 +1,148 @@
+import hashlib
+import json
+import re
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import ClassVar, Dict, Iterator, List, Set, Tuple
+
+import aiofiles
+import aiofiles.os as aos
+
+from ..card import TranslationCard
+from ..constants import GENERATED_CARDS_DIR
+from .base import CardCache
+
+INDEX_FILE_NAME = "index.jsonl"
+
+
+def get_cache_digest(name: str, card: TranslationCard) -> str:
+    """Get a stable digest of the card generator name and the card.
+
+    The digest is used as the file name of the cached cards, so that it has a fixed
+    length and only contains characters that are valid in a path.
+    """
+    content = json.dumps([name, card.source, card.target], ensure_ascii=False)
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
+def get_name_directory_name(name: str) -> str:
+    """Get the name of the directory for the cards cached under the given name.
+
+    Characters that may be invalid in a path are replaced. In that case, a digest of
+    the name is added so that different names never share a directory.
+    """
+    directory_name = re.sub(r"[^A-Za-z0-9._-]", "_", name)
+    if directory_name != name:
+        name_digest = hashlib.blake2b(name.encode(), digest_size=4).hexdigest()
+        directory_name = f"{directory_name}-{name_digest}"
+    return directory_name
+
+
+@dataclass
+class FileCardIndex:
+    """Index that maps the digests of the cached cards to the input cards, per card
+    generator name.
+
+    For each name, the index is an append-only JSON lines file in the directory of that
+    name. It only grows when cards are cached for a new input card.
+    """
+
+    directory: Path = GENERATED_CARDS_DIR
+    _digests: Dict[str, Set[str]] = field(default_factory=dict, init=False, repr=False)
+
+    def get_path(self, name: str) -> Path:
+        """Get the path to the index file for the given name."""
+        return self.directory / get_name_directory_name(name) / INDEX_FILE_NAME
+
+    def iter_entries(self, name: str) -> Iterator[Tuple[str, TranslationCard]]:
+        """Iterate over the (digest, card) pairs in the index for the given name."""
+        try:
+            with open(self.get_path(name), encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Partially written line
+                continue
+            yield entry["digest"], TranslationCard.from_dict(entry["card"])
+
+    def _get_digests(self, name: str) -> Set[str]:
+        if name not in self._digests:
+            self._digests[name] = {digest for digest, _ in self.iter_entries(name)}
+        return self._digests[name]
+
+    async def add(self, name: str, digest: str, card: TranslationCard):
+        """Add the digest of the card to the index, if it isn't there yet."""
+        digests = self._get_digests(name)
+        if digest in digests:
+            return
+
+        digests.add(digest)
+        line = json.dumps({"digest": digest, "card": card.to_dict()}) + "\n"
+        index_path = self.get_path(name)
+        await aos.makedirs(index_path.parent, exist_ok=True)
+        async with aiofiles.open(index_path, "a", encoding="utf-8") as f:
+            await f.write(line)
+
+    def forget(self, name: str):
+        """Forget the digests that were loaded for the given name."""
+        self._digests.pop(name, None)
+
+
+@dataclass
+class FileCardCache(CardCache):
+    """Base class for card caches that store the cards for each (name, card) in files.
+
+    The files are named after the digest of (name, card) and sharded into
+    subdirectories by the first two characters of the digest:
+    `<directory>/<name>/<digest[:2]>/<digest><suffix>`, where any characters in the
+    name that may be invalid in a path are replaced. An index per name keeps track
+    of which input card belongs to each digest.
+    """
+
+    suffix: ClassVar[str] = ".json"
+
+    directory: Path = GENERATED_CARDS_DIR
+    _index: FileCardIndex = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._index = FileCardIndex(self.directory)
+
+    def get_name_directory(self, name: str) -> Path:
+        """Get the directory with the cached cards for the given name."""
+        return self.directory / get_name_directory_name(name)
+
+    def get_digest_path(self, name: str, digest: str, suffix: str) -> Path:
+        """Get the path to the file with the given suffix for a digest."""
+        return self.get_name_directory(name) / digest[:2] / f"{digest}{suffix}"
+
+    def get_entry_path(self, name: str, card: TranslationCard, suffix: str) -> Path:
+        """Get the path to the file with the given suffix for (name, card)."""
+        return self.get_digest_path(name, get_cache_digest(name, card), suffix)
+
+    def get_key(self, name: str, card: TranslationCard) -> Path:
+        return self.get_entry_path(name, card, self.suffix)
+
+    async def _prepare_entry(self, name: str, card: TranslationCard):
+        """Create the directory of the entry and add it to the index."""
+        digest = get_cache_digest(name, card)
+        await aos.makedirs(self.get_digest_path(name, digest, "").parent, exist_ok=True)
+        await self._index.add(name, digest, card)
+
+    def list_cards(self, name: str) -> List[TranslationCard]:
+        """List the input cards that have cards cached under the given name."""
+        return [
+            card
+            for digest, card in self._index.iter_entries(name)
+            if self.get_digest_path(name, digest, self.suffix).exists()
+        ]
+
+    def clear(self, name: str) -> None:
+        """Clear the cached cards and the index for the given name."""
+        self._index.forget(name)
+        shutil.rmtree(self.get_name_directory(name), ignore_errors=True)
@@ -0,0 +1,54 @@
+import json
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Iterable
+
+import aiofiles
+
+from ..card import TranslationCard
+from .files import FileCardCache
+
+
+class TranslationCardEncoder(json.JSONEncoder):
+    """JSON encoder for TranslationCard objects."""
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, TranslationCard):
+            return o.to_dict()
+        return super().default(o)
+
+
+@dataclass
+class JSONFileCardCache(FileCardCache):
+    """Card cache that stores the cards for each (name, card) in a JSON file."""
+
+    suffix = ".json"
+
+    def get_path(self, name: str, card: TranslationCard) -> Path:
+        """Get the path to the cache file."""
+        return self.get_entry_path(name, card, self.suffix)
+
+    async def get(self, name: str, card: TranslationCard) -> Deque[TranslationCard]:
+        """Get the cards from the cache, if they exist."""
+        cache_path = self.get_path(name, card)
+        try:
+            async with aiofiles.open(cache_path) as f:
+                content = await f.read()
+
+            cards = json.loads(content, object_hook=TranslationCard.from_dict)
+
+        except FileNotFoundError:
+            cards = []
+
+        return deque(cards)
+
+    async def write(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Write the cards to the cache file."""
+        cache_path = self.get_path(name, card)
+        await self._prepare_entry(name, card)
+        cards_json = json.dumps(list(cards), cls=TranslationCardEncoder)
+        async with aiofiles.open(cache_path, "w") as f:
+            await f.write(cards_json)
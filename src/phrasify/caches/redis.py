@@ -0,0 +1,129 @@
+import json
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Iterable, Optional
+
+from ..card import TranslationCard
+from .base import CardCache
+from .files import get_cache_digest, get_name_directory_name
+
+
+def _import_redis():
+    try:
+        import redis  # noqa: PLC0415
+    except ImportError as e:
+        message = (
+            "The redis package is needed for the Redis card cache. "
+            "Install it with `pip install phrasify[redis]`."
+        )
+        raise ImportError(message) from e
+
+    return redis
+
+
+@dataclass
+class RedisCardCache(CardCache):
+    """Card cache that stores the cards in Redis, so that they can be shared between
+    processes and machines.
+
+    The cards for each (name, card) are stored in a Redis list, so that taking a card
+    is a single atomic `LPOP`: processes sharing the cache never get the same card.
+
+    Parameters
+    ----------
+    url : str
+        URL of the Redis server, e.g. `redis://localhost:6379/0`.
+    prefix : str
+        Prefix of the keys of the lists.
+    client : Optional[Any]
+        Client from `redis.asyncio` to use. Created from the URL if not given.
+    """
+
+    incremental = True
+
+    url: str = "redis://localhost:6379/0"
+    prefix: str = "phrasify:cards"
+    client: Optional[Any] = field(default=None, repr=False, compare=False)
+
+    def _get_client(self):
+        if self.client is None:
+            redis = _import_redis()
+            self.client = redis.asyncio.Redis.from_url(self.url)
+
+        return self.client
+
+    def get_name_prefix(self, name: str) -> str:
+        """Get the prefix of the keys of the lists for the given name."""
+        return f"{self.prefix}:{get_name_directory_name(name)}:"
+
+    def get_key(self, name: str, card: TranslationCard) -> str:
+        return f"{self.get_name_prefix(name)}{get_cache_digest(name, card)}"
+
+    async def get(self, name: str, card: TranslationCard) -> Deque[TranslationCard]:
+        """Get the cards from the cache, if they exist."""
+        values = await self._get_client().lrange(self.get_key(name, card), 0, -1)
+        return deque(TranslationCard.from_dict(json.loads(value)) for value in values)
+
+    async def write(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Write the cards to the cache, replacing the cards that were there."""
+        key = self.get_key(name, card)
+        values = [new_card.to_json() for new_card in cards]
+        async with self._get_client().pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if values:
+                pipe.rpush(key, *values)
+            await pipe.execute()
+
+    async def extend(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Add the cards to the end of the cache."""
+        values = [new_card.to_json() for new_card in cards]
+        if values:
+            await self._get_client().rpush(self.get_key(name, card), *values)
+
+    async def popleft(
+        self, name: str, card: TranslationCard
+    ) -> Optional[TranslationCard]:
+        """Remove the first card from the cache and return it.
+
+        Returns None if there are no cards in the cache.
+        """
+        value = await self._get_client().lpop(self.get_key(name, card))
+        if value is None:
+            return None
+
+        return TranslationCard.from_dict(json.loads(value))
+
+    async def count(self, name: str, card: TranslationCard) -> int:
+        """Count the number of cards in the cache."""
+        return await self._get_client().llen(self.get_key(name, card))
+
+    async def claim_refill(
+        self, name: str, card: TranslationCard, ttl: float = 60.0
+    ) -> bool:
+        """Claim the right to refill the cache for (name, card), for everyone sharing
+        the Redis server, until released or for at most `ttl` seconds."""
+        key = f"{self.get_key(name, card)}:refill"
+        claimed = await self._get_client().set(key, 1, nx=True, px=int(ttl * 1000))
+        return bool(claimed)
+
+    async def release_refill(self, name: str, card: TranslationCard) -> None:
+        """Release a claim on refilling the cache for (name, card)."""
+        await self._get_client().delete(f"{self.get_key(name, card)}:refill")
+
+    def clear(self, name: str) -> None:
+        """Clear all cards that were cached under the given name."""
+        redis = _import_redis()
+        with redis.Redis.from_url(self.url) as client:
+            keys = list(client.scan_iter(match=f"{self.get_name_prefix(name)}*"))
+            if keys:
+                client.delete(*keys)
+
+    async def close(self) -> None:
+        """Close the connection to the Redis server."""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
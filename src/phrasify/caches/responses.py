@@ -0,0 +1,140 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ..constants import GENERATED_CARDS_DIR
+from ._sqlite import connect, run_in_executor
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+"""
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+@dataclass
+class ResponseCache:
+    """Cache of LLM responses that is stored in a SQLite database, keyed on a digest
+    of the model, the response format and the prompt.
+
+    Responses that were cached more than `ttl` seconds ago are expired. Once more than
+    `max_entries` responses are cached, the least recently used ones are removed. Use
+    None for no limit.
+    """
+
+    path: Path = GENERATED_CARDS_DIR / "responses.sqlite3"
+    ttl: Optional[float] = 30 * SECONDS_PER_DAY
+    max_entries: Optional[int] = 10_000
+    _connection: Optional[sqlite3.Connection] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "ResponseCache":
+        """Create the response cache from the `responseCache` section of the config."""
+        if config is None:
+            return cls()
+
+        defaults = cls()
+        ttl_days = config.get("ttlDays", defaults.ttl / SECONDS_PER_DAY)
+        return cls(
+            ttl=None if ttl_days is None else ttl_days * SECONDS_PER_DAY,
+            max_entries=config.get("maxEntries", defaults.max_entries),
+        )
+
+    @staticmethod
+    def get_key(model: str, response_format: Optional[str], prompt: str) -> str:
+        """Get the key of the response of the model to the prompt."""
+        key_json = json.dumps([model, response_format, prompt], ensure_ascii=False)
+        return hashlib.sha256(key_json.encode()).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection to the database, creating it if necessary.
+
+        Must be called while holding `self._lock`.
+        """
+        if self._connection is None:
+            self._connection = connect(self.path, _SCHEMA)
+
+        return self._connection
+
+    def get(self, key: str) -> Optional[str]:
+        """Get the cached response, or None if it isn't cached or has expired."""
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            response, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+
+            connection.execute(
+                "UPDATE responses SET used_at = ? WHERE key = ?", (now, key)
+            )
+
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        """Cache the response, removing the least recently used responses if there
+        are more than `max_entries`."""
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, used_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            if self.max_entries is not None:
+                connection.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY used_at DESC "
+                    "LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Get the cached response without blocking the event loop."""
+        return await run_in_executor(self.get, key)
+
+    async def aset(self, key: str, response: str) -> None:
+        """Cache the response without blocking the event loop."""
+        await run_in_executor(self.set, key, response)
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self._lock:
+            return (
+                self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            )
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,242 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Iterable, Iterator, List, Optional
+
+from ..card import TranslationCard
+from ..constants import GENERATED_CARDS_DIR
+from ._sqlite import connect, run_in_executor
+from .base import CardCache
+from .json_file import TranslationCardEncoder
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    cards TEXT NOT NULL,
+    PRIMARY KEY (name, source, target)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS refills (
+    name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (name, source, target)
+) WITHOUT ROWID;
+"""
+
+
+@contextmanager
+def _immediate_transaction(connection: sqlite3.Connection) -> Iterator[None]:
+    """Run the statements in a single write transaction, so that concurrent processes
+    sharing the database can't interleave their reads and writes."""
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+@dataclass
+class SQLiteCardCache(CardCache):
+    """Card cache that stores all cards in a single SQLite database.
+
+    The database uses write-ahead logging so that reads don't block on writes. The
+    cards for each (name, card) are stored as a JSON list in a single row, indexed by
+    the primary key (name, source, target). Clearing a name only touches the rows for
+    that name, thanks to the index on the `name` prefix of the primary key.
+
+    Taking and adding cards are atomic, also between processes, so that processes
+    sharing the database never get the same card.
+    """
+
+    path: Path = GENERATED_CARDS_DIR / "cards.sqlite3"
+    _connection: Optional[sqlite3.Connection] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection to the database, creating it if necessary.
+
+        Must be called while holding `self._lock`.
+        """
+        if self._connection is None:
+            self._connection = connect(self.path, _SCHEMA)
+
+        return self._connection
+
+    def _get(self, name: str, card: TranslationCard) -> List[TranslationCard]:
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT cards FROM cards "
+                    "WHERE name = ? AND source = ? AND target = ?",
+                    (name, card.source, card.target),
+                )
+                .fetchone()
+            )
+
+        if row is None:
+            return []
+
+        return json.loads(row[0], object_hook=TranslationCard.from_dict)
+
+    def _write(
+        self, name: str, card: TranslationCard, cards: List[TranslationCard]
+    ) -> None:
+        cards_json = json.dumps(cards, cls=TranslationCardEncoder)
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cards (name, source, target, cards) "
+                "VALUES (?, ?, ?, ?)",
+                (name, card.source, card.target, cards_json),
+            )
+
+    def _extend(
+        self, name: str, card: TranslationCard, cards: List[TranslationCard]
+    ) -> None:
+        with self._lock:
+            connection = self._connect()
+            with _immediate_transaction(connection):
+                row = connection.execute(
+                    "SELECT cards FROM cards "
+                    "WHERE name = ? AND source = ? AND target = ?",
+                    (name, card.source, card.target),
+                ).fetchone()
+                cached_cards = [] if row is None else json.loads(row[0])
+                cached_cards.extend(new_card.to_dict() for new_card in cards)
+                connection.execute(
+                    "INSERT OR REPLACE INTO cards (name, source, target, cards) "
+                    "VALUES (?, ?, ?, ?)",
+                    (name, card.source, card.target, json.dumps(cached_cards)),
+                )
+
+    def _popleft(self, name: str, card: TranslationCard) -> Optional[TranslationCard]:
+        with self._lock:
+            connection = self._connect()
+            with _immediate_transaction(connection):
+                row = connection.execute(
+                    "SELECT cards FROM cards "
+                    "WHERE name = ? AND source = ? AND target = ?",
+                    (name, card.source, card.target),
+                ).fetchone()
+                cached_cards = [] if row is None else json.loads(row[0])
+                if not cached_cards:
+                    return None
+
+                first_card = cached_cards.pop(0)
+                connection.execute(
+                    "UPDATE cards SET cards = ? "
+                    "WHERE name = ? AND source = ? AND target = ?",
+                    (json.dumps(cached_cards), name, card.source, card.target),
+                )
+
+        return TranslationCard.from_dict(first_card)
+
+    def _count(self, name: str, card: TranslationCard) -> int:
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT json_array_length(cards) FROM cards "
+                    "WHERE name = ? AND source = ? AND target = ?",
+                    (name, card.source, card.target),
+                )
+                .fetchone()
+            )
+
+        return 0 if row is None else row[0]
+
+    def _claim_refill(self, name: str, card: TranslationCard, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with _immediate_transaction(connection):
+                row = connection.execute(
+                    "SELECT expires_at FROM refills "
+                    "WHERE name = ? AND source = ? AND target = ?",
+                    (name, card.source, card.target),
+                ).fetchone()
+                if row is not None and row[0] > now:
+                    return False
+
+                connection.execute(
+                    "INSERT OR REPLACE INTO refills (name, source, target, expires_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (name, card.source, card.target, now + ttl),
+                )
+                return True
+
+    def _release_refill(self, name: str, card: TranslationCard) -> None:
+        with self._lock:
+            self._connect().execute(
+                "DELETE FROM refills WHERE name = ? AND source = ? AND target = ?",
+                (name, card.source, card.target),
+            )
+
+    async def get(self, name: str, card: TranslationCard) -> Deque[TranslationCard]:
+        """Get the cards from the cache, if they exist."""
+        cards = await run_in_executor(self._get, name, card)
+        return deque(cards)
+
+    async def write(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Write the cards to the cache, replacing the cards that were there."""
+        await run_in_executor(self._write, name, card, list(cards))
+
+    async def extend(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Add the cards to the end of the cache."""
+        await run_in_executor(self._extend, name, card, list(cards))
+
+    async def popleft(
+        self, name: str, card: TranslationCard
+    ) -> Optional[TranslationCard]:
+        """Remove the first card from the cache and return it.
+
+        Returns None if there are no cards in the cache.
+        """
+        return await run_in_executor(self._popleft, name, card)
+
+    async def count(self, name: str, card: TranslationCard) -> int:
+        """Count the number of cards in the cache."""
+        return await run_in_executor(self._count, name, card)
+
+    async def claim_refill(
+        self, name: str, card: TranslationCard, ttl: float = 60.0
+    ) -> bool:
+        """Claim the right to refill the cache for (name, card), for all processes
+        that share the database, until released or for at most `ttl` seconds."""
+        return await run_in_executor(self._claim_refill, name, card, ttl)
+
+    async def release_refill(self, name: str, card: TranslationCard) -> None:
+        """Release a claim on refilling the cache for (name, card)."""
+        await run_in_executor(self._release_refill, name, card)
+
+    def clear(self, name: str) -> None:
+        """Clear all cards that were cached under the given name."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM cards WHERE name = ?", (name,))
+            connection.execute("DELETE FROM refills WHERE name = ?", (name,))
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,226 @@
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Hashable, Iterable, Optional, Set
+
+from ..card import TranslationCard
+from ..logging import get_logger
+from .base import CardCache
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class _Entry:
+    """Cards that are held in memory for a (name, card) pair.
+
+    The first `n_stored` cards are in the backend, after the `n_consumed` cards that
+    were taken from memory but not from the backend yet. The cards after them still
+    have to be added to the backend. If `replaced`, the cards in the backend must be
+    replaced instead.
+    """
+
+    name: str
+    card: TranslationCard
+    cards: Deque[TranslationCard]
+    n_stored: int = 0
+    n_consumed: int = 0
+    replaced: bool = False
+
+
+@dataclass
+class WriteBackCardCache(CardCache):
+    """Card cache that holds the cards in memory and writes them back to another
+    card cache later.
+
+    The cards for a (name, card) pair are read from the `backend` the first time they
+    are needed. After that, all changes only happen in memory and the changed entries
+    are written to the `backend` when:
+    - `flush_interval` seconds have passed since an entry was first changed
+    - `flush_threshold` entries have been changed
+    - `flush` is called, e.g. when the background event loop shuts down
+
+    If the backend is `incremental`, only the changes are written back: the cards that
+    were taken are taken from the backend and the new cards are added to it. Otherwise,
+    all cards of the entry are written.
+
+    At most `max_entries` entries are kept in memory. Entries that have been written
+    back are dropped in least recently used order when there are more.
+    """
+
+    backend: CardCache
+    flush_interval: float = 5.0
+    flush_threshold: int = 50
+    max_entries: int = 1024
+    _entries: "OrderedDict[Hashable, _Entry]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _dirty: Set[Hashable] = field(default_factory=set, init=False, repr=False)
+    _writing: Set[Hashable] = field(default_factory=set, init=False, repr=False)
+    _flush_timer: Optional[asyncio.TimerHandle] = field(
+        default=None, init=False, repr=False
+    )
+    _flush_loop: Optional[asyncio.AbstractEventLoop] = field(
+        default=None, init=False, repr=False
+    )
+    _flush_tasks: Set[asyncio.Task] = field(default_factory=set, init=False, repr=False)
+
+    def get_key(self, name: str, card: TranslationCard) -> Hashable:
+        return self.backend.get_key(name, card)
+
+    @property
+    def n_dirty(self) -> int:
+        """Number of entries that have not been written back yet."""
+        return len(self._dirty)
+
+    async def _load(self, name: str, card: TranslationCard) -> _Entry:
+        """Get the entry from memory, reading it from the backend if necessary."""
+        key = self.get_key(name, card)
+        entry = self._entries.get(key)
+        if entry is None:
+            cards = await self.backend.get(name, card)
+            # The entry may have been loaded while we were waiting for the backend
+            entry = self._entries.setdefault(
+                key, _Entry(name, card, cards, n_stored=len(cards))
+            )
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def _mark_dirty(self, name: str, card: TranslationCard):
+        self._dirty.add(self.get_key(name, card))
+        if len(self._dirty) >= self.flush_threshold:
+            self._schedule_flush()
+        else:
+            self._start_flush_timer()
+
+    def _start_flush_timer(self):
+        """Flush after `flush_interval` seconds, unless a flush is already planned on
+        the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._flush_timer is not None and self._flush_loop is loop:
+            return
+
+        self._flush_loop = loop
+        self._flush_timer = loop.call_later(self.flush_interval, self._schedule_flush)
+
+    def _schedule_flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        """Write all changed entries to the backend."""
+        # Entries that are being written by another flush are written again later
+        keys = [key for key in self._dirty if key not in self._writing]
+        for key in keys:
+            entry = self._entries.get(key)
+            self._dirty.discard(key)
+            if entry is None:
+                continue
+
+            self._writing.add(key)
+            try:
+                await self._write_back(entry)
+            except Exception:
+                logger.exception(f"Error writing back cards for card {entry.card}")
+                # The backend may have been changed partially, so replace its cards
+                entry.replaced = True
+                self._dirty.add(key)
+            finally:
+                self._writing.discard(key)
+
+        if self._dirty:
+            self._start_flush_timer()
+
+        self._evict()
+
+    async def _write_back(self, entry: _Entry):
+        """Write the changes to the entry to the backend.
+
+        The cards in memory may change while writing, so the entry is first updated
+        as if the changes were written already.
+        """
+        n_consumed = entry.n_consumed
+        new_cards = list(entry.cards)[entry.n_stored :]
+        replaced = entry.replaced or not self.backend.incremental
+        entry.n_stored = len(entry.cards)
+        entry.n_consumed = 0
+        entry.replaced = False
+
+        if replaced:
+            await self.backend.write(entry.name, entry.card, list(entry.cards))
+            return
+
+        for _ in range(n_consumed):
+            await self.backend.popleft(entry.name, entry.card)
+        await self.backend.extend(entry.name, entry.card, new_cards)
+
+    def _evict(self):
+        """Drop the least recently used entries that have been written back."""
+        n_excess = len(self._entries) - self.max_entries
+        if n_excess <= 0:
+            return
+
+        clean_keys = [
+            key
+            for key in self._entries
+            if key not in self._dirty and key not in self._writing
+        ]
+        for key in clean_keys[:n_excess]:
+            del self._entries[key]
+
+    async def get(self, name: str, card: TranslationCard) -> Deque[TranslationCard]:
+        """Get a copy of the cards that are held in memory."""
+        entry = await self._load(name, card)
+        return deque(entry.cards)
+
+    async def write(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Replace the cards in memory."""
+        key = self.get_key(name, card)
+        self._entries[key] = _Entry(name, card, deque(cards), replaced=True)
+        self._entries.move_to_end(key)
+        self._mark_dirty(name, card)
+
+    async def extend(
+        self, name: str, card: TranslationCard, cards: Iterable[TranslationCard]
+    ) -> None:
+        """Add the cards to the end of the cards in memory."""
+        entry = await self._load(name, card)
+        entry.cards.extend(cards)
+        self._mark_dirty(name, card)
+
+    async def popleft(
+        self, name: str, card: TranslationCard
+    ) -> Optional[TranslationCard]:
+        """Remove the first card from memory and return it."""
+        entry = await self._load(name, card)
+        if not entry.cards:
+            return None
+
+        first_card = entry.cards.popleft()
+        if entry.n_stored > 0:
+            entry.n_stored -= 1
+            entry.n_consumed += 1
+        self._mark_dirty(name, card)
+        return first_card
+
+    async def count(self, name: str, card: TranslationCard) -> int:
+        """Count the number of cards in memory."""
+        entry = await self._load(name, card)
+        return len(entry.cards)
+
+    def clear(self, name: str) -> None:
+        """Drop the entries for the given name and clear them from the backend."""
+        keys = [key for key, entry in self._entries.items() if entry.name == name]
+        for key in keys:
+            del self._entries[key]
+            self._dirty.discard(key)
+
+        self.backend.clear(name)
@@ -1,17 +1,31 @@
 import asyncio
 import json
 import re
-from collections import deque
-from dataclasses import asdict, dataclass, field
+import time
+from dataclasses import asdict, dataclass, field, replace
 from functools import lru_cache
-from pathlib import Path
-from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
-import aiofiles
-import aiofiles.os as aos
-import aiofiles.ospath
+import aiohttp
 import requests
 
+from .caches.base import CardCache
+from .caches.json_file import JSONFileCardCache, TranslationCardEncoder  # noqa: F401
 from .card import TranslationCard
 from .chains.llm import LLMChain, LLMChainInput
 from .constants import (
@@ -19,12 +33,34 @@ from .constants import (
     DEFAULT_N_CARDS,
     DEFAULT_SOURCE_LANGUAGE,
     DEFAULT_TARGET_LANGUAGE,
-    GENERATED_CARDS_DIR,
+    MAX_REMOTE_BATCH_SIZE,
+    REGISTRY_MAXSIZE,
+    REGISTRY_TTL,
+    REMOTE_BATCH_TIMEOUT,
+    REMOTE_TIMEOUT,
+    TIMEOUT_HEADER,
 )
 from .error import CardGenerationError, ChainError, LLMParsingError
 from .event_loop import run_coroutine_in_thread
-from .factory import get_api_url, get_llm, get_llm_name, get_prompt, get_prompt_name
+from .factory import (
+    get_api_url,
+    get_batch_prompt,
+    get_card_cache,
+    get_card_normalizer,
+    get_client_session_pool,
+    get_hedging_policy,
+    get_llm,
+    get_llm_name,
+    get_prompt,
+    get_prompt_name,
+    get_requests_session_pool,
+    get_stream_cards,
+)
+from .hedging import HedgedCardGenerator
 from .logging import get_logger
+from .normalize import CardNormalizer
+from .registry import BoundedRegistry
+from .sessions import ClientSessionPool, RequestsSessionPool
 
 logger = get_logger(__name__)
 
@@ -112,6 +148,12 @@ def _parse_translation_card_response(response: str) -> List[TranslationCard]:
     # TODO In any case, probably want to parse the response into a list of
     # dictionaries first, then convert each to cards.
 
+    return _card_dicts_to_cards(_load_json_response(response))
+
+
+def _load_json_response(response: str) -> Any:
+    """Load the JSON in the response from an LLM, which may be in a JSON code block
+    or surrounded by text."""
     json_response = response
     match = re.search(r"(?<=```json\n)(.*)(?=\n```)", json_response, re.DOTALL)
     if match:
@@ -120,11 +162,14 @@ def _parse_translation_card_response(response: str) -> List[TranslationCard]:
     json_response = _find_json_in_response(json_response)
 
     try:
-        card_dicts = json.loads(json_response)
+        return json.loads(json_response)
     except json.JSONDecodeError as e:
         message = f"Error parsing response from chain: {response}"
         raise LLMParsingError(message) from e
 
+
+def _card_dicts_to_cards(card_dicts: Union[List, Dict]) -> List[TranslationCard]:
+    """Turn parsed JSON into a list of TranslationCard objects."""
     card_dicts = _resolve_card_dicts(card_dicts)
 
     try:
@@ -136,6 +181,100 @@ def _parse_translation_card_response(response: str) -> List[TranslationCard]:
     return cards
 
 
+def _parse_batch_response(
+    response: str, keys: Sequence[str]
+) -> List[Optional[List[TranslationCard]]]:
+    """Parse the response from an LLM to a batch prompt, which maps the key of each
+    input card to its cards. Returns the cards for each key, or None for the keys
+    whose cards are missing or invalid."""
+    batch = _load_json_response(response)
+    if isinstance(batch, dict) and isinstance(batch.get("cards"), dict):
+        # The cards are nested under the key "cards"
+        batch = batch["cards"]
+
+    if not isinstance(batch, dict):
+        message = f"Expected a dictionary of cards per key, but got {batch!r}"
+        raise LLMParsingError(message)
+
+    results = []
+    for key in keys:
+        try:
+            results.append(_card_dicts_to_cards(batch[key]))
+        except (KeyError, LLMParsingError):
+            results.append(None)
+
+    return results
+
+
+class TranslationCardStreamParser:
+    """Parse the cards from a response from an LLM that comes in as chunks.
+
+    Every JSON object with a "source" and a "target" is parsed into a card as soon as
+    it closes, so that the first card is available before the whole response is in.
+    Objects that contain the cards, like `{"cards": [...]}`, are looked into.
+    """
+
+    def __init__(self):
+        self.n_cards = 0
+        self._text = ""
+        self._i = 0
+        self._object_starts: List[int] = []
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[TranslationCard]:
+        """Feed the next chunk of the response, returning the cards that it closes."""
+        self._text += chunk
+        cards = []
+        for i in range(self._i, len(self._text)):
+            char = self._text[i]
+            if not self._object_starts:
+                # Outside of the JSON objects, text like quotes or braces in
+                # markdown doesn't mean anything
+                if char == "{":
+                    self._object_starts.append(i)
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._object_starts.append(i)
+            elif char == "}":
+                i_start = self._object_starts.pop()
+                card = self._parse_card(self._text[i_start : i + 1])
+                if card is not None:
+                    cards.append(card)
+
+        if self._object_starts:
+            self._i = len(self._text)
+        else:
+            # Everything that was fed so far has been parsed, so it can be dropped
+            self._text = ""
+            self._i = 0
+
+        self.n_cards += len(cards)
+        return cards
+
+    @staticmethod
+    def _parse_card(text: str) -> Optional[TranslationCard]:
+        try:
+            card_dict = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+        source = card_dict.get("source")
+        target = card_dict.get("target")
+        if not isinstance(source, str) or not isinstance(target, str):
+            return None
+
+        return TranslationCard(source=source, target=target)
+
+
 @dataclass(frozen=True)
 class CardGeneratorConfig:
     """Configuration for the CardGenerator."""
@@ -157,12 +296,17 @@ class CardGeneratorConfig:
 @dataclass
 class LLMTranslationCardGenerator:
     """Can be called to generate translation cards from an input card inserted into a
-    prompt."""
+    prompt.
+
+    If a `batch_chain` is given, `abatch` generates the cards for several input cards
+    with a single call to it, which repeats the instructions of the prompt only once.
+    """
 
     chain: Callable[[LLMChainInput], str]
     n_cards: int
     source_language: str
     target_language: str
+    batch_chain: Optional[Callable[[LLMChainInput], str]] = None
 
     @classmethod
     def from_config(cls, config: CardGeneratorConfig) -> "LLMTranslationCardGenerator":
@@ -170,11 +314,16 @@ class LLMTranslationCardGenerator:
         llm = get_llm(config.llm)
         prompt = get_prompt(config.prompt_name)
         chain = LLMChain(llm=llm, prompt=prompt)
+        batch_prompt = get_batch_prompt(config.prompt_name)
+        batch_chain = None
+        if batch_prompt is not None:
+            batch_chain = LLMChain(llm=llm, prompt=batch_prompt)
         return cls(
             chain=chain,
             n_cards=config.n_cards,
             source_language=config.source_language,
             target_language=config.target_language,
+            batch_chain=batch_chain,
         )
 
     def _get_chain_inputs(self, card: TranslationCard, n_cards: int) -> LLMChainInput:
@@ -254,40 +403,240 @@ class LLMTranslationCardGenerator:
 
         return cards
 
+    def _get_batch_chain_inputs(
+        self, cards: Sequence[TranslationCard], n_cards: int
+    ) -> Tuple[LLMChainInput, List[str]]:
+        keys = [str(i) for i in range(1, len(cards) + 1)]
+        input_cards = {
+            key: {"target": card.target, "source": card.source}
+            for key, card in zip(keys, cards)
+        }
+        chain_inputs = {
+            "n_cards": n_cards,
+            "source_language": self.source_language,
+            "target_language": self.target_language,
+            "cards": json.dumps(input_cards, ensure_ascii=False, indent=2),
+        }
+        return chain_inputs, keys
+
+    async def _acall_batch(
+        self, cards: Sequence[TranslationCard], n_cards: int
+    ) -> List[Optional[List[TranslationCard]]]:
+        """Generate the cards for the input cards with a single call to the batch
+        chain. Returns None for the input cards whose cards couldn't be parsed."""
+        logger.debug(
+            f"{self.__class__.__name__} generating {n_cards} cards for each of "
+            f"{len(cards)} cards, using chain {self.batch_chain}"
+        )
+        chain_inputs, keys = self._get_batch_chain_inputs(cards, n_cards=n_cards)
+        try:
+            response = await self.batch_chain.acall(chain_inputs)
+        except ChainError as e:
+            self._raise_card_generation_error(e, chain_inputs=chain_inputs)
+
+        self._log_response_from_chain(response)
+        try:
+            return _parse_batch_response(response, keys)
+        except LLMParsingError as e:
+            logger.warning(f"Error parsing batch response from chain: {e}")
+            return [None] * len(cards)
+
+    async def abatch(
+        self,
+        cards: Sequence[TranslationCard],
+        n_cards: Optional[int] = None,
+        max_retries: int = 1,
+    ) -> List[List[TranslationCard]]:
+        """Generate translation cards for several input cards at once, returning the
+        cards for each input card in the same order.
+
+        The input cards are packed into a single call to the batch chain. The input
+        cards whose cards are missing or invalid in the response are retried in a
+        batch of their own, up to `max_retries` times. The ones that are left, all of
+        them if the batch call fails, or all of them if there is no batch chain, are
+        generated one by one. If that fails too, an error is logged and no cards are
+        returned for the input card.
+        """
+        if n_cards is None:
+            n_cards = self.n_cards
+
+        results: List[Optional[List[TranslationCard]]] = [None] * len(cards)
+        if n_cards == 0:
+            return [[] for _ in cards]
+
+        pending = list(range(len(cards)))
+        if self.batch_chain is not None:
+            for _ in range(max_retries + 1):
+                if len(pending) <= 1:
+                    # A single card doesn't need the batch prompt
+                    break
+
+                try:
+                    batch_results = await self._acall_batch(
+                        [cards[i] for i in pending], n_cards=n_cards
+                    )
+                except CardGenerationError as e:
+                    logger.warning(
+                        f"Batch call failed, generating cards one by one: {e}"
+                    )
+                    break
+
+                for i, batch_result in zip(pending, batch_results):
+                    results[i] = batch_result
+                pending = [i for i in pending if results[i] is None]
+                if pending:
+                    logger.debug(f"Retrying {len(pending)} cards of the batch")
+
+        single_results = await asyncio.gather(
+            *(self.acall(cards[i], n_cards=n_cards) for i in pending),
+            return_exceptions=True,
+        )
+        for i, single_result in zip(pending, single_results):
+            if isinstance(single_result, Exception):
+                logger.error(
+                    f"Failed to generate cards for card {cards[i]}: {single_result}"
+                )
+                results[i] = []
+            else:
+                results[i] = single_result
+
+        return results
+
+    async def astream(
+        self, card: TranslationCard, n_cards: Optional[int] = None
+    ) -> AsyncIterator[TranslationCard]:
+        """Generate multiple translation cards from an input card inserted into a
+        prompt, yielding each card as soon as the chain has generated it."""
+        stream = getattr(self.chain, "astream", None)
+        if stream is None:
+            for new_card in await self.acall(card, n_cards=n_cards):
+                yield new_card
+            return
+
+        self._log_generating_cards(card)
+
+        if n_cards is None:
+            n_cards = self.n_cards
+
+        if n_cards == 0:
+            return
+
+        chain_inputs = self._get_chain_inputs(card, n_cards=n_cards)
+        parser = TranslationCardStreamParser()
+        chunks = []
+        try:
+            async for chunk in stream(chain_inputs):
+                chunks.append(chunk)
+                for new_card in parser.feed(chunk):
+                    yield new_card
+        except ChainError as e:
+            self._raise_card_generation_error(e, chain_inputs=chain_inputs)
+
+        response = "".join(chunks)
+        self._log_response_from_chain(response)
+        if parser.n_cards == 0:
+            # Let the full parser deal with the response, e.g. to raise the same errors
+            for new_card in self._parse_translation_card_response(response):
+                yield new_card
+
 
 @dataclass
 class RemoteCardGenerator:
     """Can be called to generate translation cards from an input card by sending a
-    request to a remote server."""
+    request to a remote server.
+
+    A call gives up after `timeout` seconds, or at its `deadline` if that is sooner.
+    The deadline is a time of `time.monotonic()`. The number of seconds that are left
+    is sent to the server, so that it stops generating cards that nobody waits for.
+    """
 
     url: str
     config: CardGeneratorConfig = field(default_factory=CardGeneratorConfig)
+    timeout: float = REMOTE_TIMEOUT
+    sessions: ClientSessionPool = field(
+        default_factory=get_client_session_pool, repr=False, compare=False
+    )
+    requests_sessions: RequestsSessionPool = field(
+        default_factory=get_requests_session_pool, repr=False, compare=False
+    )
 
     @property
     def n_cards(self) -> int:
         """Number of cards to generate."""
         return self.config.n_cards
 
-    def __call__(self, card: TranslationCard) -> List[TranslationCard]:
-        """Generate multiple translation cards from an input card inserted into a
-        prompt."""
+    def _log_generating_cards(self, card: TranslationCard, n_cards: int):
         logger.debug(
-            f"{self.__class__.__name__} generating {self.n_cards} cards "
+            f"{self.__class__.__name__} generating {n_cards} cards "
             f"from card {card!r}, using remote server {self.url}"
         )
-        if self.n_cards == 0:
-            return []
 
-        request_body = {
-            "card_generator": asdict(self.config),
+    def _get_request_body(
+        self, card: TranslationCard, n_cards: int
+    ) -> Dict[str, Dict[str, Any]]:
+        return {
+            "card_generator": asdict(replace(self.config, n_cards=n_cards)),
             "card": asdict(card),
         }
 
-        response = requests.post(self.url, json=request_body, timeout=30)
+    def _get_timeout(self, deadline: Optional[float]) -> float:
+        """Get the number of seconds that the request may take."""
+        if deadline is None:
+            return self.timeout
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            msg = "Deadline passed before sending the request to the remote server"
+            raise CardGenerationError(msg)
+
+        return min(self.timeout, remaining)
+
+    @staticmethod
+    def _get_headers(timeout: float) -> Dict[str, str]:
+        return {TIMEOUT_HEADER: f"{timeout:.3f}"}
+
+    @staticmethod
+    def _parse_stream_line(line: str) -> TranslationCard:
+        card_dict = json.loads(line)
+        if "error" in card_dict:
+            msg = f"Error generating card using remote server: {card_dict}"
+            raise CardGenerationError(msg)
+
+        return TranslationCard.from_dict(card_dict)
+
+    def __call__(
+        self,
+        card: TranslationCard,
+        n_cards: Optional[int] = None,
+        *,
+        deadline: Optional[float] = None,
+    ) -> List[TranslationCard]:
+        """Generate multiple translation cards from an input card inserted into a
+        prompt."""
+        if n_cards is None:
+            n_cards = self.n_cards
+
+        self._log_generating_cards(card, n_cards)
+        if n_cards == 0:
+            return []
+
+        timeout = self._get_timeout(deadline)
         try:
+            response = self.requests_sessions.post(
+                self.url,
+                json=self._get_request_body(card, n_cards),
+                headers=self._get_headers(timeout),
+                timeout=timeout,
+            )
             response.raise_for_status()
         except requests.HTTPError as e:
-            msg = f"Error generating card using remote server: {response}"
+            msg = f"Error generating card using remote server: {e.response}"
+            raise CardGenerationError(msg) from e
+        except requests.Timeout as e:
+            msg = f"Remote server didn't respond within {timeout:.1f}s"
+            raise CardGenerationError(msg) from e
+        except requests.RequestException as e:
+            msg = f"Error connecting to remote server {self.url}: {e}"
             raise CardGenerationError(msg) from e
 
         response_json = response.json()
@@ -295,69 +644,386 @@ class RemoteCardGenerator:
 
         return cards
 
+    async def acall(
+        self,
+        card: TranslationCard,
+        n_cards: Optional[int] = None,
+        *,
+        deadline: Optional[float] = None,
+    ) -> List[TranslationCard]:
+        """Generate multiple translation cards from an input card inserted into a
+        prompt, without blocking the event loop."""
+        if n_cards is None:
+            n_cards = self.n_cards
 
-class TranslationCardEncoder(json.JSONEncoder):
-    """JSON encoder for TranslationCard objects."""
+        self._log_generating_cards(card, n_cards)
+        if n_cards == 0:
+            return []
 
-    def default(self, o: Any) -> Any:
-        if isinstance(o, TranslationCard):
-            return o.to_dict()
-        return super().default(o)
+        timeout = self._get_timeout(deadline)
+        session = self.sessions.get()
+        try:
+            async with session.post(
+                self.url,
+                json=self._get_request_body(card, n_cards),
+                headers=self._get_headers(timeout),
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as response:
+                response.raise_for_status()
+                response_json = await response.json()
+        except aiohttp.ClientResponseError as e:
+            msg = f"Error generating card using remote server: {e.status} {e.message}"
+            raise CardGenerationError(msg) from e
+        except asyncio.TimeoutError as e:
+            msg = f"Remote server didn't respond within {timeout:.1f}s"
+            raise CardGenerationError(msg) from e
+        except aiohttp.ClientError as e:
+            msg = f"Error connecting to remote server {self.url}: {e}"
+            raise CardGenerationError(msg) from e
 
+        return [TranslationCard.from_dict(card_dict) for card_dict in response_json]
 
-@lru_cache(maxsize=None)
-def get_file_lock(path: Path):  # noqa: ARG001
-    """
-    Get a lock for file operations.
+    def stream(
+        self,
+        card: TranslationCard,
+        n_cards: Optional[int] = None,
+        *,
+        deadline: Optional[float] = None,
+    ) -> Iterator[TranslationCard]:
+        """Generate multiple translation cards from an input card inserted into a
+        prompt, yielding each card as soon as the remote server has generated it."""
+        if n_cards is None:
+            n_cards = self.n_cards
 
-    We want to get the same lock for the same path,
-    hence the use of lru_cache with the `path` argument.
-    """
-    return asyncio.Lock()
+        self._log_generating_cards(card, n_cards)
+        if n_cards == 0:
+            return
 
+        timeout = self._get_timeout(deadline)
+        try:
+            with self.requests_sessions.post(
+                f"{self.url}/stream",
+                json=self._get_request_body(card, n_cards),
+                headers=self._get_headers(timeout),
+                timeout=timeout,
+                stream=True,
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if line:
+                        yield self._parse_stream_line(line)
+        except requests.HTTPError as e:
+            msg = f"Error generating card using remote server: {e.response}"
+            raise CardGenerationError(msg) from e
+        except requests.Timeout as e:
+            msg = f"Remote server didn't respond within {timeout:.1f}s"
+            raise CardGenerationError(msg) from e
+        except requests.RequestException as e:
+            msg = f"Error connecting to remote server {self.url}: {e}"
+            raise CardGenerationError(msg) from e
 
-@lru_cache(maxsize=None)
-def get_file_tasks(path: Path):  # noqa: ARG001
-    """
-    Get a set of tasks for file operations.
+    async def astream(
+        self,
+        card: TranslationCard,
+        n_cards: Optional[int] = None,
+        *,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[TranslationCard]:
+        """Generate multiple translation cards from an input card inserted into a
+        prompt, yielding each card as soon as the remote server has generated it."""
+        if n_cards is None:
+            n_cards = self.n_cards
+
+        self._log_generating_cards(card, n_cards)
+        if n_cards == 0:
+            return
+
+        timeout = self._get_timeout(deadline)
+        session = self.sessions.get()
+        try:
+            async with session.post(
+                f"{self.url}/stream",
+                json=self._get_request_body(card, n_cards),
+                headers=self._get_headers(timeout),
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as response:
+                response.raise_for_status()
+                async for line in response.content:
+                    if line.strip():
+                        yield self._parse_stream_line(line.decode())
+        except aiohttp.ClientResponseError as e:
+            msg = f"Error generating card using remote server: {e.status} {e.message}"
+            raise CardGenerationError(msg) from e
+        except asyncio.TimeoutError as e:
+            msg = f"Remote server didn't respond within {timeout:.1f}s"
+            raise CardGenerationError(msg) from e
+        except aiohttp.ClientError as e:
+            msg = f"Error connecting to remote server {self.url}: {e}"
+            raise CardGenerationError(msg) from e
+
+    def batch(
+        self,
+        cards: Sequence[TranslationCard],
+        configs: Optional[Sequence[Optional[CardGeneratorConfig]]] = None,
+    ) -> List[List[TranslationCard]]:
+        """Generate translation cards for several input cards with a single request
+        per `MAX_REMOTE_BATCH_SIZE` input cards, returning the cards for each input
+        card in the same order.
+
+        Each input card can have its own config in `configs`, which defaults to
+        `self.config`. If the server fails to generate the cards for an input card, an
+        error is logged and no cards are returned for it.
+        """
+        if configs is None:
+            configs = [None] * len(cards)
+
+        if len(configs) != len(cards):
+            message = "Each input card needs its own config, or None"
+            raise ValueError(message)
+
+        logger.debug(
+            f"{self.__class__.__name__} generating cards for {len(cards)} cards, "
+            f"using remote server {self.url}"
+        )
+        results = []
+        for start in range(0, len(cards), MAX_REMOTE_BATCH_SIZE):
+            end = start + MAX_REMOTE_BATCH_SIZE
+            results.extend(self._call_batch(cards[start:end], configs[start:end]))
 
-    We want to get the same set for the same path,
-    hence the use of lru_cache with the `path` argument.
+        return results
+
+    def _call_batch(
+        self,
+        cards: Sequence[TranslationCard],
+        configs: Sequence[Optional[CardGeneratorConfig]],
+    ) -> List[List[TranslationCard]]:
+        try:
+            response = self.requests_sessions.post(
+                f"{self.url}/batch",
+                json=self._get_batch_request_body(cards, configs, self.n_cards),
+                timeout=REMOTE_BATCH_TIMEOUT,
+            )
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            msg = f"Error generating cards using remote server: {e.response}"
+            raise CardGenerationError(msg) from e
+        except requests.Timeout as e:
+            msg = f"Remote server didn't respond within {REMOTE_BATCH_TIMEOUT:.1f}s"
+            raise CardGenerationError(msg) from e
+        except requests.RequestException as e:
+            msg = f"Error connecting to remote server {self.url}: {e}"
+            raise CardGenerationError(msg) from e
+
+        return self._parse_batch_results(cards, response.json())
+
+    async def abatch(
+        self, cards: Sequence[TranslationCard], n_cards: Optional[int] = None
+    ) -> List[List[TranslationCard]]:
+        """Generate translation cards for several input cards with a single request
+        per `MAX_REMOTE_BATCH_SIZE` input cards, without blocking the event loop.
+        Returns the cards for each input card in the same order.
+
+        The requests for the chunks of input cards are sent concurrently. If the
+        server fails to generate the cards for an input card, or a request fails, an
+        error is logged and no cards are returned for the input cards concerned.
+        """
+        if n_cards is None:
+            n_cards = self.n_cards
+
+        logger.debug(
+            f"{self.__class__.__name__} generating {n_cards} cards for {len(cards)} "
+            f"cards, using remote server {self.url}"
+        )
+        if n_cards == 0:
+            return [[] for _ in cards]
+
+        chunks = [
+            cards[start : start + MAX_REMOTE_BATCH_SIZE]
+            for start in range(0, len(cards), MAX_REMOTE_BATCH_SIZE)
+        ]
+        chunk_results = await asyncio.gather(
+            *(self._acall_chunk(chunk, n_cards) for chunk in chunks)
+        )
+
+        return [result for results in chunk_results for result in results]
+
+    async def _acall_chunk(
+        self, cards: Sequence[TranslationCard], n_cards: int
+    ) -> List[List[TranslationCard]]:
+        """Generate the cards for a chunk of input cards, returning no cards for them
+        if the request fails."""
+        try:
+            return await self._acall_batch(cards, n_cards)
+        except CardGenerationError as e:
+            logger.error(f"Failed to generate cards for cards {cards}: {e}")
+            return [[] for _ in cards]
+
+    async def _acall_batch(
+        self, cards: Sequence[TranslationCard], n_cards: int
+    ) -> List[List[TranslationCard]]:
+        session = self.sessions.get()
+        try:
+            async with session.post(
+                f"{self.url}/batch",
+                json=self._get_batch_request_body(cards, [None] * len(cards), n_cards),
+                timeout=aiohttp.ClientTimeout(total=REMOTE_BATCH_TIMEOUT),
+            ) as response:
+                response.raise_for_status()
+                response_json = await response.json()
+        except aiohttp.ClientResponseError as e:
+            msg = f"Error generating cards using remote server: {e.status} {e.message}"
+            raise CardGenerationError(msg) from e
+        except asyncio.TimeoutError as e:
+            msg = f"Remote server didn't respond within {REMOTE_BATCH_TIMEOUT:.1f}s"
+            raise CardGenerationError(msg) from e
+        except aiohttp.ClientError as e:
+            msg = f"Error connecting to remote server {self.url}: {e}"
+            raise CardGenerationError(msg) from e
+
+        return self._parse_batch_results(cards, response_json)
+
+    def _get_batch_request_body(
+        self,
+        cards: Sequence[TranslationCard],
+        configs: Sequence[Optional[CardGeneratorConfig]],
+        n_cards: int,
+    ) -> Dict[str, Any]:
+        items = []
+        for card, config in zip(cards, configs):
+            item: Dict[str, Any] = {"card": asdict(card)}
+            if config is not None:
+                item["card_generator"] = asdict(config)
+            items.append(item)
+
+        return {
+            "card_generator": asdict(replace(self.config, n_cards=n_cards)),
+            "items": items,
+        }
+
+    @staticmethod
+    def _parse_batch_results(
+        cards: Sequence[TranslationCard], response_json: List[Dict[str, Any]]
+    ) -> List[List[TranslationCard]]:
+        if len(response_json) != len(cards):
+            msg = (
+                f"Expected results for {len(cards)} cards from the remote server, "
+                f"but got {len(response_json)}"
+            )
+            raise CardGenerationError(msg)
+
+        results = []
+        for card, result in zip(cards, response_json):
+            if result.get("error") is not None:
+                logger.error(
+                    f"Failed to generate cards for card {card}: {result['error']}"
+                )
+            results.append(
+                [TranslationCard.from_dict(card_dict) for card_dict in result["cards"]]
+            )
+
+        return results
+
+
+def _lock_in_use(lock: asyncio.Lock) -> bool:
+    return lock.locked()
+
+
+def _tasks_in_use(tasks: "TaskSet") -> bool:
+    return len(tasks) > 0
+
+
+class TaskSet(set):
+    """Set of tasks. Unlike a builtin set, it can be weakly referenced.
+
+    The tasks set `card_added` whenever they add a card to the cache.
     """
-    return set()
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.card_added = asyncio.Event()
+
+
+# Get a lock for cache operations.
+# We want to get the same lock for the same cache key, as long as it's in use.
+get_file_lock: BoundedRegistry[Hashable, asyncio.Lock] = BoundedRegistry(
+    lambda key: asyncio.Lock(),  # noqa: ARG005
+    maxsize=REGISTRY_MAXSIZE,
+    ttl=REGISTRY_TTL,
+    in_use=_lock_in_use,
+)
+
+# Get a set of tasks for cache operations.
+# We want to get the same set for the same cache key, as long as it's in use.
+get_file_tasks: BoundedRegistry[Hashable, TaskSet] = BoundedRegistry(
+    lambda key: TaskSet(),  # noqa: ARG005
+    maxsize=REGISTRY_MAXSIZE,
+    ttl=REGISTRY_TTL,
+    in_use=_tasks_in_use,
+)
+
+
+def _create_variant_registry() -> (
+    BoundedRegistry[TranslationCard, Set[TranslationCard]]
+):
+    return BoundedRegistry(
+        lambda key: set(),  # noqa: ARG005
+        maxsize=REGISTRY_MAXSIZE,
+        ttl=REGISTRY_TTL,
+    )
 
 
 @dataclass
-class JSONCachedCardGenerator:
-    """Can be called to generate language cards. Cache the result as a JSON."""
+class CachedCardGenerator:
+    """Can be called to generate language cards. Cache the result in a CardCache.
+
+    If a `normalizer` is given, the cards are cached under the normalized input card,
+    so that input cards that only differ in e.g. HTML markup share their cached cards.
+    The card generator still gets the original input card.
+
+    If `stream` is True and the card generator has an `astream` method, each card is
+    added to the cache as soon as it is generated. The first card is then served
+    while the rest are still being generated, instead of first generating a single
+    card to be quick.
+
+    If a `fast_card_generator` is given, it generates that single card instead of
+    `card_generator`, e.g. a HedgedCardGenerator that doesn't let one slow LLM call
+    keep the reviewer waiting. When streaming, it streams the cards that the reviewer
+    waits for instead, if it has an `astream` method.
+    """
 
     card_generator: CardGenerator
     min_cards: int = DEFAULT_MIN_CARDS
     fast_n_cards: int = 1
     name: str = "default"
-
-    def get_cache_path(self, card: TranslationCard) -> Path:
-        """Get the path to the cache file."""
-        return GENERATED_CARDS_DIR / f"{self.name}_{card.to_path_friendly_str()}.json"
+    cache: CardCache = field(default_factory=JSONFileCardCache)
+    normalizer: Optional[CardNormalizer] = None
+    stream: bool = False
+    fast_card_generator: Optional[CardGenerator] = None
+    n_llm_calls_saved: int = field(default=0, init=False, compare=False)
+    _n_clears: int = field(default=0, init=False, repr=False, compare=False)
+    _variants: BoundedRegistry[TranslationCard, Set[TranslationCard]] = field(
+        default_factory=_create_variant_registry, init=False, repr=False, compare=False
+    )
+
+    def get_cache_card(self, card: TranslationCard) -> TranslationCard:
+        """Get the card under which the cards for the given input card are cached."""
+        if self.normalizer is None:
+            return card
+
+        return self.normalizer(card)
+
+    def get_cache_key(self, card: TranslationCard) -> Hashable:
+        """Get the key that identifies the cached cards for the given card."""
+        return self.cache.get_key(self.name, self.get_cache_card(card))
 
     def clear_cache(self):
-        """Clear the cache."""
-        for path in GENERATED_CARDS_DIR.glob(f"{self.name}_*.json"):
-            path.unlink()
+        """Clear the cache. Cards that are still being generated are not added."""
+        self._n_clears += 1
+        self.cache.clear(self.name)
 
     async def get_from_cache(self, card: TranslationCard) -> Deque[TranslationCard]:
         """Get the cards from the cache, if they exist."""
-        cache_path = self.get_cache_path(card)
-        try:
-            async with aiofiles.open(cache_path) as f:
-                content = await f.read()
-
-            cards = json.loads(content, object_hook=TranslationCard.from_dict)
-
-        except FileNotFoundError:
-            cards = []
-
-        return deque(cards)
+        return await self.cache.get(self.name, self.get_cache_card(card))
 
     async def write_to_cache(
         self,
@@ -373,52 +1039,127 @@ class JSONCachedCardGenerator:
         cards: Iterable[TranslationCard]
             The cards to write to the cache.
         """
-        cache_path = self.get_cache_path(card)
-        await aos.makedirs(cache_path.parent, exist_ok=True)
-        cards_json = json.dumps(list(cards), cls=TranslationCardEncoder)
-        async with aiofiles.open(cache_path, "w") as f:
-            await f.write(cards_json)
+        await self.cache.write(self.name, self.get_cache_card(card), cards)
+
+    @property
+    def streams(self) -> bool:
+        """Whether the cards are added to the cache as soon as they are generated."""
+        return self.stream and hasattr(self.card_generator, "astream")
 
     async def extend_cache(
         self,
         card: TranslationCard,
         n_cards: Optional[int],
         cache_lock: asyncio.Lock,
+        *,
+        fast: bool = False,
     ):
-        """Extend the cache with new cards."""
-        new_cards = await self.card_generator.acall(card, n_cards=n_cards)
+        """Extend the cache with new cards. If `fast`, they are generated by the
+        `fast_card_generator` if there is one."""
+        card_generator = self.card_generator
+        if fast and self.fast_card_generator is not None:
+            card_generator = self.fast_card_generator
+
+        if self.streams:
+            if not hasattr(card_generator, "astream"):
+                card_generator = self.card_generator
+            await self._extend_cache_streaming(
+                card, n_cards, cache_lock, card_generator
+            )
+            return
+
+        n_clears = self._n_clears
+        new_cards = await card_generator.acall(card, n_cards=n_cards)
         async with cache_lock:
-            cards = await self.get_from_cache(card)
-            cards.extend(new_cards)
-            await self.write_to_cache(card, cards)
+            if self._n_clears != n_clears:
+                logger.debug(f"Cache was cleared, discarding new cards for card {card}")
+                return
+            await self.cache.extend(self.name, self.get_cache_card(card), new_cards)
+        get_file_tasks(self.get_cache_key(card)).card_added.set()
         logger.debug(f"Extended cache with {len(new_cards)} new cards for card {card}")
 
+    async def _extend_cache_streaming(
+        self,
+        card: TranslationCard,
+        n_cards: Optional[int],
+        cache_lock: asyncio.Lock,
+        card_generator: CardGenerator,
+    ):
+        n_clears = self._n_clears
+        cache_card = self.get_cache_card(card)
+        card_added = get_file_tasks(self.get_cache_key(card)).card_added
+        n_new_cards = 0
+        async for new_card in card_generator.astream(card, n_cards=n_cards):
+            async with cache_lock:
+                if self._n_clears != n_clears:
+                    logger.debug(
+                        f"Cache was cleared, discarding new cards for card {card}"
+                    )
+                    return
+                await self.cache.extend(self.name, cache_card, [new_card])
+            card_added.set()
+            n_new_cards += 1
+        logger.debug(f"Extended cache with {n_new_cards} new cards for card {card}")
+
+    def _count_merged_variant(
+        self, card: TranslationCard, cache_card: TranslationCard, n_cached: int
+    ):
+        """Count an LLM call as saved if the input card is a new variant of a cache
+        card that already has cards, which would have had to be generated for this
+        variant without normalization."""
+        variants = self._variants(cache_card)
+        is_new_variant = card not in variants and len(variants) > 0
+        variants.add(card)
+        if is_new_variant and n_cached > 0:
+            self.n_llm_calls_saved += 1
+            logger.info(
+                f"Card {card} shares its cached cards with {cache_card}, saving an LLM "
+                f"call ({self.n_llm_calls_saved} saved in total)"
+            )
+
     async def acall(self, card: TranslationCard) -> Iterator[TranslationCard]:
         """Generate language cards from the front text inserted into a prompt."""
-        cache_path = self.get_cache_path(card)
-        cache_lock = get_file_lock(cache_path)
+        cache_card = self.get_cache_card(card)
+        cache_key = self.get_cache_key(card)
+        cache_lock = get_file_lock(cache_key)
+        tasks = get_file_tasks(cache_key)
         async with cache_lock:
-            cards = await self.get_from_cache(card)
-        logger.debug(f"Retrieved {len(cards)} cards from cache for card {card}")
+            n_cached = await self.cache.count(self.name, cache_card)
+            if n_cached == 0:
+                tasks.card_added.clear()
+        logger.debug(f"Found {n_cached} cards in cache for card {card}")
+        self._count_merged_variant(card, cache_card, n_cached)
 
-        tasks = get_file_tasks(cache_path)
         while True:
-            if len(cards) < self.min_cards and not tasks:
+            if n_cached < self.min_cards and not tasks:
                 logger.debug(
-                    f"Cache has {len(cards)} < {self.min_cards} cards, "
+                    f"Cache has {n_cached} < {self.min_cards} cards, "
                     f"generating more for card {card}"
                 )
+                # When streaming, the reviewer waits for the first card of this call
                 get_n_cards = asyncio.create_task(
-                    self.extend_cache(card, n_cards=None, cache_lock=cache_lock)
+                    self.extend_cache(
+                        card,
+                        n_cards=None,
+                        cache_lock=cache_lock,
+                        fast=n_cached == 0 and self.streams,
+                    )
                 )
                 tasks.add(get_n_cards)
                 get_n_cards.add_done_callback(tasks.discard)
 
-            if len(cards) == 0:
+            if n_cached == 0 and self.streams:
+                # We're out of cards, so need to wait for the first streamed card
+                logger.debug("No more cards in cache, waiting for the next new card")
+                await self._wait_for_card_added(tasks)
+            elif n_cached == 0:
                 logger.debug("No more cards in cache, generating one card to be quick")
                 get_1_card = asyncio.create_task(
                     self.extend_cache(
-                        card, n_cards=self.fast_n_cards, cache_lock=cache_lock
+                        card,
+                        n_cards=self.fast_n_cards,
+                        cache_lock=cache_lock,
+                        fast=True,
                     )
                 )
                 tasks.add(get_1_card)
@@ -428,19 +1169,123 @@ class JSONCachedCardGenerator:
                 await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
 
             async with cache_lock:
-                cards = await self.get_from_cache(card)
-                if not cards:
+                new_card = await self.cache.popleft(self.name, cache_card)
+                if new_card is None and tasks and self.streams:
+                    # Another consumer took the new card, so wait for the next one
+                    n_cached = 0
+                    tasks.card_added.clear()
+                    continue
+
+                if new_card is None:
                     logger.warning(
                         f"Failed to generate cards. "
                         f"Stopping the generator for card {card}"
                     )
                     break
 
-                new_card = cards.popleft()
-                await self.write_to_cache(card, cards)
+                n_cached = await self.cache.count(self.name, cache_card)
+                if n_cached == 0:
+                    tasks.card_added.clear()
 
             yield new_card
 
+    @staticmethod
+    async def _wait_for_card_added(tasks: TaskSet):
+        """Wait until a task adds a card to the cache, or until all tasks are done."""
+        if not tasks:
+            return
+
+        card_added = asyncio.create_task(tasks.card_added.wait())
+        try:
+            await asyncio.wait(
+                [card_added, *tasks], return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            card_added.cancel()
+
+    async def fill_cache(self, card: TranslationCard) -> int:
+        """Fill the cache up to `min_cards` cards for the given card, without taking
+        any cards from it. Returns the number of cards that were added."""
+        cache_card = self.get_cache_card(card)
+        cache_key = self.get_cache_key(card)
+        cache_lock = get_file_lock(cache_key)
+        async with cache_lock:
+            n_cached = await self.cache.count(self.name, cache_card)
+        if n_cached >= self.min_cards:
+            return 0
+
+        tasks = get_file_tasks(cache_key)
+        if tasks:
+            # The cache is already being filled
+            await asyncio.wait(list(tasks))
+        else:
+            logger.debug(f"Filling cache with {n_cached} cards for card {card}")
+            fill = asyncio.create_task(
+                self.extend_cache(card, n_cards=None, cache_lock=cache_lock)
+            )
+            tasks.add(fill)
+            fill.add_done_callback(tasks.discard)
+            await fill
+
+        async with cache_lock:
+            return max(await self.cache.count(self.name, cache_card) - n_cached, 0)
+
+    async def fill_cache_batch(self, cards: Iterable[TranslationCard]) -> int:
+        """Fill the caches up to `min_cards` cards for several input cards, without
+        taking any cards from them. Returns the number of cards that were added.
+
+        If the card generator has an `abatch` method, the cards for all input cards
+        that need them are generated at once. Otherwise, the caches are filled one
+        by one.
+        """
+        if not hasattr(self.card_generator, "abatch"):
+            n_added = 0
+            for card in cards:
+                n_added += await self.fill_cache(card)
+            return n_added
+
+        to_fill: Dict[Hashable, TranslationCard] = {}
+        for card in cards:
+            cache_key = self.get_cache_key(card)
+            if cache_key in to_fill or get_file_tasks(cache_key):
+                # The cache is already being filled
+                continue
+
+            async with get_file_lock(cache_key):
+                n_cached = await self.cache.count(self.name, self.get_cache_card(card))
+            if n_cached < self.min_cards:
+                to_fill[cache_key] = card
+
+        if not to_fill:
+            return 0
+
+        logger.debug(f"Filling caches for {len(to_fill)} cards with a single batch")
+        fill = asyncio.create_task(self._extend_cache_batch(to_fill))
+        for cache_key in to_fill:
+            tasks = get_file_tasks(cache_key)
+            tasks.add(fill)
+            fill.add_done_callback(tasks.discard)
+
+        return await fill
+
+    async def _extend_cache_batch(
+        self, to_fill: Dict[Hashable, TranslationCard]
+    ) -> int:
+        n_clears = self._n_clears
+        batch_cards = await self.card_generator.abatch(list(to_fill.values()))
+        n_added = 0
+        for (cache_key, card), new_cards in zip(to_fill.items(), batch_cards):
+            async with get_file_lock(cache_key):
+                if self._n_clears != n_clears:
+                    logger.debug("Cache was cleared, discarding new cards of the batch")
+                    return n_added
+                await self.cache.extend(self.name, self.get_cache_card(card), new_cards)
+            get_file_tasks(cache_key).card_added.set()
+            n_added += len(new_cards)
+
+        logger.debug(f"Extended caches with {n_added} new cards of the batch")
+        return n_added
+
     def __call__(self, card: TranslationCard) -> Iterator[TranslationCard]:
         """Generate language cards from the front text inserted into a prompt."""
         card_iterator = self.acall(card).__aiter__()
@@ -453,6 +1298,10 @@ class JSONCachedCardGenerator:
             yield new_card
 
 
+# Kept for backwards compatibility, from when the cards could only be cached as JSON
+JSONCachedCardGenerator = CachedCardGenerator
+
+
 class NextCardFactory(CardFactory):
     """Can be called to take the next language card from a card generator."""
 
@@ -494,14 +1343,44 @@ def create_card_generator(config: CardGeneratorConfig, url: Optional[str] = None
     return card_generator
 
 
-def create_card_factory(config: CardGeneratorConfig) -> CardFactory:
-    """Create a CardFactory from the config."""
+def create_cached_card_generator(config: CardGeneratorConfig) -> CachedCardGenerator:
+    """Create a CardGenerator from the config that caches the generated cards."""
     card_generator = create_card_generator(config)
 
     name = config.to_path_friendly_str()
-    card_generator = JSONCachedCardGenerator(card_generator, name=name)
+    return CachedCardGenerator(
+        card_generator,
+        name=name,
+        cache=get_card_cache(),
+        normalizer=get_card_normalizer(),
+        stream=get_stream_cards(),
+        fast_card_generator=create_hedged_card_generator(config, card_generator),
+    )
+
+
+def create_hedged_card_generator(
+    config: CardGeneratorConfig, card_generator: CardGenerator
+) -> Optional[HedgedCardGenerator]:
+    """Create a HedgedCardGenerator for the card generator with the hedging policy
+    from the config, or None if hedging is disabled."""
+    policy = get_hedging_policy()
+    if policy is None:
+        return None
+
+    hedge_card_generator = None
+    if policy.llm is not None and policy.llm != config.llm:
+        hedge_card_generator = create_card_generator(replace(config, llm=policy.llm))
+
+    return HedgedCardGenerator(card_generator, hedge_card_generator, policy=policy)
+
+
+def create_card_factory(config: CardGeneratorConfig) -> CardFactory:
+    """Create a CardFactory from the config."""
+    card_generator = create_cached_card_generator(config)
     card_factory = NextCardFactory(card_generator)
-    card_factory = lru_cache(maxsize=None)(card_factory)
+    card_factory = BoundedRegistry(
+        card_factory, maxsize=REGISTRY_MAXSIZE, ttl=REGISTRY_TTL
+    )
     return card_factory
 
 
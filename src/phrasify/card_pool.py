@@ -0,0 +1,144 @@
+import asyncio
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, Hashable, List, Optional
+
+from .caches.base import CardCache
+from .card import TranslationCard
+from .card_gen import CardGenerator, CardGeneratorConfig, LLMTranslationCardGenerator
+from .constants import REGISTRY_MAXSIZE, REGISTRY_TTL
+from .factory import get_shared_card_cache
+from .logging import get_logger
+from .registry import BoundedRegistry
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CardPool:
+    """Pool of pre-generated cards for each (config, input card), which is shared
+    between processes through a CardCache like `RedisCardCache`.
+
+    Every card in the pool is handed out only once, so each request gets fresh cards.
+    If the pool doesn't have enough cards, the missing cards are generated right away.
+    After every request, the pool is refilled in the background up to `reserve`
+    requests worth of cards. The cache's refill claim makes sure that only one process
+    refills the pool for the same (config, input card) at a time.
+
+    Parameters
+    ----------
+    cache : CardCache
+        Cache that holds the pool. Must take cards atomically, also between
+        processes, to hand out every card only once.
+    reserve : int
+        Number of requests that the pool should be able to serve for each (config,
+        input card) without waiting for the LLM.
+    refill_timeout : float
+        Maximum number of seconds that a refill may take.
+    create_card_generator : Callable[[CardGeneratorConfig], CardGenerator]
+        Creates the card generator for a config.
+    """
+
+    cache: CardCache
+    reserve: int = 2
+    refill_timeout: float = 60.0
+    create_card_generator: Callable[[CardGeneratorConfig], CardGenerator] = (
+        LLMTranslationCardGenerator.from_config
+    )
+    _card_generators: BoundedRegistry[CardGeneratorConfig, CardGenerator] = field(
+        init=False, repr=False
+    )
+    _refills: Dict[Hashable, asyncio.Task] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        self._card_generators = BoundedRegistry(
+            self.create_card_generator, maxsize=REGISTRY_MAXSIZE, ttl=REGISTRY_TTL
+        )
+
+    async def take(
+        self,
+        config: CardGeneratorConfig,
+        card: TranslationCard,
+        n_cards: Optional[int] = None,
+    ) -> List[TranslationCard]:
+        """Take `n_cards` cards for the input card from the pool, generating the
+        cards that are missing. Defaults to the number of cards in the config."""
+        if n_cards is None:
+            n_cards = config.n_cards
+
+        name = config.to_path_friendly_str()
+        cards = []
+        while len(cards) < n_cards:
+            pooled_card = await self.cache.popleft(name, card)
+            if pooled_card is None:
+                break
+            cards.append(pooled_card)
+
+        n_missing = n_cards - len(cards)
+        if n_missing > 0:
+            logger.debug(f"Pool has too few cards for card {card}, generating them")
+            card_generator = self._card_generators(config)
+            cards.extend(await card_generator.acall(card, n_cards=n_missing))
+
+        self._schedule_refill(config, card)
+        return cards
+
+    def _schedule_refill(self, config: CardGeneratorConfig, card: TranslationCard):
+        key = (config, self.cache.get_key(config.to_path_friendly_str(), card))
+        refill = self._refills.get(key)
+        if refill is not None and not refill.done():
+            return
+
+        refill = asyncio.create_task(self.refill(config, card))
+        self._refills[key] = refill
+
+        def forget_refill(task: asyncio.Task):
+            if self._refills.get(key) is task:
+                del self._refills[key]
+
+        refill.add_done_callback(forget_refill)
+
+    async def refill(self, config: CardGeneratorConfig, card: TranslationCard) -> int:
+        """Refill the pool for the input card up to `reserve` requests worth of cards.
+
+        Returns the number of cards that were added.
+        """
+        name = config.to_path_friendly_str()
+        n_wanted = self.reserve * config.n_cards - await self.cache.count(name, card)
+        if n_wanted <= 0:
+            return 0
+
+        if not await self.cache.claim_refill(name, card, ttl=self.refill_timeout):
+            logger.debug(f"Pool for card {card} is already being refilled")
+            return 0
+
+        try:
+            card_generator = self._card_generators(config)
+            new_cards = await asyncio.wait_for(
+                card_generator.acall(card, n_cards=n_wanted), self.refill_timeout
+            )
+            await self.cache.extend(name, card, new_cards)
+            logger.debug(f"Refilled pool with {len(new_cards)} cards for card {card}")
+            return len(new_cards)
+        except Exception:
+            logger.exception(f"Failed to refill the pool for card {card}")
+            return 0
+        finally:
+            await self.cache.release_refill(name, card)
+
+    async def wait_for_refills(self):
+        """Wait until all refills that are running have finished."""
+        if self._refills:
+            await asyncio.wait(list(self._refills.values()))
+
+
+@lru_cache(maxsize=None)
+def get_card_pool() -> Optional[CardPool]:
+    """Get the card pool on the shared card store, or None if no card store is set."""
+    card_cache = get_shared_card_cache()
+    if card_cache is None:
+        return None
+
+    return CardPool(card_cache)
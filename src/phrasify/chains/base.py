@@ -1,7 +1,7 @@
 import asyncio
 from abc import ABC, abstractmethod
 from functools import partial
-from typing import Any, Generic, Optional, TypeVar
+from typing import Any, AsyncIterator, Generic, Optional, TypeVar
 
 from ..error import ChainError
 
@@ -12,8 +12,8 @@ TOut_co = TypeVar("TOut_co", covariant=True)
 class Chain(ABC, Generic[TIn_contra, TOut_co]):
     """Base Chain abstract class.
 
-    Adapted from langchain's Chain base class, but simplified to only expose the _call
-    and _acall methods where the arguments are only the input and kwargs.
+    Adapted from langchain's Chain base class, but simplified to only expose the _call,
+    _acall and _astream methods where the arguments are only the input and kwargs.
     """
 
     @abstractmethod
@@ -52,6 +52,24 @@ class Chain(ABC, Generic[TIn_contra, TOut_co]):
         """Run the LLM async on the given input `x`."""
         return await self._acall(x, **kwargs)
 
+    async def _astream(
+        self,
+        x: TIn_contra,
+        **kwargs: Any,
+    ) -> AsyncIterator[TOut_co]:
+        """Run the chain async on the given input `x`, yielding the output in chunks
+        as it is generated. By default, the whole output is a single chunk."""
+        yield await self._acall(x, **kwargs)
+
+    def astream(
+        self,
+        x: TIn_contra,
+        **kwargs: Any,
+    ) -> AsyncIterator[TOut_co]:
+        """Run the chain async on the given input `x`, yielding the output in chunks
+        as it is generated."""
+        return self._astream(x, **kwargs)
+
     def _raise(
         self, error: Optional[Exception] = None, message: Optional[str] = None
     ) -> ChainError:
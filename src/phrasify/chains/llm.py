@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Any, Coroutine, Dict
+from typing import Any, AsyncIterator, Coroutine, Dict
 
 from ..error import LLMError
 from ..llms.base import LLM
@@ -36,3 +36,13 @@ class LLMChain(Chain[LLMChainInput, str]):
             self._raise(e)
 
         return text
+
+    async def _astream(self, x: Dict[str, Any], **kwargs: Any) -> AsyncIterator[str]:
+        """Run the chain on the given input `x`, yielding the LLM's response in
+        chunks as it is generated."""
+        prompt = self.prompt.format(**x)
+        try:
+            async for chunk in self.llm.astream(prompt, **kwargs):
+                yield chunk
+        except LLMError as e:
+            self._raise(e)
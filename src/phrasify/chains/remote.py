@@ -1,8 +1,9 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Any, Dict, Union
 
 import requests
 
+from ..sessions import RequestsSessionPool
 from .base import Chain
 
 
@@ -10,12 +11,14 @@ from .base import Chain
 class RemoteChain(Chain[Dict[str, Any], Union[str, Dict[str, Any]]]):
     """Chain that calls an API to generate a response.
 
-    Adapted from langserve.RemoteRunnable.
+    Adapted from langserve.RemoteRunnable. The requests reuse the connections of
+    `requests_sessions`, e.g. the shared ones from `factory.get_requests_session_pool`.
     """
 
-    def __init__(self, api_url: str):
-        """Initialize the chain with the given API URL."""
-        self.api_url = api_url
+    api_url: str
+    requests_sessions: RequestsSessionPool = field(
+        default_factory=RequestsSessionPool, repr=False, compare=False
+    )
 
     @property
     def invoke_url(self):
@@ -26,7 +29,9 @@ class RemoteChain(Chain[Dict[str, Any], Union[str, Dict[str, Any]]]):
     ) -> Union[str, Dict[str, Any]]:
         """Run the chain on the given input `x`."""
         try:
-            response = requests.post(self.invoke_url, json={"input": x}, timeout=30)
+            response = self.requests_sessions.post(
+                self.invoke_url, json={"input": x}, timeout=30
+            )
         except requests.ReadTimeout as e:
             self._raise(e)
 
@@ -6,8 +6,16 @@ LIB_DIR = ROOT_DIR / "lib"
 USER_FILES_DIR = ROOT_DIR / "user_files"
 DOTENV_PATH = USER_FILES_DIR / ".env"
 PROMPT_DIR = USER_FILES_DIR / "prompts"
+BATCH_PROMPT_DIR = PROMPT_DIR / "batch"
 GENERATED_CARDS_DIR = USER_FILES_DIR / "generated_cards"
 DEFAULT_N_CARDS = 5
 DEFAULT_MIN_CARDS = 3
+DEFAULT_BATCH_SIZE = 10
 DEFAULT_SOURCE_LANGUAGE = "English"
 DEFAULT_TARGET_LANGUAGE = "Ukrainian"
+REGISTRY_MAXSIZE = 1024
+REGISTRY_TTL = 60 * 60
+MAX_REMOTE_BATCH_SIZE = 100
+REMOTE_TIMEOUT = 30.0
+REMOTE_BATCH_TIMEOUT = 300.0
+TIMEOUT_HEADER = "X-Phrasify-Timeout"
@@ -1,7 +1,31 @@
 import asyncio
+import atexit
 from asyncio import AbstractEventLoop, Future
 from threading import Thread
-from typing import Coroutine
+from typing import Any, Callable, Coroutine, Dict, List
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+ShutdownCallback = Callable[[], Coroutine[Any, Any, Any]]
+
+_shutdown_callbacks: List[ShutdownCallback] = []
+_event_loop_threads: Dict[AbstractEventLoop, Thread] = {}
+
+
+def add_shutdown_callback(callback: ShutdownCallback) -> None:
+    """Register a coroutine function to be run on the background event loop right
+    before it shuts down, e.g. to flush caches to disk."""
+    _shutdown_callbacks.append(callback)
+
+
+def run_shutdown_callbacks(loop: AbstractEventLoop) -> None:
+    for callback in _shutdown_callbacks:
+        try:
+            loop.run_until_complete(callback())
+        except Exception:
+            logger.exception(f"Error in shutdown callback {callback}")
 
 
 def start_background_loop(loop: AbstractEventLoop) -> None:
@@ -11,6 +35,7 @@ def start_background_loop(loop: AbstractEventLoop) -> None:
     finally:
         # Wait one second, then cancel all tasks and shutdown the loop
         loop.run_until_complete(asyncio.sleep(1.0))
+        run_shutdown_callbacks(loop)
         cancel_tasks(loop)
         loop.run_until_complete(loop.shutdown_asyncgens())
         loop.run_until_complete(loop.shutdown_default_executor())
@@ -22,9 +47,7 @@ def cancel_tasks(loop: AbstractEventLoop) -> None:
     for task in to_cancel:
         task.cancel()
 
-    loop.run_until_complete(
-        asyncio.gather(*to_cancel, loop=loop, return_exceptions=True)
-    )
+    loop.run_until_complete(asyncio.gather(*to_cancel, return_exceptions=True))
 
 
 def create_event_loop_thread() -> AbstractEventLoop:
@@ -34,12 +57,29 @@ def create_event_loop_thread() -> AbstractEventLoop:
     event_loop = asyncio.new_event_loop()
     thread = Thread(target=start_background_loop, args=(event_loop,), daemon=True)
     thread.start()
+    _event_loop_threads[event_loop] = thread
     return event_loop
 
 
 EVENT_LOOP = create_event_loop_thread()
 
 
+def stop_event_loop_thread(
+    event_loop: AbstractEventLoop = EVENT_LOOP, timeout: float = 10.0
+) -> None:
+    """Stop the event loop running in a background thread and wait for it to shut
+    down, so that the shutdown callbacks get to run."""
+    thread = _event_loop_threads.pop(event_loop, None)
+    if thread is None or not thread.is_alive():
+        return
+
+    event_loop.call_soon_threadsafe(event_loop.stop)
+    thread.join(timeout)
+
+
+atexit.register(stop_event_loop_thread)
+
+
 def run_coroutine_in_thread(coro: Coroutine) -> Future:
     """
     From https://gist.github.com/dmfigol/3e7d5b84a16d076df02baa9f53271058
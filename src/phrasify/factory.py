@@ -3,22 +3,62 @@
 These functions are used to parse user input.
 """
 
+import os
 import re
 from functools import lru_cache
+from pathlib import Path
 from typing import Optional
+from urllib.parse import urlsplit
 
+from .caches.append_log import AppendLogCardCache
+from .caches.base import CardCache
+from .caches.eviction import CacheEvictor, EvictionPolicy
+from .caches.json_file import JSONFileCardCache
+from .caches.redis import RedisCardCache
+from .caches.responses import ResponseCache
+from .caches.sqlite import SQLiteCardCache
+from .caches.write_back import WriteBackCardCache
 from .config import config
-from .constants import PROMPT_DIR
+from .constants import BATCH_PROMPT_DIR, GENERATED_CARDS_DIR, PROMPT_DIR
+from .event_loop import EVENT_LOOP, add_shutdown_callback
+from .hedging import HedgingPolicy
+from .llms.base import LLM
+from .llms.cached import CachedLLM
+from .llms.fallback import CircuitBreaker, CircuitBreakerConfig, FallbackLLM
 from .llms.ollama import Ollama
+from .llms.ollama_pool import OllamaPool
 from .llms.openai import OpenAI
+from .normalize import CardNormalizer
+from .ollama import get_ollama_urls
+from .rate_limit import RateLimit, RateLimiter
+from .sessions import ClientSessionConfig, ClientSessionPool, RequestsSessionPool
+from .singleflight import SingleFlight
 
 __all__ = [
     "get_llm",
+    "get_client_session_pool",
+    "get_requests_session_pool",
+    "get_openai_rate_limiter",
     "get_prompt",
+    "get_batch_prompt",
     "get_llm_name",
     "get_prompt_name",
     "get_api_url",
     "get_api_location",
+    "get_card_cache",
+    "get_card_cache_name",
+    "create_cache_evictor",
+    "evict_card_cache",
+    "get_cache_evictor",
+    "get_card_normalizer",
+    "get_stream_cards",
+    "get_hedging_policy",
+    "get_response_cache",
+    "get_circuit_breaker",
+    "get_ollama_pool",
+    "get_single_flight",
+    "get_card_store_url",
+    "get_shared_card_cache",
 ]
 
 
@@ -30,16 +70,129 @@ def get_llm_name(llm_name: Optional[str] = None):
     return llm_name
 
 
-def get_llm(llm_name: Optional[str] = None):
-    """Get the LLM object for the given LLM name."""
+@lru_cache(maxsize=None)
+def get_client_session_pool() -> ClientSessionPool:
+    """Get the HTTP sessions that are shared by the LLMs, with the connection settings
+    from the config. The session on the background event loop is closed when it
+    shuts down."""
+    session_config = ClientSessionConfig.from_config(config.get("httpSession"))
+    sessions = ClientSessionPool(session_config)
+    add_shutdown_callback(sessions.close)
+    return sessions
+
+
+@lru_cache(maxsize=None)
+def get_requests_session_pool() -> RequestsSessionPool:
+    """Get the sync HTTP sessions that are shared by everything that calls an API
+    from a thread, like the LLMs and the remote card generator. They use the
+    connection settings from the config."""
+    session_config = ClientSessionConfig.from_config(config.get("httpSession"))
+    return RequestsSessionPool(session_config)
+
+
+@lru_cache(maxsize=None)
+def get_openai_rate_limiter() -> Optional[RateLimiter]:
+    """Get the rate limiter that is shared by the OpenAI LLMs, with the limits from
+    the config, or None if OpenAI's calls shouldn't be rate limited."""
+    rate_limit = RateLimit.from_config(config.get("openaiRateLimit"))
+    if rate_limit is None:
+        return None
+
+    return RateLimiter(rate_limit)
+
+
+def get_response_cache_enabled(*, enabled: Optional[bool] = None) -> bool:
+    """Get whether the LLM responses are cached. If none is given, use the
+    `PHRASIFY_RESPONSE_CACHE` environment variable, or else the config."""
+    if enabled is None:
+        enabled_env = os.getenv("PHRASIFY_RESPONSE_CACHE")
+        if enabled_env:
+            enabled = enabled_env.lower() == "true"
+        else:
+            enabled = (config.get("responseCache") or {}).get("enabled", False)
+
+    return enabled
+
+
+@lru_cache(maxsize=None)
+def get_response_cache(*, enabled: Optional[bool] = None) -> Optional[ResponseCache]:
+    """Get the cache of the LLM responses, with the limits from the config, or None
+    if the responses aren't cached."""
+    if not get_response_cache_enabled(enabled=enabled):
+        return None
+
+    return ResponseCache.from_config(config.get("responseCache"))
+
+
+def get_llm(llm_name: Optional[str] = None) -> LLM:
+    """Get the LLM object for the given LLM name. Its responses are cached if the
+    response cache is enabled.
+
+    A comma-separated list of LLM names, like `gpt-3.5-turbo,ollama-mistral`, gives a
+    FallbackLLM that calls the first LLM that is healthy.
+    """
+    llm = _get_uncached_llm(llm_name)
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        llm = CachedLLM(llm, response_cache)
+
+    return llm
+
+
+@lru_cache(maxsize=None)
+def get_circuit_breaker(llm_name: str) -> CircuitBreaker:
+    """Get the circuit breaker of the LLM with the given name, with the settings from
+    the config. It is shared by all fallback LLMs that use the LLM."""
+    breaker_config = CircuitBreakerConfig.from_config(config.get("circuitBreaker"))
+    return CircuitBreaker(llm_name, breaker_config)
+
+
+@lru_cache(maxsize=None)
+def get_ollama_pool(model: str) -> OllamaPool:
+    """Get the pool that balances the calls to the model over the Ollama servers in
+    `OLLAMA_URL`, with the settings from the config. Its health checks run on the
+    background event loop."""
+    pool_config = config.get("ollamaPool") or {}
+    pool = OllamaPool(
+        get_ollama_urls(),
+        model,
+        strategy=pool_config.get("strategy", "ewma"),
+        max_failures=pool_config.get("maxFailures", 3),
+        health_check_interval=pool_config.get("healthCheckInterval", 10.0),
+        sessions=get_client_session_pool(),
+        requests_sessions=get_requests_session_pool(),
+    )
+    pool.start_health_checks(EVENT_LOOP)
+    return pool
+
+
+def _get_uncached_llm(llm_name: Optional[str] = None) -> LLM:
     llm_name = get_llm_name(llm_name)
 
-    if llm_name.startswith("gpt-"):
-        return OpenAI(llm_name)
+    if "," in llm_name:
+        llm_names = [name.strip() for name in llm_name.split(",")]
+        return FallbackLLM(
+            [_get_uncached_llm(name) for name in llm_names],
+            breakers=[get_circuit_breaker(name) for name in llm_names],
+        )
+    elif llm_name.startswith("gpt-"):
+        return OpenAI(
+            llm_name,
+            sessions=get_client_session_pool(),
+            requests_sessions=get_requests_session_pool(),
+            rate_limiter=get_openai_rate_limiter(),
+        )
     elif llm_name.startswith("ollama-"):
         ollama_re = re.compile(r"ollama-(?P<ollama_name>.*)")
         ollama_name = ollama_re.match(llm_name).group("ollama_name")
-        return Ollama(ollama_name)
+        if len(get_ollama_urls()) > 1:
+            return get_ollama_pool(ollama_name)
+
+        return Ollama(
+            ollama_name,
+            sessions=get_client_session_pool(),
+            requests_sessions=get_requests_session_pool(),
+        )
     else:
         msg = f"Invalid LLM name: {llm_name}"
         raise ValueError(msg)
@@ -63,6 +216,20 @@ def get_prompt(prompt_name: Optional[str] = None):
     return prompt
 
 
+@lru_cache(maxsize=None)
+def get_batch_prompt(prompt_name: Optional[str] = None) -> Optional[str]:
+    """Get the prompt text for generating cards for several input cards at once, for
+    the given prompt name. Returns None if there is no batch version of the prompt."""
+    prompt_name = get_prompt_name(prompt_name)
+    prompt_path = BATCH_PROMPT_DIR / f"{prompt_name}.txt"
+    try:
+        with open(prompt_path) as f:
+            prompt = f.read()
+    except FileNotFoundError:
+        return None
+    return prompt
+
+
 def get_api_location(api_location: Optional[str] = None):
     """Get the API location. If none is given, use the default from the config."""
     if api_location is None:
@@ -86,3 +253,157 @@ def get_api_url(api_location: Optional[str] = None):
 
     message = f"Invalid API location: {api_location!r}"
     raise ValueError(message)
+
+
+def get_card_cache_name(card_cache_name: Optional[str] = None):
+    """Get the name of the card cache backend. If none is given, use the default from
+    the config."""
+    if card_cache_name is None:
+        card_cache_name = config.get("cacheBackend", "log")
+
+    return card_cache_name
+
+
+# Card cache backends that store the cards in files, which are bounded by evicting
+FILE_CARD_CACHE_NAMES = ("log", "json")
+
+
+def create_cache_evictor() -> Optional[CacheEvictor]:
+    """Create the evictor for the file-based card caches without starting it.
+
+    Returns None if the eviction policy in the config doesn't bound the cache.
+    """
+    policy = EvictionPolicy.from_config(config.get("cacheEviction") or {})
+    if not policy.is_bounded:
+        return None
+
+    return CacheEvictor(GENERATED_CARDS_DIR, policy)
+
+
+@lru_cache(maxsize=None)
+def get_cache_evictor() -> Optional[CacheEvictor]:
+    """Get the evictor for the file-based card caches, running in the background.
+
+    Returns None if the eviction policy in the config doesn't bound the cache.
+    """
+    evictor = create_cache_evictor()
+    if evictor is not None:
+        evictor.start(EVENT_LOOP)
+    return evictor
+
+
+def evict_card_cache(card_cache_name: Optional[str] = None) -> None:
+    """Evict entries from the file-based card cache in a single pass over it, e.g.
+    after filling it from processes that don't evict."""
+    if get_card_cache_name(card_cache_name) not in FILE_CARD_CACHE_NAMES:
+        return
+
+    evictor = create_cache_evictor()
+    if evictor is not None:
+        evictor.run_pass()
+
+
+def _get_card_cache_backend(card_cache_name: str, *, evict: bool) -> CardCache:
+    if card_cache_name in FILE_CARD_CACHE_NAMES and evict:
+        get_cache_evictor()
+
+    if card_cache_name == "log":
+        return AppendLogCardCache()
+
+    if card_cache_name == "json":
+        return JSONFileCardCache()
+
+    if card_cache_name == "sqlite":
+        return SQLiteCardCache()
+
+    message = f"Invalid card cache backend: {card_cache_name!r}"
+    raise ValueError(message)
+
+
+@lru_cache(maxsize=None)
+def get_card_cache(
+    card_cache_name: Optional[str] = None,
+    *,
+    write_back: Optional[bool] = None,
+    evict: bool = True,
+) -> CardCache:
+    """Get the card cache for the given card cache backend name.
+
+    The same arguments always give the same card cache, so that e.g. a single
+    connection to the SQLite database is shared. Unless disabled in the config, the
+    cards are held in memory and written back to the backend in the background. If
+    `evict`, the file-based caches are evicted from in the background.
+    """
+    card_cache_name = get_card_cache_name(card_cache_name)
+    card_cache = _get_card_cache_backend(card_cache_name, evict=evict)
+
+    if write_back is None:
+        write_back = config.get("cacheWriteBack", True)
+
+    if write_back:
+        card_cache = WriteBackCardCache(card_cache)
+        add_shutdown_callback(card_cache.flush)
+
+    return card_cache
+
+
+def get_card_normalizer() -> Optional[CardNormalizer]:
+    """Get the normalizer for the cache keys from the config, or None if the input
+    cards are cached as they are."""
+    return CardNormalizer.from_config(config.get("normalizeCards"))
+
+
+def get_stream_cards(*, stream_cards: Optional[bool] = None) -> bool:
+    """Get whether the cards are cached as soon as the LLM has generated them. If
+    none is given, use the default from the config."""
+    if stream_cards is None:
+        stream_cards = config.get("streamCards", True)
+
+    return stream_cards
+
+
+@lru_cache(maxsize=None)
+def get_hedging_policy() -> Optional[HedgingPolicy]:
+    """Get the policy for hedging the fast calls that generate a single card, or None
+    if they shouldn't be hedged."""
+    return HedgingPolicy.from_config(config.get("hedging"))
+
+
+@lru_cache(maxsize=None)
+def get_single_flight() -> SingleFlight:
+    """Get the SingleFlight that merges the identical card generation calls that are
+    in flight at the same time, shared by all card generators."""
+    return SingleFlight()
+
+
+def get_card_store_url(card_store_url: Optional[str] = None) -> Optional[str]:
+    """Get the URL of the card store that is shared between processes. If none is
+    given, use the `PHRASIFY_CARD_STORE_URL` environment variable."""
+    if card_store_url is None:
+        card_store_url = os.getenv("PHRASIFY_CARD_STORE_URL") or None
+
+    return card_store_url
+
+
+@lru_cache(maxsize=None)
+def get_shared_card_cache(card_store_url: Optional[str] = None) -> Optional[CardCache]:
+    """Get the card cache on the shared card store, or None if there is none.
+
+    The URL is either a Redis URL like `redis://redis:6379/0`, or a URL like
+    `sqlite:////absolute/path/to/cards.sqlite3` for an SQLite database that is shared
+    by the processes on a single machine. Like in SQLAlchemy, a relative path follows
+    the third slash.
+    """
+    card_store_url = get_card_store_url(card_store_url)
+    if card_store_url is None:
+        return None
+
+    scheme = urlsplit(card_store_url).scheme
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisCardCache(url=card_store_url)
+
+    if scheme == "sqlite":
+        return SQLiteCardCache(path=Path(card_store_url[len("sqlite:///") :]))
+
+    message = f"Invalid card store URL: {card_store_url!r}"
+    raise ValueError(message)
@@ -0,0 +1,321 @@
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from .card import TranslationCard
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class HedgingPolicy:
+    """When to send a duplicate (hedge) request for a call that is slow to return.
+
+    Parameters
+    ----------
+    percentile : float
+        Percentile of the observed latencies after which the hedge is sent, e.g. 95
+        to hedge the slowest 5% of the calls.
+    initial_delay : float
+        Number of seconds after which the hedge is sent until `min_samples`
+        latencies have been observed.
+    min_delay : float
+        Minimum number of seconds after which the hedge is sent, so that a burst of
+        fast calls doesn't make every call hedge.
+    max_delay : float
+        Maximum number of seconds after which the hedge is sent.
+    window : int
+        Number of most recent latencies that the percentile is computed over.
+    min_samples : int
+        Number of latencies that need to be observed before the percentile is used.
+    llm : Optional[str]
+        LLM that the hedge is sent to, e.g. `ollama-mistral`. Use None to send it to
+        the same LLM as the original call.
+    """
+
+    percentile: float = 95.0
+    initial_delay: float = 2.0
+    min_delay: float = 0.1
+    max_delay: float = 10.0
+    window: int = 100
+    min_samples: int = 10
+    llm: Optional[str] = None
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> Optional["HedgingPolicy"]:
+        """Create the hedging policy from the `hedging` section of the config.
+        Returns None if the section is `null`, which disables hedging."""
+        if config is None:
+            return None
+
+        defaults = cls()
+        return cls(
+            percentile=config.get("percentile", defaults.percentile),
+            initial_delay=config.get("initialDelay", defaults.initial_delay),
+            min_delay=config.get("minDelay", defaults.min_delay),
+            max_delay=config.get("maxDelay", defaults.max_delay),
+            window=config.get("window", defaults.window),
+            min_samples=config.get("minSamples", defaults.min_samples),
+            llm=config.get("llm", defaults.llm),
+        )
+
+
+class LatencyTracker:
+    """Keeps the most recent `window` latencies to compute their percentiles."""
+
+    def __init__(self, window: int = 100):
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        """Add an observed latency."""
+        self._latencies.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Get the given percentile (0-100) of the latencies, using the nearest-rank
+        method. Returns None if no latencies have been observed."""
+        if not self._latencies:
+            return None
+
+        latencies = sorted(self._latencies)
+        rank = math.ceil(percentile / 100 * len(latencies))
+        return latencies[min(max(rank, 1), len(latencies)) - 1]
+
+    def __len__(self):
+        return len(self._latencies)
+
+
+def _has_cards(task: asyncio.Task) -> bool:
+    """Whether a finished task returned cards."""
+    return task.exception() is None and len(task.result()) > 0
+
+
+async def _astream(
+    card_generator: Any, card: TranslationCard, n_cards: Optional[int]
+) -> AsyncIterator[TranslationCard]:
+    """Stream the cards of the card generator, or all cards at once if it can't
+    stream."""
+    stream = getattr(card_generator, "astream", None)
+    if stream is None:
+        for new_card in await card_generator.acall(card, n_cards=n_cards):
+            yield new_card
+        return
+
+    async for new_card in stream(card, n_cards=n_cards):
+        yield new_card
+
+
+async def _next_card(stream: AsyncIterator[TranslationCard]) -> TranslationCard:
+    return await stream.__anext__()
+
+
+async def _close_stream(task: asyncio.Task, stream: AsyncIterator[TranslationCard]):
+    """Cancel the wait for the next card of the stream and close it."""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await stream.aclose()
+
+
+@dataclass
+class HedgedCardGenerator:
+    """Card generator whose async calls send a hedge request to `hedge_card_generator`
+    if `card_generator` hasn't returned after a percentile of its observed latencies.
+
+    The first call that returns cards wins and the other one is cancelled. A call that
+    fails or returns no cards doesn't win, so the other call is waited for instead. If
+    the original call fails before the hedge would be sent, the hedge is sent right
+    away. Sync calls aren't hedged.
+
+    Streamed calls are hedged on the time until their first card: the stream that
+    yields a card first wins and the rest of the cards come from that stream.
+
+    `hedge_rate` is the fraction of the calls that were hedged, and `win_rate` the
+    fraction of the hedged calls that were won by the hedge.
+    """
+
+    card_generator: Any
+    hedge_card_generator: Optional[Any] = None
+    policy: HedgingPolicy = field(default_factory=HedgingPolicy)
+    n_calls: int = field(default=0, init=False, compare=False)
+    n_hedged: int = field(default=0, init=False, compare=False)
+    n_hedge_wins: int = field(default=0, init=False, compare=False)
+    _latencies: LatencyTracker = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.hedge_card_generator is None:
+            self.hedge_card_generator = self.card_generator
+        self._latencies = LatencyTracker(self.policy.window)
+
+    @property
+    def hedge_delay(self) -> float:
+        """Number of seconds after which the next call sends a hedge request."""
+        if len(self._latencies) < self.policy.min_samples:
+            return self.policy.initial_delay
+
+        delay = self._latencies.percentile(self.policy.percentile)
+        return min(max(delay, self.policy.min_delay), self.policy.max_delay)
+
+    @property
+    def hedge_rate(self) -> float:
+        """Fraction of the calls that sent a hedge request."""
+        return self.n_hedged / self.n_calls if self.n_calls else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        """Fraction of the hedged calls that were won by the hedge request."""
+        return self.n_hedge_wins / self.n_hedged if self.n_hedged else 0.0
+
+    def __call__(
+        self, card: TranslationCard, n_cards: Optional[int] = None
+    ) -> List[TranslationCard]:
+        return self.card_generator(card, n_cards=n_cards)
+
+    async def acall(
+        self, card: TranslationCard, n_cards: Optional[int] = None
+    ) -> List[TranslationCard]:
+        """Generate cards for the input card, hedging if the call is slow."""
+        self.n_calls += 1
+        start = time.monotonic()
+        primary = asyncio.create_task(self.card_generator.acall(card, n_cards=n_cards))
+        is_hedge = {primary: False}
+        try:
+            await asyncio.wait([primary], timeout=self.hedge_delay)
+            if not primary.done() or not _has_cards(primary):
+                self.n_hedged += 1
+                logger.debug(
+                    f"No cards for card {card} after {time.monotonic() - start:.2f}s, "
+                    f"sending a hedge request"
+                )
+                hedge = asyncio.create_task(
+                    self.hedge_card_generator.acall(card, n_cards=n_cards)
+                )
+                is_hedge[hedge] = True
+
+            return await self._wait_for_winner(card, is_hedge, start)
+        finally:
+            for task in is_hedge:
+                task.cancel()
+
+    async def astream(
+        self, card: TranslationCard, n_cards: Optional[int] = None
+    ) -> AsyncIterator[TranslationCard]:
+        """Generate cards for the input card, yielding each card as soon as it has
+        been generated and hedging if the first card is slow."""
+        self.n_calls += 1
+        start = time.monotonic()
+        primary = _astream(self.card_generator, card, n_cards)
+        is_hedge = {asyncio.create_task(_next_card(primary)): (primary, False)}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(list(is_hedge), timeout=self.hedge_delay)
+            if not done or next(iter(done)).exception() is not None:
+                self.n_hedged += 1
+                logger.debug(
+                    f"No card for card {card} after {time.monotonic() - start:.2f}s, "
+                    f"sending a hedge request"
+                )
+                hedge = _astream(self.hedge_card_generator, card, n_cards)
+                is_hedge[asyncio.create_task(_next_card(hedge))] = (hedge, True)
+
+            winner, first_card = await self._wait_for_first_card(card, is_hedge, start)
+        finally:
+            for task, (stream, _) in is_hedge.items():
+                if stream is not winner:
+                    await _close_stream(task, stream)
+
+        if winner is None:
+            return
+
+        try:
+            yield first_card
+            async for new_card in winner:
+                yield new_card
+        finally:
+            await winner.aclose()
+
+    async def _wait_for_first_card(
+        self,
+        card: TranslationCard,
+        is_hedge: Dict[asyncio.Task, Tuple[AsyncIterator[TranslationCard], bool]],
+        start: float,
+    ) -> Tuple[Optional[AsyncIterator[TranslationCard]], Optional[TranslationCard]]:
+        """Wait for the stream that yields a card first. Returns the stream and its
+        first card, or None twice if no stream yielded a card."""
+        pending = set(is_hedge)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                stream, hedged = is_hedge[task]
+                if not hedged:
+                    self._latencies.add(time.monotonic() - start)
+
+                if task.exception() is not None:
+                    if not isinstance(task.exception(), StopAsyncIteration):
+                        error = task.exception()
+                    continue
+
+                if hedged:
+                    self.n_hedge_wins += 1
+                if any(not is_hedge[other][1] for other in pending):
+                    # The original stream is still waiting for its first card
+                    self._latencies.add(time.monotonic() - start)
+                if len(is_hedge) > 1:
+                    self._log_stats(card, won_by_hedge=hedged)
+                return stream, task.result()
+
+        if error is not None:
+            raise error
+
+        return None, None
+
+    async def _wait_for_winner(
+        self,
+        card: TranslationCard,
+        is_hedge: Dict[asyncio.Task, bool],
+        start: float,
+    ) -> List[TranslationCard]:
+        pending = set(is_hedge)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if not is_hedge[task]:
+                    self._latencies.add(time.monotonic() - start)
+
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+
+                cards = task.result()
+                if not cards:
+                    continue
+
+                if is_hedge[task]:
+                    self.n_hedge_wins += 1
+                if any(not is_hedge[other] for other in pending):
+                    # The original call is still running, so its latency is at
+                    # least the time until now
+                    self._latencies.add(time.monotonic() - start)
+                if len(is_hedge) > 1:
+                    self._log_stats(card, won_by_hedge=is_hedge[task])
+                return cards
+
+        if error is not None:
+            raise error
+
+        return []
+
+    def _log_stats(self, card: TranslationCard, *, won_by_hedge: bool):
+        winner = "hedge" if won_by_hedge else "original"
+        logger.info(
+            f"The {winner} request won for card {card}. Hedge rate: "
+            f"{self.hedge_rate:.1%}, win rate: {self.win_rate:.1%}"
+        )
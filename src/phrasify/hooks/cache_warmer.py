@@ -0,0 +1,246 @@
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..card import TranslationCard
+from ..card_gen import (
+    CachedCardGenerator,
+    CardGeneratorConfig,
+    create_cached_card_generator,
+)
+from ..config import config
+from ..constants import DEFAULT_BATCH_SIZE
+from ..event_loop import EVENT_LOOP
+from ..logging import get_logger
+from .phrasify_filter import PhrasifyFilterConfig, parse_phrasify_filter_name
+
+logger = get_logger(__name__)
+
+# Queues of the cards in the Anki collection, see `anki.consts`
+QUEUE_TYPE_NEW = 0
+QUEUE_TYPE_LRN = 1
+QUEUE_TYPE_REV = 2
+QUEUE_TYPE_DAY_LEARN_RELEARN = 3
+
+_FIELD_REPLACEMENT_RE = re.compile(r"{{([^{}]+)}}")
+
+
+def find_phrasify_filter_names(template: str) -> List[str]:
+    """Find the names of the phrasify filters that are used in a card template.
+
+    A field replacement like `{{phrasify ...:Front}}` applies the filters before the
+    last colon to the field after it.
+    """
+    filter_names = []
+    for match in _FIELD_REPLACEMENT_RE.finditer(template):
+        *filters, _ = match.group(1).split(":")
+        for filter_name in map(str.strip, filters):
+            if filter_name.startswith("phrasify") and filter_name not in filter_names:
+                filter_names.append(filter_name)
+
+    return filter_names
+
+
+def get_due_priority(
+    queue: int, due: int, today: int
+) -> Optional[Tuple[int, int, int]]:
+    """Get the priority of a card, where lower is more urgent.
+
+    The priority starts with the number of days until the card is due. Cards in
+    learning come first, then the reviews and then the new cards, which are ordered by
+    their due number. Returns None for suspended and buried cards, which are not
+    reviewed.
+    """
+    if queue == QUEUE_TYPE_LRN:
+        return 0, 0, due
+    if queue in (QUEUE_TYPE_REV, QUEUE_TYPE_DAY_LEARN_RELEARN):
+        return max(due - today, 0), 1, due
+    if queue == QUEUE_TYPE_NEW:
+        return 0, 2, due
+    return None
+
+
+@dataclass
+class CacheWarmerConfig:
+    """Configuration for the CacheWarmer.
+
+    Parameters
+    ----------
+    max_cards : int
+        Maximum number of input cards to fill the cache for, most urgent first.
+    max_days_ahead : int
+        Only fill the cache for cards that are due within this many days.
+    concurrency : int
+        Maximum number of LLM calls that generate cards at the same time.
+    batch_size : int
+        Maximum number of input cards for which cards are generated with a single
+        LLM call. Use 1 to generate the cards for each input card separately.
+    """
+
+    max_cards: int = 100
+    max_days_ahead: int = 1
+    concurrency: int = 4
+    batch_size: int = DEFAULT_BATCH_SIZE
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> Optional["CacheWarmerConfig"]:
+        """Create a CacheWarmerConfig from the `cacheWarmer` section of the config.
+
+        Returns None if the cache warmer is disabled, i.e. the section is `null`.
+        """
+        if config is None:
+            return None
+
+        return cls(
+            max_cards=config.get("maxCards", cls.max_cards),
+            max_days_ahead=config.get("maxDaysAhead", cls.max_days_ahead),
+            concurrency=config.get("concurrency", cls.concurrency),
+            batch_size=config.get("batchSize", cls.batch_size),
+        )
+
+
+WarmupItem = Tuple[CardGeneratorConfig, TranslationCard]
+
+
+def collect_warmup_items(
+    col: Any, warmer_config: CacheWarmerConfig
+) -> List[WarmupItem]:
+    """Collect the input cards of the notes that use the phrasify filter, for the
+    cards that are due soonest.
+
+    Must be called on the main thread, because it reads from the Anki collection.
+    """
+    filter_configs: Dict[int, List[PhrasifyFilterConfig]] = {}
+    for model in col.models.all():
+        templates = "".join(t["qfmt"] + t["afmt"] for t in model["tmpls"])
+        filter_names = find_phrasify_filter_names(templates)
+
+        for filter_name in filter_names:
+            try:
+                filter_config = parse_phrasify_filter_name(filter_name)
+            except ValueError:
+                logger.warning(f"Not warming up the cache for filter {filter_name!r}")
+                continue
+            filter_configs.setdefault(model["id"], []).append(filter_config)
+
+    if not filter_configs:
+        return []
+
+    today = col.sched.today
+    due_cards = []
+    for model_id in filter_configs:
+        rows = col.db.all(
+            "select c.nid, c.queue, c.due from cards c join notes n on c.nid = n.id "
+            "where n.mid = ?",
+            model_id,
+        )
+        for note_id, queue, due in rows:
+            priority = get_due_priority(queue, due, today)
+            if priority is not None and priority[0] <= warmer_config.max_days_ahead:
+                due_cards.append((priority, note_id, model_id))
+    due_cards.sort()
+
+    items: List[WarmupItem] = []
+    seen: Set[WarmupItem] = set()
+    for _, note_id, model_id in due_cards:
+        if len(items) >= warmer_config.max_cards:
+            break
+
+        note = col.get_note(note_id)
+        for filter_config in filter_configs[model_id]:
+            try:
+                card = filter_config.language_field_names.create_card(note)
+            except KeyError:
+                continue
+            item = (filter_config.card_generator, card)
+            if item not in seen:
+                seen.add(item)
+                items.append(item)
+
+    return items[: warmer_config.max_cards]
+
+
+@dataclass
+class CacheWarmer:
+    """Fills the caches of the input cards up to their minimum number of cards in the
+    background, so that reviewing them doesn't have to wait for the LLM.
+
+    The input cards with the same card generator config are filled in batches of
+    `batch_size`, with a single LLM call per batch if the card generator supports it.
+    At most `concurrency` batches are filled at the same time, in the given order.
+    """
+
+    concurrency: int = 4
+    create_card_generator: Callable[[CardGeneratorConfig], CachedCardGenerator] = (
+        create_cached_card_generator
+    )
+    batch_size: int = DEFAULT_BATCH_SIZE
+
+    def _batch_items(
+        self, items: Iterable[WarmupItem]
+    ) -> List[Tuple[CardGeneratorConfig, List[TranslationCard]]]:
+        """Group the input cards by card generator config into batches, ordered by
+        their most urgent card."""
+        batches = []
+        open_batches: Dict[CardGeneratorConfig, List[TranslationCard]] = {}
+        for card_generator_config, card in items:
+            batch = open_batches.get(card_generator_config)
+            if batch is None or len(batch) >= self.batch_size:
+                batch = open_batches[card_generator_config] = []
+                batches.append((card_generator_config, batch))
+            batch.append(card)
+
+        return batches
+
+    async def warm(self, items: Iterable[WarmupItem]) -> int:
+        """Fill the caches for the items. Returns the number of cards generated."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        card_generators: Dict[CardGeneratorConfig, CachedCardGenerator] = {}
+
+        async def fill(card_generator_config, cards):
+            async with semaphore:
+                if card_generator_config not in card_generators:
+                    card_generators[card_generator_config] = self.create_card_generator(
+                        card_generator_config
+                    )
+                card_generator = card_generators[card_generator_config]
+                try:
+                    if len(cards) == 1:
+                        return await card_generator.fill_cache(cards[0])
+                    return await card_generator.fill_cache_batch(cards)
+                except Exception:
+                    logger.exception(f"Failed to warm up the cache for cards {cards}")
+                    return 0
+
+        # Start the tasks in order of priority. The semaphore is fair, so the most
+        # urgent cards are filled first.
+        batches = self._batch_items(items)
+        n_cards = sum(await asyncio.gather(*(fill(*batch) for batch in batches)))
+        logger.info(f"Warmed up the card cache with {n_cards} new cards")
+        return n_cards
+
+
+def warm_cache_on_profile_open():
+    """Fill the caches of the cards that are due soonest in the background."""
+    from aqt import mw
+
+    warmer_config = CacheWarmerConfig.from_config(config.get("cacheWarmer"))
+    if warmer_config is None or mw is None or mw.col is None:
+        return
+
+    items = collect_warmup_items(mw.col, warmer_config)
+    logger.info(f"Warming up the card cache for {len(items)} cards")
+    if not items:
+        return
+
+    warmer = CacheWarmer(
+        concurrency=warmer_config.concurrency, batch_size=warmer_config.batch_size
+    )
+    asyncio.run_coroutine_threadsafe(warmer.warm(items), EVENT_LOOP)
+
+
+def init_cache_warmer():
+    from aqt import gui_hooks
+
+    gui_hooks.profile_did_open.append(warm_cache_on_profile_open)
@@ -1,6 +1,8 @@
+from .cache_warmer import init_cache_warmer
 from .phrasify_filter import init_phrasify_filter
 
 
 def init_hooks():
     """Initialize the hooks."""
     init_phrasify_filter()
+    init_cache_warmer()
@@ -1,7 +1,7 @@
 import asyncio
 from abc import ABC, abstractmethod
 from functools import partial
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 
 from ..error import LLMError
 
@@ -9,8 +9,8 @@ from ..error import LLMError
 class LLM(ABC):
     """Base LLM abstract class.
 
-    Adapted from langchain's LLM base class, but simplified to only expose the _call
-    and _acall methods where the arguments are only the prompt and kwargs.
+    Adapted from langchain's LLM base class, but simplified to only expose the _call,
+    _acall and _astream methods where the arguments are only the prompt and kwargs.
     """
 
     @abstractmethod
@@ -47,6 +47,24 @@ class LLM(ABC):
         """Run the LLM on the given prompt and input."""
         return await self._acall(prompt, **kwargs)
 
+    async def _astream(
+        self,
+        prompt: str,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        """Run the LLM on the given prompt and input, yielding the response in chunks
+        as it is generated. By default, the whole response is a single chunk."""
+        yield await self._acall(prompt, **kwargs)
+
+    def astream(
+        self,
+        prompt: str,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        """Run the LLM on the given prompt and input, yielding the response in chunks
+        as it is generated."""
+        return self._astream(prompt, **kwargs)
+
     def _raise(
         self, error: Optional[Exception] = None, message: Optional[str] = None
     ) -> LLMError:
@@ -0,0 +1,71 @@
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+from ..caches.responses import ResponseCache
+from ..logging import get_logger
+from .base import LLM
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class CachedLLM(LLM):
+    """LLM that caches the responses of another LLM, so that a prompt is only sent
+    once to the same model with the same response format.
+
+    This makes the responses deterministic, e.g. for benchmarks, but also means that
+    the same input card always gets the same sentences. Errors aren't cached, and
+    neither are streamed responses that were interrupted.
+    """
+
+    llm: LLM
+    cache: ResponseCache = field(default_factory=ResponseCache, compare=False)
+
+    def get_cache_key(self, prompt: str) -> str:
+        """Get the key of the LLM's response to the prompt in the cache."""
+        model = getattr(self.llm, "model", None)
+        response_format = getattr(self.llm, "format", None)
+        return self.cache.get_key(
+            f"{type(self.llm).__name__}:{model}", response_format, prompt
+        )
+
+    def _call(self, prompt: str, **kwargs: Any) -> str:
+        """Run the LLM on the given prompt and input, unless its response is cached."""
+        key = self.get_cache_key(prompt)
+        response = self.cache.get(key)
+        if response is not None:
+            logger.debug("Using the cached response to the prompt")
+            return response
+
+        response = self.llm(prompt, **kwargs)
+        self.cache.set(key, response)
+        return response
+
+    async def _acall(self, prompt: str, **kwargs: Any) -> str:
+        """Run the LLM on the given prompt and input, unless its response is cached."""
+        key = self.get_cache_key(prompt)
+        response = await self.cache.aget(key)
+        if response is not None:
+            logger.debug("Using the cached response to the prompt")
+            return response
+
+        response = await self.llm.acall(prompt, **kwargs)
+        await self.cache.aset(key, response)
+        return response
+
+    async def _astream(self, prompt: str, **kwargs: Any) -> AsyncIterator[str]:
+        """Run the LLM on the given prompt and input, yielding the response in chunks
+        as it is generated. A cached response is a single chunk."""
+        key = self.get_cache_key(prompt)
+        response = await self.cache.aget(key)
+        if response is not None:
+            logger.debug("Using the cached response to the prompt")
+            yield response
+            return
+
+        chunks = []
+        async for chunk in self.llm.astream(prompt, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+
+        await self.cache.aset(key, "".join(chunks))
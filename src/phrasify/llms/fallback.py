@@ -0,0 +1,330 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+import aiohttp
+import requests
+
+from ..error import LLMError
+from ..logging import get_logger
+from .base import LLM
+
+logger = get_logger(__name__)
+
+# Errors of a call that mean that the LLM is unavailable or failing, so that the next
+# LLM is called instead. Other errors are raised right away.
+_FALLBACK_ERRORS = (
+    LLMError,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    requests.RequestException,
+    OSError,
+)
+
+
+class CircuitState(Enum):
+    """State of a circuit breaker."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+@dataclass(frozen=True)
+class CircuitBreakerConfig:
+    """When a circuit breaker stops and resumes sending calls to an LLM.
+
+    Parameters
+    ----------
+    failure_rate_threshold : float
+        Fraction of the recent calls that must have failed or been slow to open the
+        circuit.
+    slow_call_seconds : Optional[float]
+        Number of seconds after which a successful call counts as a failure, because
+        the LLM is degraded. Use None to not count slow calls.
+    window : int
+        Number of most recent calls that the failure rate is computed over.
+    min_calls : int
+        Number of calls that need to be made before the circuit can open.
+    open_seconds : float
+        Number of seconds that the circuit stays open before a trial call is allowed.
+    half_open_max_calls : int
+        Number of trial calls that are allowed at the same time while half-open.
+    """
+
+    failure_rate_threshold: float = 0.5
+    slow_call_seconds: Optional[float] = 20.0
+    window: int = 20
+    min_calls: int = 5
+    open_seconds: float = 30.0
+    half_open_max_calls: int = 1
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "CircuitBreakerConfig":
+        """Create the circuit breaker config from the `circuitBreaker` section of the
+        config."""
+        if config is None:
+            return cls()
+
+        defaults = cls()
+        return cls(
+            failure_rate_threshold=config.get(
+                "failureRateThreshold", defaults.failure_rate_threshold
+            ),
+            slow_call_seconds=config.get("slowCallSeconds", defaults.slow_call_seconds),
+            window=config.get("window", defaults.window),
+            min_calls=config.get("minCalls", defaults.min_calls),
+            open_seconds=config.get("openSeconds", defaults.open_seconds),
+            half_open_max_calls=config.get(
+                "halfOpenMaxCalls", defaults.half_open_max_calls
+            ),
+        )
+
+
+class CircuitBreaker:
+    """Stops sending calls to an LLM that is failing or slow, shared by all threads.
+
+    While closed, all calls are allowed. Once at least `min_calls` calls were made
+    and the fraction of the recent calls that failed or were slow reaches the
+    threshold, the circuit opens and no calls are allowed. After `open_seconds`, it
+    becomes half-open and allows trial calls: the circuit closes again if a trial call
+    succeeds, and opens again if it fails.
+
+    Call `allow_call` before a call, and afterwards `record_success`,
+    `record_failure` or, if the call was cancelled, `record_cancelled`.
+    """
+
+    def __init__(self, name: str, config: Optional[CircuitBreakerConfig] = None):
+        if config is None:
+            config = CircuitBreakerConfig()
+
+        self.name = name
+        self.config = config
+        self._state = CircuitState.CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=config.window)
+        self._opened_at = 0.0
+        self._n_trials = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name!r}, {self.config!r})"
+
+    @property
+    def state(self) -> CircuitState:
+        """The current state, which becomes half-open once the circuit has been open
+        for `open_seconds`."""
+        with self._lock:
+            return self._get_state(time.monotonic())
+
+    def _get_state(self, now: float) -> CircuitState:
+        if (
+            self._state is CircuitState.OPEN
+            and now - self._opened_at >= self.config.open_seconds
+        ):
+            logger.info(f"Circuit of {self.name} is half-open, allowing a trial call")
+            self._state = CircuitState.HALF_OPEN
+            self._n_trials = 0
+
+        return self._state
+
+    def allow_call(self) -> bool:
+        """Whether a call may be made now. A call that is allowed while half-open is
+        a trial call, which must be recorded."""
+        with self._lock:
+            state = self._get_state(time.monotonic())
+            if state is CircuitState.CLOSED:
+                return True
+
+            if (
+                state is CircuitState.HALF_OPEN
+                and self._n_trials < self.config.half_open_max_calls
+            ):
+                self._n_trials += 1
+                return True
+
+            return False
+
+    def record_success(self, seconds: float) -> None:
+        """Record a call that succeeded after the given number of seconds. It counts
+        as a failure if it was slow."""
+        slow_call_seconds = self.config.slow_call_seconds
+        if slow_call_seconds is not None and seconds > slow_call_seconds:
+            logger.warning(
+                f"Call to {self.name} took {seconds:.1f}s, counting it as a failure"
+            )
+            self._record(failed=True)
+        else:
+            self._record(failed=False)
+
+    def record_failure(self) -> None:
+        """Record a call that failed."""
+        self._record(failed=True)
+
+    def record_cancelled(self) -> None:
+        """Record a call that was cancelled, which frees its trial slot."""
+        with self._lock:
+            if self._state is CircuitState.HALF_OPEN:
+                self._n_trials = max(self._n_trials - 1, 0)
+
+    def _record(self, *, failed: bool) -> None:
+        with self._lock:
+            if self._state is CircuitState.HALF_OPEN:
+                if failed:
+                    self._open()
+                else:
+                    logger.info(f"Trial call to {self.name} succeeded, closing circuit")
+                    self._state = CircuitState.CLOSED
+                    self._outcomes.clear()
+                return
+
+            if self._state is CircuitState.OPEN:
+                # A call that was allowed before the circuit opened
+                return
+
+            self._outcomes.append(failed)
+            n_calls = len(self._outcomes)
+            failure_rate = sum(self._outcomes) / n_calls
+            if (
+                n_calls >= self.config.min_calls
+                and failure_rate >= self.config.failure_rate_threshold
+            ):
+                self._open()
+
+    def _open(self) -> None:
+        logger.warning(
+            f"Opening circuit of {self.name}, skipping it for "
+            f"{self.config.open_seconds:.0f}s"
+        )
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+@dataclass
+class FallbackLLM(LLM):
+    """LLM that calls the first of `llms` that is healthy, falling back to the next
+    one if the call fails.
+
+    Each LLM has a circuit breaker, so that LLMs that keep failing or are slow are
+    skipped right away instead of making every call wait for them. Streamed calls
+    only fall back if no chunk has been yielded yet.
+    """
+
+    llms: List[LLM]
+    breakers: Optional[List[CircuitBreaker]] = field(
+        default=None, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        if self.breakers is None:
+            self.breakers = [CircuitBreaker(_get_model_name(llm)) for llm in self.llms]
+
+        if len(self.breakers) != len(self.llms):
+            message = "Each LLM needs its own circuit breaker"
+            raise ValueError(message)
+
+    @property
+    def model(self) -> str:
+        """Names of the models of the LLMs, in order."""
+        return ",".join(_get_model_name(llm) for llm in self.llms)
+
+    def _raise_all_failed(self, error: Optional[Exception]):
+        self._raise(error, f"All LLMs failed or are unavailable: {self.model}")
+
+    def _call(self, prompt: str, **kwargs: Any) -> str:
+        """Run the first healthy LLM on the given prompt and input."""
+        error = None
+        for llm, breaker in zip(self.llms, self.breakers):
+            if not breaker.allow_call():
+                logger.debug(f"Skipping {breaker.name}, its circuit is open")
+                continue
+
+            start = time.monotonic()
+            try:
+                response = llm(prompt, **kwargs)
+            except _FALLBACK_ERRORS as e:
+                breaker.record_failure()
+                logger.warning(f"Call to {breaker.name} failed, falling back: {e}")
+                error = e
+                continue
+            except Exception:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.record_cancelled()
+                raise
+
+            breaker.record_success(time.monotonic() - start)
+            return response
+
+        self._raise_all_failed(error)
+
+    async def _acall(self, prompt: str, **kwargs: Any) -> str:
+        """Run the first healthy LLM on the given prompt and input."""
+        error = None
+        for llm, breaker in zip(self.llms, self.breakers):
+            if not breaker.allow_call():
+                logger.debug(f"Skipping {breaker.name}, its circuit is open")
+                continue
+
+            start = time.monotonic()
+            try:
+                response = await llm.acall(prompt, **kwargs)
+            except _FALLBACK_ERRORS as e:
+                breaker.record_failure()
+                logger.warning(f"Call to {breaker.name} failed, falling back: {e}")
+                error = e
+                continue
+            except Exception:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.record_cancelled()
+                raise
+
+            breaker.record_success(time.monotonic() - start)
+            return response
+
+        self._raise_all_failed(error)
+
+    async def _astream(self, prompt: str, **kwargs: Any) -> AsyncIterator[str]:
+        """Run the first healthy LLM on the given prompt and input, yielding the
+        response in chunks as it is generated."""
+        error = None
+        for llm, breaker in zip(self.llms, self.breakers):
+            if not breaker.allow_call():
+                logger.debug(f"Skipping {breaker.name}, its circuit is open")
+                continue
+
+            start = time.monotonic()
+            has_yielded = False
+            try:
+                async for chunk in llm.astream(prompt, **kwargs):
+                    has_yielded = True
+                    yield chunk
+            except _FALLBACK_ERRORS as e:
+                breaker.record_failure()
+                if has_yielded:
+                    raise
+                logger.warning(f"Call to {breaker.name} failed, falling back: {e}")
+                error = e
+                continue
+            except Exception:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.record_cancelled()
+                raise
+
+            breaker.record_success(time.monotonic() - start)
+            return
+
+        self._raise_all_failed(error)
+
+
+def _get_model_name(llm: LLM) -> str:
+    return getattr(llm, "model", type(llm).__name__)
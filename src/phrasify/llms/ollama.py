@@ -1,32 +1,52 @@
+import asyncio
+import json
 from dataclasses import dataclass, field
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Dict, Optional
 
+import aiohttp
 import requests
 
 from ..ollama import get_ollama_url
+from ..sessions import ClientSessionPool, RequestsSessionPool
 from .base import LLM
 
+OLLAMA_TIMEOUT = 300
+
 
 @dataclass
 class Ollama(LLM):
-    """LLM that uses OpenAI's API."""
+    """LLM that uses Ollama's API, over the HTTP sessions of `phrasify.sessions`."""
 
     model: str = "mistral"
     url: str = field(default_factory=get_ollama_url)
     format: Optional[str] = None
+    sessions: ClientSessionPool = field(
+        default_factory=ClientSessionPool, repr=False, compare=False
+    )
+    requests_sessions: RequestsSessionPool = field(
+        default_factory=RequestsSessionPool, repr=False, compare=False
+    )
 
     @property
     def endpoint(self) -> str:
         return f"{self.url}/api/generate"
 
-    def _call(self, prompt: str, **kwargs: Any) -> str:  # noqa: ARG002
-        """Run the LLM on the given prompt and input."""
-        data = {"prompt": prompt, "model": self.model, "stream": False}
+    def _get_request_data(self, prompt: str, *, stream: bool = False) -> Dict[str, Any]:
+        """Get the request data for the API call."""
+        data = {"prompt": prompt, "model": self.model, "stream": stream}
         if self.format is not None:
             data["format"] = self.format
 
+        return data
+
+    def _call(self, prompt: str, **kwargs: Any) -> str:  # noqa: ARG002
+        """Run the LLM on the given prompt and input."""
+        data = self._get_request_data(prompt)
+
         try:
-            response = requests.post(self.endpoint, json=data, timeout=300)
+            response = self.requests_sessions.post(
+                self.endpoint, json=data, timeout=OLLAMA_TIMEOUT
+            )
         except requests.ReadTimeout as e:
             self._raise(e)
 
@@ -37,3 +57,57 @@ class Ollama(LLM):
 
         response_str = response.json()["response"]
         return response_str
+
+    async def _acall(self, prompt: str, **kwargs: Any) -> str:  # noqa: ARG002
+        """Run the LLM on the given prompt and input, without blocking a thread while
+        waiting for Ollama. If the call is cancelled, the request is aborted."""
+        data = self._get_request_data(prompt)
+
+        session = self.sessions.get()
+        try:
+            async with session.post(
+                self.endpoint,
+                json=data,
+                timeout=aiohttp.ClientTimeout(total=OLLAMA_TIMEOUT),
+            ) as response:
+                response.raise_for_status()
+                response_json = await response.json()
+                return response_json["response"]
+        except asyncio.TimeoutError as e:
+            self._raise(e)
+        except aiohttp.ClientResponseError as e:
+            self._raise(e)
+
+    async def _astream(
+        self, prompt: str, **kwargs: Any  # noqa: ARG002
+    ) -> AsyncIterator[str]:
+        """Run the LLM on the given prompt and input, yielding the response in chunks
+        as it is generated. Times out if no chunk comes in for 300 seconds."""
+        data = self._get_request_data(prompt, stream=True)
+
+        session = self.sessions.get()
+        try:
+            async with session.post(
+                self.endpoint,
+                json=data,
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=OLLAMA_TIMEOUT),
+            ) as response:
+                response.raise_for_status()
+                # The chunks come in as JSON objects, one per line
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        self._raise(message=chunk["error"])
+
+                    if chunk.get("response"):
+                        yield chunk["response"]
+
+                    if chunk.get("done"):
+                        break
+        except asyncio.TimeoutError as e:
+            self._raise(e)
+        except aiohttp.ClientResponseError as e:
+            self._raise(e)
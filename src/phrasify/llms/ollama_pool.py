@@ -0,0 +1,309 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, List, Optional, Set
+
+import aiohttp
+
+from ..error import LLMError
+from ..logging import get_logger
+from ..sessions import ClientSessionPool, RequestsSessionPool
+from .base import LLM
+from .ollama import Ollama
+
+logger = get_logger(__name__)
+
+LEAST_OUTSTANDING = "least-outstanding"
+EWMA = "ewma"
+STRATEGIES = (LEAST_OUTSTANDING, EWMA)
+HEALTH_CHECK_TIMEOUT = 5
+# Latency in seconds of a server without one, if no server in the pool has one yet
+DEFAULT_LATENCY = 1.0
+
+# Errors of a call that mean that the endpoint, rather than the request, is at fault.
+# Connection errors of requests are OSErrors too.
+_ENDPOINT_ERRORS = (LLMError, aiohttp.ClientError, OSError)
+
+
+@dataclass(eq=False)
+class OllamaEndpoint:
+    """An Ollama server in a pool, with the statistics that the calls are routed on.
+
+    Parameters
+    ----------
+    llm : Ollama
+        The LLM that calls the server.
+    n_outstanding : int
+        Number of calls to the server that haven't returned yet.
+    latency : Optional[float]
+        Exponentially weighted moving average of the number of seconds that the
+        successful calls took, or None if no call has succeeded yet.
+    n_failures : int
+        Number of consecutive calls that failed.
+    healthy : bool
+        Whether calls are routed to the server. An evicted server is re-admitted
+        once it passes a health check.
+    """
+
+    llm: Ollama
+    n_outstanding: int = 0
+    latency: Optional[float] = None
+    n_failures: int = 0
+    healthy: bool = True
+
+    @property
+    def url(self) -> str:
+        return self.llm.url
+
+
+@dataclass
+class OllamaPool(LLM):
+    """LLM that balances the calls over several Ollama servers running the same
+    model, so that the throughput scales with the number of servers.
+
+    Each call goes to the healthy server with the lowest score: its number of
+    outstanding calls for the `least-outstanding` strategy, or its average latency
+    times its number of outstanding calls plus one for the `ewma` strategy. Servers
+    without a latency yet count with the mean latency of the pool. If a call fails,
+    it is retried on the next server. After `max_failures` consecutive failed calls,
+    a server is evicted until it passes a health check. The health checks run every
+    `health_check_interval` seconds once started with `start_health_checks`.
+    """
+
+    urls: List[str]
+    model: str = "mistral"
+    format: Optional[str] = None
+    strategy: str = EWMA
+    ewma_alpha: float = 0.3
+    max_failures: int = 3
+    health_check_interval: float = 10.0
+    sessions: ClientSessionPool = field(
+        default_factory=ClientSessionPool, repr=False, compare=False
+    )
+    requests_sessions: RequestsSessionPool = field(
+        default_factory=RequestsSessionPool, repr=False, compare=False
+    )
+    _endpoints: List[OllamaEndpoint] = field(init=False, repr=False, compare=False)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False, compare=False
+    )
+    _n_routed: int = field(default=0, init=False, repr=False, compare=False)
+    _health_checks: Optional[asyncio.Task] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        if self.strategy not in STRATEGIES:
+            message = f"Invalid balancing strategy: {self.strategy!r}"
+            raise ValueError(message)
+
+        if not self.urls:
+            message = "An Ollama pool needs at least one URL"
+            raise ValueError(message)
+
+        self._endpoints = [
+            OllamaEndpoint(
+                Ollama(
+                    self.model,
+                    url=url,
+                    format=self.format,
+                    sessions=self.sessions,
+                    requests_sessions=self.requests_sessions,
+                )
+            )
+            for url in self.urls
+        ]
+
+    @property
+    def endpoints(self) -> List[OllamaEndpoint]:
+        return list(self._endpoints)
+
+    def _prior_latency(self) -> float:
+        """Latency of the servers without one yet: the mean latency of the pool."""
+        latencies = [e.latency for e in self._endpoints if e.latency is not None]
+        return sum(latencies) / len(latencies) if latencies else DEFAULT_LATENCY
+
+    def _score(self, endpoint: OllamaEndpoint, prior_latency: float) -> float:
+        if self.strategy == LEAST_OUTSTANDING:
+            return endpoint.n_outstanding
+
+        latency = endpoint.latency if endpoint.latency is not None else prior_latency
+        return latency * (endpoint.n_outstanding + 1)
+
+    def _acquire(self, tried: Set[OllamaEndpoint]) -> Optional[OllamaEndpoint]:
+        """Pick the endpoint for the next call, out of the ones that weren't tried.
+        Returns None if all endpoints were tried."""
+        with self._lock:
+            # Start at the next endpoint every time, to spread out the ties
+            offset = self._n_routed % len(self._endpoints)
+            self._n_routed += 1
+            candidates = [
+                endpoint
+                for endpoint in self._endpoints[offset:] + self._endpoints[:offset]
+                if endpoint not in tried
+            ]
+            # If all endpoints are evicted, try them anyway
+            candidates = [e for e in candidates if e.healthy] or candidates
+            if not candidates:
+                return None
+
+            prior_latency = self._prior_latency()
+            endpoint = min(candidates, key=lambda e: self._score(e, prior_latency))
+            endpoint.n_outstanding += 1
+
+        tried.add(endpoint)
+        return endpoint
+
+    def _release(
+        self,
+        endpoint: OllamaEndpoint,
+        *,
+        seconds: Optional[float] = None,
+        failed: bool = False,
+    ):
+        """Record that a call to the endpoint returned after the given number of
+        seconds, failed, or neither if it was cancelled."""
+        with self._lock:
+            endpoint.n_outstanding -= 1
+            if failed:
+                endpoint.n_failures += 1
+                if endpoint.healthy and endpoint.n_failures >= self.max_failures:
+                    logger.warning(
+                        f"Evicting Ollama server {endpoint.url} after "
+                        f"{endpoint.n_failures} failed calls"
+                    )
+                    endpoint.healthy = False
+            elif seconds is not None:
+                endpoint.n_failures = 0
+                if endpoint.latency is None:
+                    endpoint.latency = seconds
+                else:
+                    endpoint.latency = (
+                        self.ewma_alpha * seconds
+                        + (1 - self.ewma_alpha) * endpoint.latency
+                    )
+
+    def _raise_all_failed(self, error: Optional[Exception]):
+        self._raise(error, f"All Ollama servers failed: {', '.join(self.urls)}")
+
+    def _call(self, prompt: str, **kwargs: Any) -> str:
+        """Run the LLM on the given prompt and input, on the best server."""
+        tried = set()
+        error = None
+        while (endpoint := self._acquire(tried)) is not None:
+            start = time.monotonic()
+            try:
+                response = endpoint.llm(prompt, **kwargs)
+            except _ENDPOINT_ERRORS as e:
+                self._release(endpoint, failed=True)
+                logger.warning(f"Call to Ollama server {endpoint.url} failed: {e}")
+                error = e
+                continue
+            except BaseException:
+                self._release(endpoint)
+                raise
+
+            self._release(endpoint, seconds=time.monotonic() - start)
+            return response
+
+        self._raise_all_failed(error)
+
+    async def _acall(self, prompt: str, **kwargs: Any) -> str:
+        """Run the LLM on the given prompt and input, on the best server."""
+        tried = set()
+        error = None
+        while (endpoint := self._acquire(tried)) is not None:
+            start = time.monotonic()
+            try:
+                response = await endpoint.llm.acall(prompt, **kwargs)
+            except _ENDPOINT_ERRORS as e:
+                self._release(endpoint, failed=True)
+                logger.warning(f"Call to Ollama server {endpoint.url} failed: {e}")
+                error = e
+                continue
+            except BaseException:
+                self._release(endpoint)
+                raise
+
+            self._release(endpoint, seconds=time.monotonic() - start)
+            return response
+
+        self._raise_all_failed(error)
+
+    async def _astream(self, prompt: str, **kwargs: Any) -> AsyncIterator[str]:
+        """Run the LLM on the given prompt and input on the best server, yielding the
+        response in chunks as it is generated. Only retries on the next server if no
+        chunk has been yielded yet."""
+        tried = set()
+        error = None
+        while (endpoint := self._acquire(tried)) is not None:
+            start = time.monotonic()
+            has_yielded = False
+            try:
+                async for chunk in endpoint.llm.astream(prompt, **kwargs):
+                    has_yielded = True
+                    yield chunk
+            except _ENDPOINT_ERRORS as e:
+                self._release(endpoint, failed=True)
+                if has_yielded:
+                    raise
+                logger.warning(f"Call to Ollama server {endpoint.url} failed: {e}")
+                error = e
+                continue
+            except BaseException:
+                self._release(endpoint)
+                raise
+
+            self._release(endpoint, seconds=time.monotonic() - start)
+            return
+
+        self._raise_all_failed(error)
+
+    async def check_health(self) -> None:
+        """Check whether the servers respond, evicting the ones that don't and
+        re-admitting the evicted ones that do."""
+        session = self.sessions.get()
+        await asyncio.gather(
+            *(self._check_endpoint(session, endpoint) for endpoint in self._endpoints)
+        )
+
+    async def _check_endpoint(
+        self, session: aiohttp.ClientSession, endpoint: OllamaEndpoint
+    ):
+        try:
+            async with session.get(
+                f"{endpoint.url}/api/tags",
+                timeout=aiohttp.ClientTimeout(total=HEALTH_CHECK_TIMEOUT),
+            ) as response:
+                healthy = response.ok
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            healthy = False
+
+        with self._lock:
+            if healthy and not endpoint.healthy:
+                logger.info(f"Re-admitting Ollama server {endpoint.url}")
+                endpoint.n_failures = 0
+            elif not healthy and endpoint.healthy:
+                logger.warning(f"Evicting Ollama server {endpoint.url}, it is down")
+            endpoint.healthy = healthy
+
+    async def run_health_checks(self):
+        """Keep checking the health of the servers in the background."""
+        while True:
+            try:
+                await self.check_health()
+            except Exception:
+                logger.exception("Error while checking the health of the Ollama pool")
+
+            await asyncio.sleep(self.health_check_interval)
+
+    def start_health_checks(self, loop: asyncio.AbstractEventLoop):
+        """Start checking the health of the servers in the background on the given
+        event loop."""
+
+        def create_task():
+            if self._health_checks is None or self._health_checks.done():
+                self._health_checks = loop.create_task(self.run_health_checks())
+
+        loop.call_soon_threadsafe(create_task)
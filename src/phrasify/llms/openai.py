@@ -1,28 +1,61 @@
 import asyncio
+import itertools
+import json
+import time
 from dataclasses import dataclass, field
-from typing import Any, Coroutine
+from typing import Any, AsyncIterator, Coroutine, List, Mapping, Optional
 
 import aiohttp
 import requests
 
+from ..logging import get_logger
 from ..openai import OPENAI_CHAT_COMPLETIONS_URL, get_openai_api_key
+from ..rate_limit import (
+    RATE_LIMITED_STATUS_CODE,
+    RETRY_STATUS_CODES,
+    RateLimiter,
+    estimate_tokens,
+)
+from ..sessions import ClientSessionPool, RequestsSessionPool
 from .base import LLM
 
+logger = get_logger(__name__)
+
+# Number of tokens that are reserved for a response, until its usage is known
+ESTIMATED_RESPONSE_TOKENS = 500
+
 
 def _completion_to_content(completion: dict):
     return completion["choices"][0]["message"]["content"]
 
 
+def _completion_chunk_to_content(chunk: dict) -> str:
+    return chunk["choices"][0]["delta"].get("content") or ""
+
+
 @dataclass
 class OpenAI(LLM):
-    """LLM that uses OpenAI's API."""
+    """LLM that uses OpenAI's API, over the HTTP sessions of `phrasify.sessions`.
+
+    If a `rate_limiter` is given, the calls are scheduled within its limits, and
+    calls that are rate limited or hit a server error are retried after a backoff.
+    Share the rate limiter between all LLMs that use the same API key.
+    """
 
     model: str = "gpt-3.5-turbo"
     api_key: str = field(repr=False, compare=False, default_factory=get_openai_api_key)
+    url: str = OPENAI_CHAT_COMPLETIONS_URL
+    sessions: ClientSessionPool = field(
+        default_factory=ClientSessionPool, repr=False, compare=False
+    )
+    requests_sessions: RequestsSessionPool = field(
+        default_factory=RequestsSessionPool, repr=False, compare=False
+    )
+    rate_limiter: Optional[RateLimiter] = field(default=None, repr=False, compare=False)
 
     def _get_request_input(self, prompt: str):
         """Get the request input for the API call."""
-        url = OPENAI_CHAT_COMPLETIONS_URL
+        url = self.url
         messages = [{"role": "user", "content": prompt}]
         json = {"model": self.model, "messages": messages}
         headers = {
@@ -32,14 +65,74 @@ class OpenAI(LLM):
 
         return url, json, headers
 
+    def _get_retry_delay(
+        self, status: int, headers: Mapping[str, str], attempt: int
+    ) -> Optional[float]:
+        """Get the number of seconds to wait before retrying a request that got a
+        response with the given status, or None if it shouldn't be retried."""
+        if self.rate_limiter is None:
+            return None
+
+        self.rate_limiter.update_from_headers(headers)
+        max_retries = self.rate_limiter.limit.max_retries
+        if status not in RETRY_STATUS_CODES or attempt >= max_retries:
+            return None
+
+        delay = self.rate_limiter.get_retry_delay(attempt, headers)
+        if status == RATE_LIMITED_STATUS_CODE:
+            # Hold back the other requests too, which would be rate limited as well
+            self.rate_limiter.block_for(delay)
+        logger.warning(
+            f"OpenAI responded with status {status}, retrying in {delay:.2f}s "
+            f"({attempt + 1}/{max_retries})"
+        )
+        return delay
+
+    def _settle_tokens(self, n_tokens: int, completion: Optional[dict] = None):
+        """Correct the estimated tokens of a request with the tokens in the usage of
+        its completion, or give them back if there is no completion."""
+        if self.rate_limiter is None:
+            return
+
+        n_tokens_used = 0
+        if completion is not None:
+            n_tokens_used = completion.get("usage", {}).get("total_tokens", n_tokens)
+        self.rate_limiter.settle(n_tokens, n_tokens_used)
+
+    def _settle_streamed_tokens(self, n_tokens: int, prompt: str, chunks: List[str]):
+        """Correct the estimated tokens of a streamed request with an estimate of the
+        tokens of the prompt and the chunks streamed so far, as the chunks don't
+        include the usage."""
+        if self.rate_limiter is None:
+            return
+
+        n_tokens_used = estimate_tokens(prompt) + estimate_tokens("".join(chunks))
+        self.rate_limiter.settle(n_tokens, n_tokens_used)
+
     def _call(self, prompt: str, **kwargs: Any) -> str:  # noqa: ARG002
         """Run the LLM on the given prompt and input."""
         url, json, headers = self._get_request_input(prompt)
+        n_tokens = estimate_tokens(prompt) + ESTIMATED_RESPONSE_TOKENS
 
-        try:
-            response = requests.post(url, json=json, headers=headers, timeout=30)
-        except requests.ReadTimeout as e:
-            self._raise(e)
+        for attempt in itertools.count():
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(n_tokens)
+
+            try:
+                response = self.requests_sessions.post(
+                    url, json=json, headers=headers, timeout=30
+                )
+            except requests.ReadTimeout as e:
+                self._raise(e)
+
+            delay = self._get_retry_delay(
+                response.status_code, response.headers, attempt
+            )
+            if delay is None:
+                break
+
+            self._settle_tokens(n_tokens)
+            time.sleep(delay)
 
         try:
             response.raise_for_status()
@@ -47,6 +140,7 @@ class OpenAI(LLM):
             self._raise(e)
 
         completion = response.json()
+        self._settle_tokens(n_tokens, completion)
         content = _completion_to_content(completion)
         return content
 
@@ -55,17 +149,88 @@ class OpenAI(LLM):
     ) -> Coroutine[Any, Any, str]:
         """Run the LLM on the given prompt and input."""
         url, json, headers = self._get_request_input(prompt)
+        n_tokens = estimate_tokens(prompt) + ESTIMATED_RESPONSE_TOKENS
+
+        session = self.sessions.get()
+        for attempt in itertools.count():
+            if self.rate_limiter is not None:
+                await self.rate_limiter.aacquire(n_tokens)
 
-        async with aiohttp.ClientSession() as session:
             try:
                 async with session.post(
-                    url, json=json, headers=headers, timeout=30
+                    url,
+                    json=json,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=30),
+                ) as response:
+                    delay = self._get_retry_delay(
+                        response.status, response.headers, attempt
+                    )
+                    if delay is None:
+                        response.raise_for_status()
+                        completion = await response.json()
+                        break
+            except asyncio.TimeoutError as e:
+                self._raise(e)
+            except aiohttp.ClientResponseError as e:
+                self._raise(e)
+
+            self._settle_tokens(n_tokens)
+            await asyncio.sleep(delay)
+
+        self._settle_tokens(n_tokens, completion)
+        content = _completion_to_content(completion)
+        return content
+
+    async def _astream(
+        self, prompt: str, **kwargs: Any  # noqa: ARG002
+    ) -> AsyncIterator[str]:
+        """Run the LLM on the given prompt and input, yielding the response in chunks
+        as it is generated. Times out if no chunk comes in for 30 seconds."""
+        url, request_json, headers = self._get_request_input(prompt)
+        request_json["stream"] = True
+        n_tokens = estimate_tokens(prompt) + ESTIMATED_RESPONSE_TOKENS
+
+        session = self.sessions.get()
+        for attempt in itertools.count():
+            if self.rate_limiter is not None:
+                await self.rate_limiter.aacquire(n_tokens)
+
+            try:
+                async with session.post(
+                    url,
+                    json=request_json,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=None, sock_read=30),
                 ) as response:
-                    response.raise_for_status()
-                    completion = await response.json()
-                    content = _completion_to_content(completion)
-                    return content
+                    delay = self._get_retry_delay(
+                        response.status, response.headers, attempt
+                    )
+                    if delay is None:
+                        response.raise_for_status()
+                        chunks = []
+                        try:
+                            # The chunks come in as server-sent events, one per line
+                            async for line in response.content:
+                                data = line.strip()
+                                if not data.startswith(b"data:"):
+                                    continue
+
+                                data = data[len(b"data:") :].strip()
+                                if data == b"[DONE]":
+                                    break
+
+                                content = _completion_chunk_to_content(json.loads(data))
+                                if content:
+                                    chunks.append(content)
+                                    yield content
+                        finally:
+                            self._settle_streamed_tokens(n_tokens, prompt, chunks)
+                        return
             except asyncio.TimeoutError as e:
                 self._raise(e)
             except aiohttp.ClientResponseError as e:
                 self._raise(e)
+
+            self._settle_tokens(n_tokens)
+            await asyncio.sleep(delay)
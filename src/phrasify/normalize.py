@@ -0,0 +1,76 @@
+import html
+import re
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from .card import TranslationCard
+
+# Tags that separate words, unlike inline tags such as <b> and <span>
+_BREAK_TAG_RE = re.compile(r"</?(br|div|p|li|tr|td|th|h[1-6])\b[^>]*>", re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r"<[^>]*>")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class CardNormalizer:
+    """Normalizes the text of Anki note fields, so that fields that only differ in
+    markup map onto the same cached cards.
+
+    For example, `friend`, `friend&nbsp;`, `<b>friend</b>` and `Friend ` (with
+    `lowercase=True`) are all normalized to `friend`.
+
+    Parameters
+    ----------
+    strip_html : bool
+        Remove HTML tags, e.g. `<b>` and `<br>`.
+    unescape_entities : bool
+        Replace HTML entities like `&nbsp;` and `&amp;` by the characters they stand
+        for.
+    collapse_whitespace : bool
+        Replace runs of whitespace by a single space and strip leading and trailing
+        whitespace.
+    lowercase : bool
+        Ignore case.
+    """
+
+    strip_html: bool = True
+    unescape_entities: bool = True
+    collapse_whitespace: bool = True
+    lowercase: bool = False
+
+    @classmethod
+    def from_config(cls, config: Optional[dict]) -> Optional["CardNormalizer"]:
+        """Create a CardNormalizer from the `normalizeCards` section of the config.
+
+        Returns None if normalization is disabled, i.e. the section is `null`.
+        """
+        if config is None:
+            return None
+
+        return cls(
+            strip_html=config.get("stripHtml", True),
+            unescape_entities=config.get("unescapeEntities", True),
+            collapse_whitespace=config.get("collapseWhitespace", True),
+            lowercase=config.get("lowercase", False),
+        )
+
+    def normalize_text(self, text: str) -> str:
+        """Normalize the text of a single field."""
+        if self.strip_html:
+            text = _BREAK_TAG_RE.sub(" ", text)
+            text = _HTML_TAG_RE.sub("", text)
+        if self.unescape_entities:
+            text = html.unescape(text)
+        if self.collapse_whitespace:
+            text = _WHITESPACE_RE.sub(" ", text).strip()
+        if self.lowercase:
+            text = text.casefold()
+        return text
+
+    def __call__(self, card: TranslationCard) -> TranslationCard:
+        """Normalize the source and target of the card."""
+        return replace(
+            card,
+            source=self.normalize_text(card.source),
+            target=self.normalize_text(card.target),
+        )
@@ -1,6 +1,13 @@
 import os
+from typing import List
 
 
 def get_ollama_url():
     """Get the URL where Ollama is running from the environment."""
     return os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+
+def get_ollama_urls() -> List[str]:
+    """Get the URLs where the Ollama servers are running from the environment, which
+    may list several URLs separated by commas."""
+    return [url.strip() for url in get_ollama_url().split(",") if url.strip()]
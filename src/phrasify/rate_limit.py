@@ -0,0 +1,272 @@
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Mapping, Optional
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Status code of a response that was rate limited
+RATE_LIMITED_STATUS_CODE = 429
+# Status codes of the responses that are retried after a backoff
+RETRY_STATUS_CODES = (RATE_LIMITED_STATUS_CODE, 500, 502, 503, 504)
+
+_DURATION_RE = re.compile(r"(?P<value>\d+(?:\.\d+)?)(?P<unit>ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a text, using OpenAI's rule of thumb of four
+    characters per token."""
+    return math.ceil(len(text) / 4)
+
+
+def parse_duration(duration: str) -> Optional[float]:
+    """Parse a duration like `1s`, `6m0s` or `20ms` from the `x-ratelimit-reset-*`
+    headers into seconds. Returns None if it can't be parsed."""
+    matches = list(_DURATION_RE.finditer(duration.strip()))
+    if not matches:
+        return None
+
+    return sum(
+        float(match.group("value")) * _DURATION_UNITS[match.group("unit")]
+        for match in matches
+    )
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    """Get the number of seconds to wait before retrying from the `retry-after-ms` or
+    `Retry-After` header, which is either a number of seconds or an HTTP date."""
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Limits of an API and how to back off when they are exceeded.
+
+    Parameters
+    ----------
+    requests_per_minute : Optional[float]
+        Maximum number of requests per minute. Use None for no limit.
+    tokens_per_minute : Optional[float]
+        Maximum number of tokens per minute, counting both the prompt and the
+        response. Use None for no limit.
+    max_retries : int
+        Maximum number of times that a request is retried after it was rate limited
+        or the server had an error.
+    initial_backoff : float
+        Maximum number of seconds to wait before the first retry, if the server
+        doesn't say how long to wait. It doubles with every retry.
+    max_backoff : float
+        Maximum number of seconds to wait before a retry.
+    """
+
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    max_retries: int = 5
+    initial_backoff: float = 1.0
+    max_backoff: float = 60.0
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> Optional["RateLimit"]:
+        """Create the rate limit from a section of the config like
+        `openaiRateLimit`. Returns None if the section is `null`."""
+        if config is None:
+            return None
+
+        defaults = cls()
+        return cls(
+            requests_per_minute=config.get(
+                "requestsPerMinute", defaults.requests_per_minute
+            ),
+            tokens_per_minute=config.get("tokensPerMinute", defaults.tokens_per_minute),
+            max_retries=config.get("maxRetries", defaults.max_retries),
+            initial_backoff=config.get("initialBackoff", defaults.initial_backoff),
+            max_backoff=config.get("maxBackoff", defaults.max_backoff),
+        )
+
+
+@dataclass
+class TokenBucket:
+    """Token bucket that refills at `rate` tokens per second, up to `capacity`.
+
+    Taking tokens never fails: the bucket may go into debt, and the taker is told how
+    long to wait until its tokens have been refilled. Callers are thereby scheduled in
+    the order in which they took their tokens.
+    """
+
+    rate: float
+    capacity: float
+    _tokens: float = field(init=False, repr=False)
+    _updated: float = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = max(now - self._updated, 0.0)
+        self._tokens = min(self._tokens + elapsed * self.rate, self.capacity)
+        self._updated = now
+
+    def take(self, amount: float, now: Optional[float] = None) -> float:
+        """Take tokens from the bucket. Returns the number of seconds to wait before
+        they may be used."""
+        if now is None:
+            now = time.monotonic()
+
+        self._refill(now)
+        self._tokens -= amount
+        if self._tokens >= 0:
+            return 0.0
+
+        return -self._tokens / self.rate
+
+    def give_back(self, amount: float):
+        """Give back tokens that were taken but not used, or take more tokens if
+        `amount` is negative."""
+        self._tokens = min(self._tokens + amount, self.capacity)
+
+    def drain(self, now: Optional[float] = None):
+        """Empty the bucket, e.g. when the server says that the limit was reached."""
+        if now is None:
+            now = time.monotonic()
+
+        self._refill(now)
+        self._tokens = min(self._tokens, 0.0)
+
+
+class RateLimiter:
+    """Schedules the requests to an API within its requests and tokens per minute,
+    shared by all threads and event loops that call the API.
+
+    Before each request, `acquire` or `aacquire` waits until the request fits in the
+    limits. After a response, `update_from_headers` takes the remaining limits that
+    the server reports into account, and `get_retry_delay` tells how long to wait
+    before retrying a request that was rate limited.
+    """
+
+    def __init__(self, limit: RateLimit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self._requests = None
+        self._tokens = None
+        if limit.requests_per_minute is not None:
+            self._requests = TokenBucket(
+                rate=limit.requests_per_minute / 60, capacity=limit.requests_per_minute
+            )
+        if limit.tokens_per_minute is not None:
+            self._tokens = TokenBucket(
+                rate=limit.tokens_per_minute / 60, capacity=limit.tokens_per_minute
+            )
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.limit!r})"
+
+    def reserve(self, n_tokens: int) -> float:
+        """Reserve a request of `n_tokens` tokens. Returns the number of seconds to
+        wait before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self._blocked_until - now, 0.0)
+            if self._requests is not None:
+                delay = max(delay, self._requests.take(1, now))
+            if self._tokens is not None:
+                delay = max(delay, self._tokens.take(n_tokens, now))
+
+        return delay
+
+    def acquire(self, n_tokens: int) -> None:
+        """Wait until a request of `n_tokens` tokens may be sent."""
+        delay = self.reserve(n_tokens)
+        if delay > 0:
+            logger.debug(f"Rate limited, waiting {delay:.2f}s before the request")
+            time.sleep(delay)
+
+    async def aacquire(self, n_tokens: int) -> None:
+        """Wait until a request of `n_tokens` tokens may be sent, without blocking
+        the event loop."""
+        delay = self.reserve(n_tokens)
+        if delay > 0:
+            logger.debug(f"Rate limited, waiting {delay:.2f}s before the request")
+            await asyncio.sleep(delay)
+
+    def settle(self, n_tokens_reserved: int, n_tokens_used: int) -> None:
+        """Correct the reserved tokens of a request with the tokens that it used."""
+        if self._tokens is None:
+            return
+
+        with self._lock:
+            self._tokens.give_back(n_tokens_reserved - n_tokens_used)
+
+    def block_for(self, seconds: float) -> None:
+        """Hold back all requests for the given number of seconds."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Hold back the requests until the limits reset if the server reports that
+        no requests or tokens are remaining, in the `x-ratelimit-*` headers."""
+        for kind, bucket in (("requests", self._requests), ("tokens", self._tokens)):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = headers.get(f"x-ratelimit-reset-{kind}")
+            if remaining is None or reset is None:
+                continue
+
+            try:
+                n_remaining = float(remaining)
+            except ValueError:
+                continue
+
+            reset_seconds = parse_duration(reset)
+            if n_remaining > 0 or reset_seconds is None:
+                continue
+
+            logger.debug(f"No {kind} remaining, waiting {reset_seconds:.2f}s")
+            self.block_for(reset_seconds)
+            if bucket is not None:
+                with self._lock:
+                    bucket.drain()
+
+    def get_retry_delay(self, attempt: int, headers: Mapping[str, str]) -> float:
+        """Get the number of seconds to wait before retrying a request for the
+        `attempt`th time, counting from 0.
+
+        Uses the delay from the `Retry-After` header if there is one. Otherwise, backs
+        off exponentially with full jitter, so that the retries of concurrent
+        requests are spread out.
+        """
+        retry_after = parse_retry_after(headers)
+        if retry_after is not None:
+            return retry_after
+
+        backoff = min(self.limit.initial_backoff * 2**attempt, self.limit.max_backoff)
+        return random.uniform(0, backoff)
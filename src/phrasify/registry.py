@@ -0,0 +1,155 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, NamedTuple, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class RegistryInfo(NamedTuple):
+    """Statistics of a BoundedRegistry, similar to `functools.lru_cache`'s
+    `cache_info()`."""
+
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class BoundedRegistry(Generic[K, V]):
+    """Registry that creates a value for each key on demand and keeps at most `maxsize`
+    of them.
+
+    It can be used as a bounded replacement for `lru_cache(maxsize=None)` when the
+    values are stateful objects that should be shared per key, like locks.
+
+    Values are evicted in least recently used order once there are more than `maxsize`
+    of them, or once they have not been used for `ttl` seconds. Values for which
+    `in_use(value)` is True are never evicted. Values that support weak references
+    are also never replaced while something outside the registry still refers to them:
+    asking for the key again gives back the same value.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[K], V],
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        in_use: Optional[Callable[[V], bool]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.factory = factory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.in_use = in_use
+        self.clock = clock
+        self._entries: OrderedDict[K, Tuple[V, float]] = OrderedDict()
+        self._evicted: weakref.WeakValueDictionary[K, V] = weakref.WeakValueDictionary()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __call__(self, key: K) -> V:
+        """Get the value for the given key, creating it if necessary."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self._hits += 1
+                return value[0]
+            self._misses += 1
+
+        # Create the value outside the lock, like `lru_cache` does. If another thread
+        # created a value for the same key in the meantime, keep that one.
+        new_value = self.factory(key)
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value[0]
+
+            self._entries[key] = (new_value, self.clock())
+            self._evict()
+            return new_value
+
+    def _lookup(self, key: K) -> Optional[Tuple[V]]:
+        """Look up the value for the key and mark it as recently used.
+
+        Must be called while holding the lock.
+        """
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, _ = entry
+        else:
+            try:
+                value = self._evicted.pop(key)
+            except KeyError:
+                return None
+
+        self._entries[key] = (value, now)
+        self._entries.move_to_end(key)
+        if entry is None:
+            # The value came back from the evicted values, so make room for it
+            self._evict()
+        return (value,)
+
+    def _is_in_use(self, value: V) -> bool:
+        return self.in_use is not None and self.in_use(value)
+
+    def _evict(self):
+        """Evict expired values and the least recently used values beyond maxsize.
+
+        Must be called while holding the lock.
+        """
+        now = self.clock()
+        # Never evict the most recently used value, which was just asked for
+        for key, (value, last_used) in list(self._entries.items())[:-1]:
+            is_expired = self.ttl is not None and now - last_used > self.ttl
+            if len(self._entries) <= self.maxsize and not is_expired:
+                # All remaining entries were used more recently
+                break
+
+            if self._is_in_use(value):
+                continue
+
+            del self._entries[key]
+            self._evictions += 1
+            try:
+                self._evicted[key] = value
+            except TypeError:
+                # The value doesn't support weak references
+                pass
+
+    def evict(self) -> int:
+        """Evict expired and excess values. Returns the number of evicted values."""
+        with self._lock:
+            evictions = self._evictions
+            self._evict()
+            return self._evictions - evictions
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def cache_info(self) -> RegistryInfo:
+        """Report the statistics of the registry, including its current size."""
+        with self._lock:
+            return RegistryInfo(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                maxsize=self.maxsize,
+                currsize=len(self._entries),
+            )
+
+    def cache_clear(self):
+        """Remove all values from the registry and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._evicted.clear()
+            self._hits = self._misses = self._evictions = 0
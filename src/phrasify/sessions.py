@@ -0,0 +1,249 @@
+"""Long-lived HTTP sessions whose connections are reused between the calls to the
+LLM APIs.
+
+An LLM that calls an API over HTTP takes a `ClientSessionPool` as its `sessions`,
+for the async calls, and a `RequestsSessionPool` as its `requests_sessions`, for the
+sync calls. The pools can be shared between LLMs, so that calls to the same host
+share their connections.
+"""
+
+import asyncio
+import socket
+import threading
+from asyncio import AbstractEventLoop
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class ClientSessionConfig:
+    """Connection settings of the HTTP sessions that are kept open to the LLM APIs,
+    for both the async (aiohttp) and the sync (requests) sessions.
+
+    Parameters
+    ----------
+    limit : int
+        Maximum number of connections that are open at the same time. Use 0 for no
+        limit.
+    limit_per_host : int
+        Maximum number of connections to the same host that are open at the same
+        time. Use 0 for no limit.
+    keepalive_timeout : float
+        Number of seconds that an idle connection is kept open for the next request.
+        Only used by the async sessions, the sync sessions keep idle connections open
+        until the server closes them.
+    dns_cache_ttl : Optional[int]
+        Number of seconds that the IP address of a host is cached. Use None to cache
+        it forever.
+    """
+
+    limit: int = 100
+    limit_per_host: int = 10
+    keepalive_timeout: float = 30.0
+    dns_cache_ttl: Optional[int] = 300
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> "ClientSessionConfig":
+        """Create the session config from the `httpSession` section of the config."""
+        if config is None:
+            return cls()
+
+        defaults = cls()
+        return cls(
+            limit=config.get("limit", defaults.limit),
+            limit_per_host=config.get("limitPerHost", defaults.limit_per_host),
+            keepalive_timeout=config.get(
+                "keepaliveTimeout", defaults.keepalive_timeout
+            ),
+            dns_cache_ttl=config.get("dnsCacheTtl", defaults.dns_cache_ttl),
+        )
+
+    def create_session(self) -> aiohttp.ClientSession:
+        """Create a session with these settings on the running event loop."""
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+
+class ClientSessionPool:
+    """Long-lived `aiohttp.ClientSession`s, one per event loop.
+
+    Opening a session for every request means a new TCP connection, TLS handshake and
+    DNS lookup for every LLM call. Instead, the session for the running event loop is
+    kept open so that its connections are reused. A session can't be shared between
+    event loops, so every event loop gets its own session. Call `close` on an event
+    loop before it shuts down to close its session.
+    """
+
+    def __init__(self, config: Optional[ClientSessionConfig] = None):
+        if config is None:
+            config = ClientSessionConfig()
+
+        self.config = config
+        self._sessions: Dict[AbstractEventLoop, aiohttp.ClientSession] = {}
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.config!r})"
+
+    def get(self) -> aiohttp.ClientSession:
+        """Get the session for the running event loop, opening it if needed."""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            self._forget_closed_loops()
+            logger.debug(f"Opening a new HTTP session on event loop {loop}")
+            session = self.config.create_session()
+            self._sessions[loop] = session
+
+        return session
+
+    def _forget_closed_loops(self):
+        for loop in [loop for loop in self._sessions if loop.is_closed()]:
+            # The connections died with their event loop, so there is nothing left
+            # to close. Detach the connector to not warn about an unclosed session.
+            self._sessions.pop(loop).detach()
+
+    async def close(self) -> None:
+        """Close the session for the running event loop."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+@dataclass(frozen=True)
+class ConnectionPoolStats:
+    """Statistics of the connection pool of a requests session for a single host.
+
+    Parameters
+    ----------
+    host : str
+        Scheme and host of the pool, e.g. `https://api.openai.com`.
+    n_connections : int
+        Number of connections that were opened.
+    n_requests : int
+        Number of requests that were sent.
+    n_idle : int
+        Number of open connections that are waiting for the next request.
+    """
+
+    host: str
+    n_connections: int
+    n_requests: int
+    n_idle: int
+
+    @property
+    def n_reused(self) -> int:
+        """Number of requests that were sent on a connection that was already open."""
+        return max(self.n_requests - self.n_connections, 0)
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections use TCP keep-alive, so that idle connections
+    in the pool aren't silently dropped by firewalls and load balancers."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = [
+            *HTTPConnection.default_socket_options,
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+class RequestsSessionPool:
+    """Thread-safe `requests.Session`s, one per host, whose connections are reused.
+
+    The module-level `requests.post` opens a new connection for every request.
+    Instead, every host gets a long-lived session with a pool of `limit_per_host`
+    connections, shared by all threads.
+    """
+
+    def __init__(self, config: Optional[ClientSessionConfig] = None):
+        if config is None:
+            config = ClientSessionConfig()
+
+        self.config = config
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.config!r})"
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        pool_maxsize = self.config.limit_per_host or self.config.limit or 10
+        adapter = _KeepAliveAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get(self, url: str) -> requests.Session:
+        """Get the session for the host of the URL, opening it if needed."""
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                logger.debug(f"Opening a new HTTP session for {host}")
+                session = self._create_session()
+                self._sessions[host] = session
+
+        return session
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        """Send a POST request on the session for the host of the URL."""
+        return self.get(url).post(url, **kwargs)
+
+    def stats(self) -> List[ConnectionPoolStats]:
+        """Get the statistics of the connection pools of all hosts."""
+        with self._lock:
+            sessions = list(self._sessions.items())
+
+        stats = []
+        for host, session in sessions:
+            pools = session.get_adapter(host).poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+
+                idle = list(pool.pool.queue) if pool.pool is not None else []
+                stats.append(
+                    ConnectionPoolStats(
+                        host=host,
+                        n_connections=pool.num_connections,
+                        n_requests=pool.num_requests,
+                        n_idle=sum(conn is not None for conn in idle),
+                    )
+                )
+
+        return stats
+
+    def close(self) -> None:
+        """Close the sessions of all hosts."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+
+        for session in sessions:
+            session.close()
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,145 @@
+import asyncio
+from asyncio import AbstractEventLoop
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from .card import TranslationCard
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Flight:
+    """A call that is in flight, with the number of callers waiting for it."""
+
+    task: asyncio.Future
+    n_waiters: int = 0
+
+
+class SingleFlight(Generic[T]):
+    """Merges concurrent calls with the same key into a single call, whose result or
+    error is shared by all callers.
+
+    Only calls that are in flight at the same time are merged: once a call has
+    returned, the next call with the same key makes a new call. Calls on different
+    event loops are never merged. The call is only cancelled once all of its callers
+    are cancelled.
+
+    `n_calls` counts all calls and `n_coalesced` the calls that were merged into a
+    call that was already in flight.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Tuple[AbstractEventLoop, Hashable], _Flight] = {}
+        self.n_calls = 0
+        self.n_coalesced = 0
+
+    @property
+    def coalesce_rate(self) -> float:
+        """Fraction of the calls that were merged into a call in flight."""
+        return self.n_coalesced / self.n_calls if self.n_calls else 0.0
+
+    def __len__(self):
+        """Number of calls in flight."""
+        return len(self._flights)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Call `func`, unless a call with the same key is already in flight, in
+        which case its result is returned instead."""
+        self.n_calls += 1
+        flight_key = (asyncio.get_running_loop(), key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._flights[flight_key] = flight
+
+            def forget(_: asyncio.Future):
+                if self._flights.get(flight_key) is flight:
+                    del self._flights[flight_key]
+
+            flight.task.add_done_callback(forget)
+        else:
+            self.n_coalesced += 1
+            logger.info(
+                f"Merged a call into the identical call in flight. Coalesced "
+                f"{self.n_coalesced} of {self.n_calls} calls ({self.coalesce_rate:.1%})"
+            )
+
+        flight.n_waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.n_waiters == 1:
+                # Nobody is waiting for the call anymore
+                flight.task.cancel()
+            raise
+        finally:
+            flight.n_waiters -= 1
+
+
+@dataclass
+class SingleFlightCardGenerator:
+    """Card generator whose async calls for the same input card and number of cards
+    are merged while they are in flight, so that concurrent identical requests only
+    make a single LLM call. Each caller gets its own list of the same cards. Streamed
+    calls aren't merged.
+
+    Parameters
+    ----------
+    card_generator : Any
+        The card generator that makes the calls.
+    flight : SingleFlight
+        Merges the calls. Can be shared between card generators with different
+        `key`s.
+    key : Hashable
+        Identifies the card generator in the keys of the calls, e.g. its config.
+    """
+
+    card_generator: Any
+    flight: SingleFlight
+    key: Optional[Hashable] = None
+
+    def __call__(
+        self, card: TranslationCard, n_cards: Optional[int] = None
+    ) -> List[TranslationCard]:
+        return self.card_generator(card, n_cards=n_cards)
+
+    async def acall(
+        self, card: TranslationCard, n_cards: Optional[int] = None
+    ) -> List[TranslationCard]:
+        """Generate cards for the input card, or wait for the identical call that is
+        already in flight."""
+        cards = await self.flight.do(
+            (self.key, card, n_cards),
+            lambda: self.card_generator.acall(card, n_cards=n_cards),
+        )
+        return list(cards)
+
+    async def astream(
+        self, card: TranslationCard, n_cards: Optional[int] = None
+    ) -> AsyncIterator[TranslationCard]:
+        """Generate cards for the input card, yielding each card as soon as it has
+        been generated."""
+        stream = getattr(self.card_generator, "astream", None)
+        if stream is None:
+            for new_card in await self.acall(card, n_cards=n_cards):
+                yield new_card
+            return
+
+        async for new_card in stream(card, n_cards=n_cards):
+            yield new_card
@@ -1,14 +1,27 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, status
 from fastapi.responses import RedirectResponse
 from fastapi_versionizer import Versionizer
 from pydantic import BaseModel
 
+from phrasify.factory import get_client_session_pool
+
 from .routers.cards import router as cards_router
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):  # noqa: ARG001
+    yield
+    # Close the connections to the LLM APIs that were kept open on the server's loop
+    await get_client_session_pool().close()
+
+
 app = FastAPI(
     title="Card Generator API",
     version="1.0",
     description="API for generating Anki cards from a prompt and input card.",
+    lifespan=lifespan,
 )
 
 app.include_router(cards_router, prefix="/cards", tags=["Cards"])
@@ -1,18 +1,57 @@
-from fastapi import APIRouter
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
 from fastapi_versionizer import api_version
 from pydantic import BaseModel, Field
 
 from phrasify.card import TranslationCard as TranslationCardDataclass
+from phrasify.card_gen import CardGeneratorConfig as CardGeneratorConfigDataclass
 from phrasify.card_gen import LLMTranslationCardGenerator
+from phrasify.card_pool import get_card_pool
 from phrasify.constants import (
     DEFAULT_N_CARDS,
     DEFAULT_SOURCE_LANGUAGE,
     DEFAULT_TARGET_LANGUAGE,
+    MAX_REMOTE_BATCH_SIZE,
+    REGISTRY_MAXSIZE,
+    REGISTRY_TTL,
+    TIMEOUT_HEADER,
 )
-from phrasify.factory import get_llm_name, get_prompt_name
+from phrasify.factory import get_llm_name, get_prompt_name, get_single_flight
+from phrasify.logging import get_logger
+from phrasify.registry import BoundedRegistry
+from phrasify.singleflight import SingleFlightCardGenerator
+
+logger = get_logger(__name__)
 
 router = APIRouter()
 
+# Maximum number of input cards of a batch request whose cards are generated at once
+BATCH_CONCURRENCY = 8
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+def create_card_generator(
+    config: CardGeneratorConfigDataclass,
+) -> SingleFlightCardGenerator:
+    """Create the card generator for a config. Identical requests that come in at the
+    same time share a single LLM call."""
+    return SingleFlightCardGenerator(
+        LLMTranslationCardGenerator.from_config(config),
+        get_single_flight(),
+        key=config,
+    )
+
+
+# Reuse the card generators, with their LLM clients and prompts, between requests
+get_card_generator: BoundedRegistry[
+    CardGeneratorConfigDataclass, SingleFlightCardGenerator
+] = BoundedRegistry(create_card_generator, maxsize=REGISTRY_MAXSIZE, ttl=REGISTRY_TTL)
+
 
 class TranslationCard(BaseModel):
     """Model for a translation card."""
@@ -40,6 +79,15 @@ class CardGeneratorConfig(BaseModel):
     source_language: str = DEFAULT_SOURCE_LANGUAGE
     target_language: str = DEFAULT_TARGET_LANGUAGE
 
+    def to_dataclass(self) -> CardGeneratorConfigDataclass:
+        return CardGeneratorConfigDataclass(
+            llm=self.llm,
+            prompt_name=self.prompt_name,
+            n_cards=self.n_cards,
+            source_language=self.source_language,
+            target_language=self.target_language,
+        )
+
 
 class CardGenerationRequest(BaseModel):
     """Request model for generating Anki cards."""
@@ -48,9 +96,150 @@ class CardGenerationRequest(BaseModel):
     card: TranslationCard = Field(default_factory=TranslationCard)
 
 
+class BatchCardGenerationItem(BaseModel):
+    """Input card of a batch request, with its own card generator configuration
+    that overrides the one of the batch."""
+
+    card: TranslationCard = Field(default_factory=TranslationCard)
+    card_generator: Optional[CardGeneratorConfig] = None
+
+
+class BatchCardGenerationRequest(BaseModel):
+    """Request model for generating Anki cards for several input cards at once."""
+
+    card_generator: CardGeneratorConfig = Field(default_factory=CardGeneratorConfig)
+    items: list[BatchCardGenerationItem] = Field(max_length=MAX_REMOTE_BATCH_SIZE)
+
+
+class BatchCardGenerationResult(BaseModel):
+    """The cards generated for an input card of a batch request, or the error that
+    prevented them from being generated."""
+
+    cards: list[TranslationCard] = Field(default_factory=list)
+    error: Optional[str] = None
+
+
+async def _generate_cards(
+    config: CardGeneratorConfigDataclass, card: TranslationCardDataclass
+) -> list[TranslationCardDataclass]:
+    # Serve pre-generated cards from the pool that is shared between the replicas
+    card_pool = get_card_pool()
+    if card_pool is not None:
+        return await card_pool.take(config, card)
+
+    generator = get_card_generator(config)
+    cards = await generator.acall(card)
+    return cards
+
+
 @api_version(1)
 @router.post("/", summary="Generate Anki cards from a prompt and input card.")
-def generate_cards(request: CardGenerationRequest) -> list[TranslationCard]:
-    generator = LLMTranslationCardGenerator.from_config(request.card_generator)
-    cards = generator(request.card.to_dataclass())
-    return cards
+async def generate_cards(
+    request: CardGenerationRequest,
+    timeout: Optional[float] = Header(default=None, alias=TIMEOUT_HEADER, gt=0),
+) -> list[TranslationCard]:
+    """Generate the cards, giving up after the number of seconds in the timeout
+    header that the client sends, because it doesn't wait any longer."""
+    config = request.card_generator.to_dataclass()
+    card = request.card.to_dataclass()
+    try:
+        return await asyncio.wait_for(_generate_cards(config, card), timeout)
+    except asyncio.TimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Cards weren't generated within {timeout:.1f}s",
+        ) from e
+
+
+async def _stream_cards(
+    config: CardGeneratorConfigDataclass, card: TranslationCardDataclass
+) -> AsyncIterator[TranslationCardDataclass]:
+    # The pooled cards are all there already, so there's nothing to stream
+    card_pool = get_card_pool()
+    if card_pool is not None:
+        for new_card in await card_pool.take(config, card):
+            yield new_card
+        return
+
+    generator = get_card_generator(config)
+    async for new_card in generator.astream(card):
+        yield new_card
+
+
+def _format_event(event: str, data: dict, *, sse: bool) -> str:
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return f"{json.dumps(data)}\n"
+
+
+async def _stream_events(
+    config: CardGeneratorConfigDataclass,
+    card: TranslationCardDataclass,
+    *,
+    sse: bool,
+) -> AsyncIterator[str]:
+    try:
+        async for new_card in _stream_cards(config, card):
+            card_json = TranslationCard.from_dataclass(new_card).model_dump()
+            yield _format_event("card", card_json, sse=sse)
+    except Exception as e:
+        # The status has been sent already, so the error is sent as an event
+        logger.exception(f"Failed to stream cards for card {card!r}")
+        yield _format_event("error", {"error": str(e)}, sse=sse)
+        return
+
+    if sse:
+        yield _format_event("done", {}, sse=sse)
+
+
+@api_version(1)
+@router.post(
+    "/stream",
+    summary="Stream the Anki cards generated from a prompt and input card.",
+    response_class=StreamingResponse,
+)
+async def stream_cards(
+    request: CardGenerationRequest, accept: Optional[str] = Header(default=None)
+) -> StreamingResponse:
+    """Stream each card as soon as it has been generated, as a line of JSON or, if
+    the client accepts server-sent events, as a `card` event. An error while
+    generating the cards is sent as a line of JSON with an `error`, or as an `error`
+    event.
+    """
+    config = request.card_generator.to_dataclass()
+    card = request.card.to_dataclass()
+    sse = accept is not None and SSE_MEDIA_TYPE in accept
+    return StreamingResponse(
+        _stream_events(config, card, sse=sse),
+        media_type=SSE_MEDIA_TYPE if sse else NDJSON_MEDIA_TYPE,
+    )
+
+
+@api_version(1)
+@router.post("/batch", summary="Generate Anki cards for several input cards.")
+async def generate_cards_batch(
+    request: BatchCardGenerationRequest,
+) -> list[BatchCardGenerationResult]:
+    """Generate the cards for each input card, at most `BATCH_CONCURRENCY` at a
+    time. The results are in the same order as the items. An item that fails gets an
+    error instead of failing the whole batch."""
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def generate_item(
+        item: BatchCardGenerationItem,
+    ) -> BatchCardGenerationResult:
+        card_generator = item.card_generator or request.card_generator
+        config = card_generator.to_dataclass()
+        card = item.card.to_dataclass()
+        async with semaphore:
+            try:
+                cards = await _generate_cards(config, card)
+            except Exception as e:
+                logger.exception(f"Failed to generate cards for card {card!r}")
+                return BatchCardGenerationResult(error=str(e))
+
+        return BatchCardGenerationResult(
+            cards=[TranslationCard.from_dataclass(c) for c in cards]
+        )
+
+    return await asyncio.gather(*(generate_item(item) for item in request.items))
@@ -0,0 +1,5 @@
+import os
+
+# The command line doesn't run inside Anki, so don't initialize the add-on when
+# importing phrasify
+os.environ.setdefault("INIT_PHRASIFY_ADDON", "false")
@@ -0,0 +1,410 @@
+"""Generate cards for all notes in an export ahead of time, filling the card cache."""
+
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Counter as TypingCounter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from phrasify.caches.files import get_cache_digest
+from phrasify.card import TranslationCard
+from phrasify.card_gen import (
+    CachedCardGenerator,
+    CardGenerator,
+    CardGeneratorConfig,
+    create_card_generator,
+)
+from phrasify.constants import DEFAULT_BATCH_SIZE, DEFAULT_MIN_CARDS
+from phrasify.factory import evict_card_cache, get_card_cache, get_card_normalizer
+from phrasify.hooks.cache_warmer import find_phrasify_filter_names
+from phrasify.hooks.phrasify_filter import (
+    LanguageFieldNames,
+    PhrasifyFilterConfig,
+    parse_phrasify_filter_name,
+)
+
+# Names of the collection in an .apkg file, newest first. Newer exports also contain a
+# `collection.anki21b`, which is compressed and not supported.
+APKG_COLLECTION_NAMES = ("collection.anki21", "collection.anki2")
+
+
+@dataclass(frozen=True)
+class GenerationItem:
+    """An input card to fill the cache for, using the given card generator config."""
+
+    config: CardGeneratorConfig
+    card: TranslationCard
+
+    @property
+    def key(self) -> str:
+        """Key that identifies the cached cards of the item in the progress file."""
+        name = self.config.to_path_friendly_str()
+        normalizer = get_card_normalizer()
+        card = self.card if normalizer is None else normalizer(self.card)
+        return f"{name}/{get_cache_digest(name, card)}"
+
+
+@dataclass
+class GenerationResult:
+    """Result of filling the cache for a single item."""
+
+    key: str
+    n_cards: int = 0
+    n_requests: int = 0
+    error: Optional[str] = None
+
+
+def read_delimited(
+    path: Path,
+    config: CardGeneratorConfig,
+    source_column: int = 0,
+    target_column: int = 1,
+    delimiter: Optional[str] = None,
+) -> List[GenerationItem]:
+    """Read the input cards from a CSV or TSV file, like a "Notes in Plain Text"
+    export from Anki.
+
+    Lines starting with `#` are skipped, like the headers of Anki exports. If no
+    delimiter is given, it is inferred from the file extension.
+    """
+    if delimiter is None:
+        delimiter = "\t" if path.suffix.lower() in (".tsv", ".txt") else ","
+
+    items = []
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = csv.reader(
+            (line for line in f if not line.startswith("#")), delimiter=delimiter
+        )
+        for row in rows:
+            if len(row) <= max(source_column, target_column):
+                continue
+            card = TranslationCard(source=row[source_column], target=row[target_column])
+            items.append(GenerationItem(config, card))
+
+    return items
+
+
+def _read_apkg_collection(path: Path, directory: Path) -> Path:
+    with zipfile.ZipFile(path) as apkg:
+        names = set(apkg.namelist())
+        for collection_name in APKG_COLLECTION_NAMES:
+            if collection_name in names:
+                return Path(apkg.extract(collection_name, directory))
+
+    message = (
+        f"No supported collection found in {path}. Export it with "
+        f"'Support older Anki versions' enabled."
+    )
+    raise ValueError(message)
+
+
+def read_apkg(
+    path: Path,
+    config: CardGeneratorConfig,
+    language_field_names: Optional[LanguageFieldNames] = None,
+) -> List[GenerationItem]:
+    """Read the input cards from the notes in an .apkg file.
+
+    For the note types whose templates use the phrasify filter, the card generator
+    config and fields are taken from the filter. The notes of other note types are
+    only used if `language_field_names` is given, with the given config.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        collection_path = _read_apkg_collection(path, Path(directory))
+        connection = sqlite3.connect(collection_path)
+        try:
+            (models_json,) = connection.execute("select models from col").fetchone()
+            notes = connection.execute("select mid, flds from notes").fetchall()
+        finally:
+            connection.close()
+
+    models = json.loads(models_json)
+    filter_configs: Dict[int, List[PhrasifyFilterConfig]] = {}
+    field_names: Dict[int, List[str]] = {}
+    for model_id, model in models.items():
+        field_names[int(model_id)] = [
+            fld["name"] for fld in sorted(model["flds"], key=lambda fld: fld["ord"])
+        ]
+        templates = "".join(t["qfmt"] + t["afmt"] for t in model["tmpls"])
+        for filter_name in find_phrasify_filter_names(templates):
+            try:
+                filter_config = parse_phrasify_filter_name(filter_name)
+            except ValueError:
+                continue
+            filter_configs.setdefault(int(model_id), []).append(filter_config)
+
+    items = []
+    for model_id, fields in notes:
+        note = dict(zip(field_names[model_id], fields.split("\x1f")))
+        model_filter_configs = filter_configs.get(model_id)
+        if model_filter_configs is None and language_field_names is not None:
+            model_filter_configs = [PhrasifyFilterConfig(config, language_field_names)]
+
+        for filter_config in model_filter_configs or []:
+            try:
+                card = filter_config.language_field_names.create_card(note)
+            except KeyError:
+                continue
+            items.append(GenerationItem(filter_config.card_generator, card))
+
+    return items
+
+
+def read_progress(path: Path) -> Set[str]:
+    """Read the keys of the items that were completed in an earlier run."""
+    done = set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # Partially written line of an interrupted run
+                    continue
+                if result.get("error") is None:
+                    done.add(result["key"])
+    except FileNotFoundError:
+        pass
+
+    return done
+
+
+def _end_with_newline(path: Path):
+    """Make sure that new lines are not appended to a partially written line of an
+    interrupted run."""
+    try:
+        with open(path, "rb+") as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+    except FileNotFoundError:
+        pass
+
+
+class _RequestCounter:
+    """Wraps a card generator to count the number of requests to it per input card.
+
+    A request for a batch of input cards is counted for the first input card of the
+    batch. If the card generator can't generate batches, a batch is generated with a
+    request per input card.
+    """
+
+    def __init__(self, card_generator: CardGenerator):
+        self.card_generator = card_generator
+        self.n_requests: TypingCounter[TranslationCard] = Counter()
+
+    async def acall(
+        self, card: TranslationCard, n_cards: Optional[int] = None
+    ) -> List[TranslationCard]:
+        self.n_requests[card] += 1
+        return await self.card_generator.acall(card, n_cards=n_cards)
+
+    async def abatch(
+        self, cards: List[TranslationCard], n_cards: Optional[int] = None
+    ) -> List[List[TranslationCard]]:
+        abatch = getattr(self.card_generator, "abatch", None)
+        if abatch is None:
+            return list(
+                await asyncio.gather(
+                    *(self.acall(card, n_cards=n_cards) for card in cards)
+                )
+            )
+
+        if cards:
+            self.n_requests[cards[0]] += 1
+        return await abatch(cards, n_cards=n_cards)
+
+
+@dataclass
+class GenerationOptions:
+    """Options for filling the cache, shared by all workers."""
+
+    min_cards: int = DEFAULT_MIN_CARDS
+    concurrency: int = 4
+    batch_size: int = DEFAULT_BATCH_SIZE
+    cache_backend: Optional[str] = None
+
+
+def _batches(
+    items: List[GenerationItem], batch_size: int
+) -> Iterator[List[GenerationItem]]:
+    """Split the items into batches of items with the same config."""
+    items_per_config: Dict[CardGeneratorConfig, List[GenerationItem]] = {}
+    for item in items:
+        items_per_config.setdefault(item.config, []).append(item)
+
+    for config_items in items_per_config.values():
+        yield from _chunks(config_items, batch_size)
+
+
+async def _afill_items(
+    items: List[GenerationItem], options: GenerationOptions
+) -> List[GenerationResult]:
+    # Write every card straight to the cache, so that nothing is lost when stopped.
+    # The parent process evicts, so that the workers don't all scan the cache at once.
+    cache = get_card_cache(options.cache_backend, write_back=False, evict=False)
+    semaphore = asyncio.Semaphore(options.concurrency)
+    card_generators: Dict[CardGeneratorConfig, CachedCardGenerator] = {}
+
+    async def fill(batch: List[GenerationItem]) -> List[GenerationResult]:
+        config = batch[0].config
+        if config not in card_generators:
+            card_generators[config] = CachedCardGenerator(
+                _RequestCounter(create_card_generator(config)),
+                min_cards=options.min_cards,
+                name=config.to_path_friendly_str(),
+                cache=cache,
+                normalizer=get_card_normalizer(),
+            )
+        card_generator = card_generators[config]
+        request_counter = card_generator.card_generator
+        cache_cards = [card_generator.get_cache_card(item.card) for item in batch]
+        results = [GenerationResult(item.key) for item in batch]
+
+        async with semaphore:
+            try:
+                n_cached = [
+                    await cache.count(card_generator.name, cache_card)
+                    for cache_card in cache_cards
+                ]
+                await card_generator.fill_cache_batch(item.card for item in batch)
+                for result, cache_card, n_before in zip(results, cache_cards, n_cached):
+                    n_after = await cache.count(card_generator.name, cache_card)
+                    result.n_cards = max(n_after - n_before, 0)
+            except Exception as e:
+                for result in results:
+                    result.error = f"{e.__class__.__name__}: {e}"
+
+        for result, item in zip(results, batch):
+            result.n_requests = request_counter.n_requests.pop(item.card, 0)
+        return results
+
+    batch_results = await asyncio.gather(
+        *(fill(batch) for batch in _batches(items, options.batch_size))
+    )
+    return [result for results in batch_results for result in results]
+
+
+def fill_items(
+    items: List[GenerationItem], options: GenerationOptions
+) -> List[GenerationResult]:
+    """Fill the cache for the items. Runs in a worker process."""
+    return asyncio.run(_afill_items(items, options))
+
+
+def _chunks(items: List[GenerationItem], size: int) -> Iterator[List[GenerationItem]]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+@dataclass
+class Throughput:
+    """Keeps track of the number of cards and requests per second."""
+
+    n_items: int
+    n_done: int = 0
+    n_failed: int = 0
+    n_cards: int = 0
+    n_requests: int = 0
+    start: float = field(default_factory=time.monotonic)
+
+    def add(self, result: GenerationResult):
+        self.n_done += 1
+        self.n_failed += result.error is not None
+        self.n_cards += result.n_cards
+        self.n_requests += result.n_requests
+
+    def __str__(self) -> str:
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        return (
+            f"{self.n_done}/{self.n_items} notes ({self.n_failed} failed), "
+            f"{self.n_cards} cards, {self.n_requests} requests in {elapsed:.1f}s: "
+            f"{self.n_cards / elapsed:.2f} cards/s, "
+            f"{self.n_requests / elapsed:.2f} requests/s"
+        )
+
+
+def generate(
+    items: Iterable[GenerationItem],
+    progress_path: Path,
+    options: GenerationOptions,
+    *,
+    workers: int = 4,
+    chunk_size: int = 8,
+    out: TextIO = sys.stderr,
+) -> Throughput:
+    """Fill the cache for all items in parallel, skipping the items that were
+    completed according to the progress file.
+
+    The items are split into chunks of `chunk_size`, which are handled by a pool of
+    `workers` processes. Within each process, the items with the same config are
+    generated in batches of `options.batch_size`, and at most `options.concurrency`
+    batches are generated at the same time. With `workers=0`, everything runs in the
+    current process. The workers don't evict from the cache, so a single eviction pass
+    runs at the end.
+    """
+    done = read_progress(progress_path)
+    todo: List[GenerationItem] = []
+    seen: Set[str] = set()
+    for item in items:
+        key = item.key
+        if key not in done and key not in seen:
+            seen.add(key)
+            todo.append(item)
+
+    out.write(f"Generating cards for {len(todo)} notes, {len(done)} already done\n")
+    throughput = Throughput(n_items=len(todo))
+
+    _end_with_newline(progress_path)
+    with open(progress_path, "a", encoding="utf-8") as progress:
+
+        def record(results: List[GenerationResult]):
+            for result in results:
+                progress.write(json.dumps(asdict(result)) + "\n")
+                throughput.add(result)
+            progress.flush()
+            out.write(f"{throughput}\n")
+
+        if workers == 0:
+            for chunk in _chunks(todo, chunk_size):
+                record(fill_items(chunk, options))
+        else:
+            # Don't fork the background event loop of the parent process
+            mp_context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(workers, mp_context=mp_context) as executor:
+                futures = [
+                    executor.submit(fill_items, chunk, options)
+                    for chunk in _chunks(todo, chunk_size)
+                ]
+                for future in as_completed(futures):
+                    record(future.result())
+
+    evict_card_cache(options.cache_backend)
+    return throughput
+
+
+def read_items(
+    path: Path,
+    config: CardGeneratorConfig,
+    language_field_names: Optional[LanguageFieldNames] = None,
+    columns: Tuple[int, int] = (0, 1),
+    delimiter: Optional[str] = None,
+) -> List[GenerationItem]:
+    """Read the items from an .apkg file or a CSV/TSV export."""
+    if path.suffix.lower() == ".apkg":
+        return read_apkg(path, config, language_field_names)
+
+    source_column, target_column = columns
+    return read_delimited(path, config, source_column, target_column, delimiter)
@@ -0,0 +1,161 @@
+import argparse
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from phrasify.card_gen import CardGeneratorConfig
+from phrasify.constants import DEFAULT_BATCH_SIZE, DEFAULT_MIN_CARDS
+from phrasify.factory import get_llm_name, get_prompt_name
+from phrasify.hooks.phrasify_filter import LanguageFieldNames
+
+from .generate import GenerationOptions, generate, read_items
+
+
+def _add_generate_parser(subparsers):
+    parser = subparsers.add_parser(
+        "generate",
+        help="Generate cards for all notes in an export, filling the card cache.",
+        description=(
+            "Generate cards for all notes in a CSV/TSV export or an .apkg file ahead "
+            "of time, so that reviewing them doesn't have to wait for the LLM. "
+            "Progress is saved, so an interrupted run can be resumed by running the "
+            "same command again."
+        ),
+    )
+    parser.add_argument("input", type=Path, help="CSV/TSV export or .apkg file.")
+    parser.add_argument("--llm", default=None, help="LLM to generate the cards with.")
+    parser.add_argument("--prompt-name", default=None, help="Name of the prompt.")
+    parser.add_argument("--source-lang", default=None, help="Source language.")
+    parser.add_argument("--target-lang", default=None, help="Target language.")
+    parser.add_argument(
+        "--source-column",
+        type=int,
+        default=0,
+        help="Column with the source text in a CSV/TSV file, counting from 0.",
+    )
+    parser.add_argument(
+        "--target-column",
+        type=int,
+        default=1,
+        help="Column with the target text in a CSV/TSV file, counting from 0.",
+    )
+    parser.add_argument(
+        "--delimiter",
+        default=None,
+        help="Delimiter of a CSV/TSV file. Inferred from the extension by default.",
+    )
+    parser.add_argument(
+        "--source-field",
+        default=None,
+        help=(
+            "Field with the source text in the notes of an .apkg file whose note type "
+            "doesn't use the phrasify filter."
+        ),
+    )
+    parser.add_argument(
+        "--target-field",
+        default=None,
+        help=(
+            "Field with the target text in the notes of an .apkg file whose note type "
+            "doesn't use the phrasify filter."
+        ),
+    )
+    parser.add_argument(
+        "--min-cards",
+        type=int,
+        default=DEFAULT_MIN_CARDS,
+        help="Number of cards to have in the cache for each note.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of worker processes. Use 0 to run in the current process.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of notes for which each worker generates cards at the same time.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Number of notes with the same config whose cards are generated at once.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=8,
+        help="Number of notes that are sent to a worker at once.",
+    )
+    parser.add_argument(
+        "--cache-backend",
+        default=None,
+        choices=["log", "json", "sqlite"],
+        help="Card cache backend. Uses the one from the config by default.",
+    )
+    parser.add_argument(
+        "--progress",
+        type=Path,
+        default=None,
+        help="Progress file. Defaults to the input file with a .progress.jsonl suffix.",
+    )
+    parser.set_defaults(func=run_generate)
+
+
+def run_generate(args: argparse.Namespace) -> int:
+    config_kwargs = {
+        "llm": get_llm_name(args.llm),
+        "prompt_name": get_prompt_name(args.prompt_name),
+    }
+    if args.source_lang is not None:
+        config_kwargs["source_language"] = args.source_lang
+    if args.target_lang is not None:
+        config_kwargs["target_language"] = args.target_lang
+    config = CardGeneratorConfig(**config_kwargs)
+
+    language_field_names = None
+    if args.source_field is not None and args.target_field is not None:
+        language_field_names = LanguageFieldNames(
+            source=args.source_field, target=args.target_field
+        )
+
+    items = read_items(
+        args.input,
+        config,
+        language_field_names=language_field_names,
+        columns=(args.source_column, args.target_column),
+        delimiter=args.delimiter,
+    )
+    progress_path = args.progress
+    if progress_path is None:
+        progress_path = args.input.with_name(f"{args.input.name}.progress.jsonl")
+
+    options = GenerationOptions(
+        min_cards=args.min_cards,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        cache_backend=args.cache_backend,
+    )
+    throughput = generate(
+        items,
+        progress_path,
+        options,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
+    sys.stderr.write(f"Done: {throughput}\n")
+    return 1 if throughput.n_failed > 0 else 0
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="phrasify", description="Command line tools for Phrasify."
+    )
+    subparsers = parser.add_subparsers(required=True, dest="command")
+    _add_generate_parser(subparsers)
+
+    args = parser.parse_args(argv)
+    sys.exit(args.func(args))
@@ -1,3 +1,4 @@
+import shutil
 from dataclasses import dataclass
 from functools import partial
 from typing import List
@@ -178,5 +179,8 @@ def translation_card(request):
 @pytest.fixture(scope="session", autouse=True)
 def cleanup():
     yield
-    for path in GENERATED_CARDS_DIR.glob("*.json"):
-        path.unlink()
+    for path in GENERATED_CARDS_DIR.iterdir():
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.suffix == ".json":
+            path.unlink()
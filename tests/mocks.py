@@ -1,20 +1,40 @@
 import asyncio
+import json
+import socket
+import threading
 import time
+from contextlib import asynccontextmanager, contextmanager
 from functools import lru_cache
-from typing import Callable, Mapping, Optional, TypeVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import requests
+from aiohttp import web
 
 from phrasify.card import TranslationCard
 from phrasify.card_gen import CardGeneratorConfig, NextCardFactory
+from phrasify.llms.base import LLM
 
 T_co = TypeVar("T_co", covariant=True)
 
 
 class MockResponse:
-    def __init__(self, json, status_code=200):
+    def __init__(self, json, status_code=200, headers=None):
         self._json = json
         self.status_code = status_code
+        self.headers = headers if headers is not None else {}
 
     def json(self):
         return self._json
@@ -25,6 +45,31 @@ class MockResponse:
             raise requests.HTTPError(message)
 
 
+class CountingLLM(LLM):
+    """LLM that answers every prompt with a new response, which it streams word by
+    word, keeping track of how often it was called."""
+
+    model = "counting"
+
+    def __init__(self, error: Optional[Exception] = None):
+        self.error = error
+        self.n_times_called = 0
+
+    def _call(self, prompt: str, **kwargs):  # noqa: ARG002
+        self.n_times_called += 1
+        if self.error is not None:
+            raise self.error
+
+        return f"Response {self.n_times_called} to {prompt}"
+
+    async def _acall(self, prompt: str, **kwargs):
+        return self._call(prompt, **kwargs)
+
+    async def _astream(self, prompt: str, **kwargs):
+        for i, word in enumerate(self._call(prompt, **kwargs).split(" ")):
+            yield word if i == 0 else f" {word}"
+
+
 class CountingCardGenerator:
     """Card generator that returns a fixed number of cards with the same source
     and target.
@@ -71,6 +116,33 @@ class CountingCardGenerator:
         return self._call(card, n_cards=n_cards)
 
 
+class CountingBatchCardGenerator(CountingCardGenerator):
+    """CountingCardGenerator that can also generate the cards for several input cards
+    at once, keeping track of how often it was called with a batch."""
+
+    def __init__(self, n_cards: int = 1, sleep_interval: float = 0.0):
+        super().__init__(n_cards=n_cards, sleep_interval=sleep_interval)
+        self.batches = []
+
+    async def abatch(self, cards, n_cards: Optional[int] = None):
+        self.batches.append(list(cards))
+        return [self._call(card, n_cards=n_cards) for card in cards]
+
+
+class StreamingCardGenerator(CountingCardGenerator):
+    """CountingCardGenerator that streams its cards, after waiting `first_card_delay`
+    seconds for the first card."""
+
+    def __init__(self, n_cards: int = 1, first_card_delay: float = 0.0):
+        super().__init__(n_cards=n_cards)
+        self.first_card_delay = first_card_delay
+
+    async def astream(self, card: TranslationCard, n_cards: Optional[int] = None):
+        await asyncio.sleep(self.first_card_delay)
+        for new_card in self._call(card, n_cards=n_cards):
+            yield new_card
+
+
 class EmptyCardGenerator:
     """Card generator that returns empty cards."""
 
@@ -136,3 +208,137 @@ def create_counting_card_factory(
     """Create a card factory that returns a CountingCardGenerator."""
     card_factory = NextCardFactory(CountingCardGenerator(config.n_cards))
     return lru_cache(maxsize=None)(card_factory)
+
+
+def get_closed_url() -> str:
+    """Get the URL of a port on which nothing is listening."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def _is_streamed(response_json: Union[dict, list]) -> bool:
+    return isinstance(response_json, list) and all(
+        isinstance(line, str) for line in response_json
+    )
+
+
+class MockAPIServer:
+    """Local HTTP server that serves fixed JSON responses after `delay` seconds,
+    keeping track of the requests and of the client connections they came in on.
+
+    A response that is a list of strings is streamed, one line per string. The first
+    requests get the error responses in `failures`, given by their status and
+    headers, before the server starts serving the responses.
+    """
+
+    def __init__(
+        self,
+        responses: Dict[str, Union[dict, List[str]]],
+        status: int = 200,
+        delay: float = 0.0,
+        failures: Optional[List[Tuple[int, Dict[str, str]]]] = None,
+    ):
+        self.responses = responses
+        self.status = status
+        self.delay = delay
+        self.failures = list(failures) if failures is not None else []
+        self.requests = []
+        self.headers: List[Dict[str, str]] = []
+        self.connections: Set[tuple] = set()
+        self.url = ""
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests.append(await request.json())
+        self.headers.append(dict(request.headers))
+        self.connections.add(request.transport.get_extra_info("peername"))
+        if self.delay > 0.0:
+            await asyncio.sleep(self.delay)
+
+        if self.failures:
+            status, headers = self.failures.pop(0)
+            return web.json_response(
+                {"error": "Mock error"}, status=status, headers=headers
+            )
+
+        response_json = self.responses[request.path]
+        if not _is_streamed(response_json):
+            return web.json_response(response_json, status=self.status)
+
+        response = web.StreamResponse(status=self.status)
+        await response.prepare(request)
+        for line in response_json:
+            await response.write(f"{line}\n".encode())
+        await response.write_eof()
+        return response
+
+    async def handle_get(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            self.responses.get(request.path, {}), status=self.status
+        )
+
+    @asynccontextmanager
+    async def serve(self) -> AsyncIterator["MockAPIServer"]:
+        app = web.Application()
+        app.router.add_post("/{path:.*}", self.handle)
+        app.router.add_get("/{path:.*}", self.handle_get)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        try:
+            yield self
+        finally:
+            await runner.cleanup()
+
+    @contextmanager
+    def serve_sync(self) -> Iterator["MockAPIServer"]:
+        """Serve from a thread, for the sync clients. Unlike `serve`, it doesn't need
+        an event loop."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                server.requests.append(json.loads(self.rfile.read(length)))
+                server.headers.append(dict(self.headers))
+                server.connections.add(self.client_address)
+                if server.delay > 0.0:
+                    time.sleep(server.delay)
+
+                status, headers = server.status, {}
+                response_json = server.responses[self.path]
+                if server.failures:
+                    status, headers = server.failures.pop(0)
+                    response_json = {"error": "Mock error"}
+
+                if _is_streamed(response_json):
+                    body = "".join(f"{line}\n" for line in response_json).encode()
+                else:
+                    body = json.dumps(response_json).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        http_server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        host, port = http_server.server_address[:2]
+        self.url = f"http://{host}:{port}"
+        thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            http_server.shutdown()
+            http_server.server_close()
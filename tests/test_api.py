@@ -0,0 +1,172 @@
+import json
+import sys
+
+import pytest
+
+if sys.version_info < (3, 9):
+    pytest.skip("The API needs Python 3.9 or newer", allow_module_level=True)
+
+pytest.importorskip("fastapi")
+pytest.importorskip("fastapi_versionizer")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from phrasify.card import TranslationCard
+from phrasify.constants import MAX_REMOTE_BATCH_SIZE, TIMEOUT_HEADER
+from phrasify.error import CardGenerationError
+from phrasify_api.routers import cards
+from tests.mocks import (
+    CountingCardGenerator,
+    ErrorCardGenerator,
+    StreamingCardGenerator,
+)
+
+CARD = {"source": "friend", "target": "друг"}
+
+
+def _create_card_generator(config):
+    """Create a card generator that fails for German, and streams otherwise."""
+    if config.target_language == "German":
+        return ErrorCardGenerator(CardGenerationError("Mock error"))
+    return StreamingCardGenerator(n_cards=config.n_cards)
+
+
+@pytest.fixture()
+def from_config(mocker):
+    """Patch the creation of the card generators of the API, without a card pool."""
+    mocker.patch.object(cards, "get_card_pool", return_value=None)
+    card_generator_class = mocker.patch.object(cards, "LLMTranslationCardGenerator")
+    card_generator_class.from_config.side_effect = _create_card_generator
+    cards.get_card_generator.cache_clear()
+    yield card_generator_class.from_config
+    cards.get_card_generator.cache_clear()
+
+
+@pytest.fixture()
+def client(from_config):  # noqa: ARG001
+    app = FastAPI()
+    app.include_router(cards.router, prefix="/cards")
+    with TestClient(app, raise_server_exceptions=False) as client:
+        yield client
+
+
+def _card_json(card: TranslationCard) -> dict:
+    return {"source": card.source, "target": card.target}
+
+
+def test_generate_cards_reuses_card_generator(client, from_config):
+    request = {"card": CARD, "card_generator": {"n_cards": 2}}
+
+    responses = [client.post("/cards/", json=request) for _ in range(2)]
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert len(responses[0].json()) == 2
+    assert responses[0].json() != responses[1].json()
+    # The second request reuses the card generator of the first
+    assert from_config.call_count == 1
+
+
+def test_generate_cards_invalid_request(client):
+    request = {"card": CARD, "card_generator": {"n_cards": 0}}
+
+    assert client.post("/cards/", json=request).status_code == 422
+    response = client.post(
+        "/cards/", json={"card": CARD}, headers={TIMEOUT_HEADER: "0"}
+    )
+    assert response.status_code == 422
+
+
+def test_generate_cards_error(client):
+    request = {"card": CARD, "card_generator": {"target_language": "German"}}
+
+    assert client.post("/cards/", json=request).status_code == 500
+
+
+def test_generate_cards_timeout(client, mocker):
+    card_generator = CountingCardGenerator(n_cards=1, sleep_interval=1.0)
+    mocker.patch.object(cards, "get_card_generator", return_value=card_generator)
+
+    response = client.post(
+        "/cards/", json={"card": CARD}, headers={TIMEOUT_HEADER: "0.1"}
+    )
+
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Cards weren't generated within 0.1s"}
+
+
+def test_generate_cards_batch(client):
+    request = {
+        "card_generator": {"n_cards": 2},
+        "items": [
+            {"card": CARD},
+            {"card": CARD, "card_generator": {"target_language": "German"}},
+            {"card": CARD, "card_generator": {"n_cards": 1}},
+        ],
+    }
+
+    response = client.post("/cards/batch", json=request)
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [len(result["cards"]) for result in results] == [2, 0, 1]
+    assert [result["error"] for result in results] == [None, "Mock error", None]
+
+
+def test_generate_cards_batch_too_large(client):
+    request = {"items": [{"card": CARD}] * (MAX_REMOTE_BATCH_SIZE + 1)}
+
+    response = client.post("/cards/batch", json=request)
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "items"]
+
+
+def test_stream_cards_ndjson(client):
+    request = {"card": CARD, "card_generator": {"n_cards": 2}}
+    expected_cards = StreamingCardGenerator(n_cards=2)._call(
+        TranslationCard(**CARD), n_cards=2
+    )
+
+    response = client.post("/cards/stream", json=request)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == cards.NDJSON_MEDIA_TYPE
+    lines = response.text.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        _card_json(card) for card in expected_cards
+    ]
+
+
+def test_stream_cards_sse(client):
+    request = {"card": CARD, "card_generator": {"n_cards": 2}}
+
+    response = client.post(
+        "/cards/stream", json=request, headers={"Accept": cards.SSE_MEDIA_TYPE}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(cards.SSE_MEDIA_TYPE)
+    events = [event.splitlines() for event in response.text.strip().split("\n\n")]
+    assert [event[0] for event in events] == [
+        "event: card",
+        "event: card",
+        "event: done",
+    ]
+    assert json.loads(events[0][1][len("data: ") :])["source"].startswith("Source")
+
+
+def test_stream_cards_error(client):
+    request = {"card": CARD, "card_generator": {"target_language": "German"}}
+
+    response = client.post("/cards/stream", json=request)
+    sse_response = client.post(
+        "/cards/stream", json=request, headers={"Accept": cards.SSE_MEDIA_TYPE}
+    )
+
+    # The status is sent before the cards are generated, so the error is in the body
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"error": "Mock error"}
+    ]
+    assert sse_response.text == 'event: error\ndata: {"error": "Mock error"}\n\n'
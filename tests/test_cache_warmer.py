@@ -0,0 +1,217 @@
+import asyncio
+
+from phrasify.caches.json_file import JSONFileCardCache
+from phrasify.card import TranslationCard
+from phrasify.card_gen import (
+    CachedCardGenerator,
+    CardGeneratorConfig,
+    RemoteCardGenerator,
+)
+from phrasify.hooks.cache_warmer import (
+    QUEUE_TYPE_LRN,
+    QUEUE_TYPE_NEW,
+    QUEUE_TYPE_REV,
+    CacheWarmer,
+    CacheWarmerConfig,
+    collect_warmup_items,
+    find_phrasify_filter_names,
+)
+from tests.mocks import (
+    CountingBatchCardGenerator,
+    CountingCardGenerator,
+    MockAPIServer,
+)
+
+FILTER_NAME = (
+    "phrasify vocab-to-sentence source_lang=English target_lang=Ukrainian "
+    "source_field=Front target_field=Back"
+)
+
+
+class FakeModels:
+    def __init__(self, models):
+        self._models = models
+
+    def all(self):
+        return self._models
+
+
+class FakeScheduler:
+    today = 100
+
+
+class FakeDB:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self, sql, model_id):  # noqa: ARG002
+        return self._rows.get(model_id, [])
+
+
+class FakeCollection:
+    """Minimal stand-in for the Anki collection."""
+
+    def __init__(self, models, notes, rows):
+        self.models = FakeModels(models)
+        self.sched = FakeScheduler()
+        self.db = FakeDB(rows)
+        self._notes = notes
+
+    def get_note(self, note_id):
+        return self._notes[note_id]
+
+
+def test_find_phrasify_filter_names():
+    template = (
+        f"{{{{{FILTER_NAME}:Front}}}}<br>{{{{Back}}}}"
+        f"{{{{#Front}}}}{{{{text:{FILTER_NAME}:Front}}}}{{{{/Front}}}}"
+    )
+
+    assert find_phrasify_filter_names(template) == [FILTER_NAME]
+    assert find_phrasify_filter_names("{{Front}}<hr>{{Back}}") == []
+
+
+def test_collect_warmup_items_orders_by_due():
+    template = {"qfmt": f"{{{{{FILTER_NAME}:Front}}}}", "afmt": "{{Back}}"}
+    models = [
+        {"id": 1, "tmpls": [template]},
+        {"id": 2, "tmpls": [{"qfmt": "{{Front}}", "afmt": "{{Back}}"}]},
+    ]
+    notes = {
+        10: {"Front": "new", "Back": "новий"},
+        11: {"Front": "due later", "Back": "пізніше"},
+        12: {"Front": "due today", "Back": "сьогодні"},
+        13: {"Front": "learning", "Back": "вивчення"},
+        14: {"Front": "due next week", "Back": "наступного тижня"},
+        20: {"Front": "no filter", "Back": "без фільтра"},
+    }
+    rows = {
+        1: [
+            (10, QUEUE_TYPE_NEW, 1),
+            (11, QUEUE_TYPE_REV, 101),
+            (12, QUEUE_TYPE_REV, 99),
+            (13, QUEUE_TYPE_LRN, 1_700_000_000),
+            (14, QUEUE_TYPE_REV, 107),
+            (10, -1, 1),
+        ],
+        2: [(20, QUEUE_TYPE_REV, 100)],
+    }
+    col = FakeCollection(models, notes, rows)
+
+    items = collect_warmup_items(col, CacheWarmerConfig(max_cards=10))
+
+    assert [card.source for _, card in items] == [
+        "learning",
+        "due today",
+        "new",
+        "due later",
+    ]
+    assert all(
+        config
+        == CardGeneratorConfig(
+            prompt_name="vocab-to-sentence",
+            source_language="English",
+            target_language="Ukrainian",
+        )
+        for config, _ in items
+    )
+
+    items = collect_warmup_items(col, CacheWarmerConfig(max_cards=2))
+
+    assert [card.source for _, card in items] == ["learning", "due today"]
+
+
+def test_cache_warmer_fills_cache(tmp_path):
+    card_generator = CountingCardGenerator(n_cards=3)
+    cached_card_generator = CachedCardGenerator(
+        card_generator,
+        min_cards=3,
+        name="test",
+        cache=JSONFileCardCache(directory=tmp_path),
+    )
+    warmer = CacheWarmer(
+        concurrency=2,
+        create_card_generator=lambda config: cached_card_generator,  # noqa: ARG005
+    )
+    items = [
+        (CardGeneratorConfig(), TranslationCard(source=f"Source {i}", target="Target"))
+        for i in range(3)
+    ]
+
+    assert asyncio.run(warmer.warm(items)) == 9
+    assert card_generator.n_times_called == 3
+
+    # The caches are already full, so nothing is generated
+    assert asyncio.run(warmer.warm(items)) == 0
+    assert card_generator.n_times_called == 3
+
+
+def test_cache_warmer_fills_cache_in_batches(tmp_path):
+    card_generator = CountingBatchCardGenerator(n_cards=3)
+    cached_card_generator = CachedCardGenerator(
+        card_generator,
+        min_cards=3,
+        name="test",
+        cache=JSONFileCardCache(directory=tmp_path),
+    )
+    warmer = CacheWarmer(
+        concurrency=2,
+        create_card_generator=lambda config: cached_card_generator,  # noqa: ARG005
+        batch_size=2,
+    )
+    other_config = CardGeneratorConfig(target_language="German")
+    cards = [TranslationCard(source=f"Source {i}", target="Target") for i in range(4)]
+    items = [
+        (CardGeneratorConfig(), cards[0]),
+        (other_config, cards[1]),
+        (CardGeneratorConfig(), cards[2]),
+        (CardGeneratorConfig(), cards[3]),
+    ]
+
+    assert warmer._batch_items(items) == [
+        (CardGeneratorConfig(), [cards[0], cards[2]]),
+        (other_config, [cards[1]]),
+        (CardGeneratorConfig(), [cards[3]]),
+    ]
+    assert asyncio.run(warmer.warm(items)) == 12
+    # Only the batch of two cards is generated with a single call
+    assert card_generator.batches == [[cards[0], cards[2]]]
+    assert card_generator.n_times_called == 4
+
+
+def test_cache_warmer_fills_cache_from_remote_batch(tmp_path):
+    result = {"cards": [{"source": "a", "target": "b"}] * 3, "error": None}
+    server = MockAPIServer({"/v1/cards/batch": [result, result]})
+    cards = [TranslationCard(source=f"Source {i}", target="Target") for i in range(2)]
+    items = [(CardGeneratorConfig(), card) for card in cards]
+
+    async def warm():
+        async with server.serve():
+            card_generator = RemoteCardGenerator(f"{server.url}/v1/cards")
+            cached_card_generator = CachedCardGenerator(
+                card_generator,
+                min_cards=3,
+                name="test",
+                cache=JSONFileCardCache(directory=tmp_path),
+            )
+            warmer = CacheWarmer(
+                create_card_generator=lambda config: cached_card_generator,  # noqa: ARG005
+            )
+            try:
+                return await warmer.warm(items)
+            finally:
+                await card_generator.sessions.close()
+
+    assert asyncio.run(warm()) == 6
+    # Both input cards are sent to the batch endpoint in a single request
+    (request,) = server.requests
+    assert [item["card"]["source"] for item in request["items"]] == [
+        card.source for card in cards
+    ]
+
+
+def test_cache_warmer_config_from_config():
+    assert CacheWarmerConfig.from_config(None) is None
+    assert CacheWarmerConfig.from_config(
+        {"maxCards": 10, "batchSize": 1}
+    ) == CacheWarmerConfig(max_cards=10, batch_size=1)
@@ -0,0 +1,445 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from phrasify.caches.append_log import AppendLogCardCache
+from phrasify.caches.eviction import CacheEvictor, EvictionPolicy
+from phrasify.caches.files import get_cache_digest, get_name_directory_name
+from phrasify.caches.json_file import JSONFileCardCache
+from phrasify.caches.responses import ResponseCache
+from phrasify.caches.sqlite import SQLiteCardCache
+from phrasify.caches.write_back import WriteBackCardCache
+from phrasify.card import TranslationCard
+from phrasify.event_loop import (
+    add_shutdown_callback,
+    create_event_loop_thread,
+    stop_event_loop_thread,
+)
+
+
+@pytest.fixture(params=["json", "log", "sqlite", "write_back", "write_back_log"])
+def card_cache(request, tmp_path):
+    if request.param == "json":
+        yield JSONFileCardCache(directory=tmp_path)
+    elif request.param == "log":
+        yield AppendLogCardCache(directory=tmp_path)
+    elif request.param == "write_back":
+        yield WriteBackCardCache(JSONFileCardCache(directory=tmp_path))
+    elif request.param == "write_back_log":
+        yield WriteBackCardCache(AppendLogCardCache(directory=tmp_path))
+    else:
+        card_cache = SQLiteCardCache(path=tmp_path / "cards.sqlite3")
+        yield card_cache
+        card_cache.close()
+
+
+@pytest.fixture()
+def cards():
+    return [
+        TranslationCard(source=f"Source {i}", target=f"Target {i}") for i in range(3)
+    ]
+
+
+def test_card_cache_get_empty(card_cache, translation_card):
+    """Test that an empty deque is returned when nothing has been cached yet."""
+    cached_cards = asyncio.run(card_cache.get("test", translation_card))
+
+    assert list(cached_cards) == []
+
+
+def test_card_cache_write_and_get(card_cache, translation_card, cards):
+    """Test that the written cards are returned in the same order."""
+
+    async def write_and_get():
+        await card_cache.write("test", translation_card, cards)
+        return await card_cache.get("test", translation_card)
+
+    cached_cards = asyncio.run(write_and_get())
+
+    assert list(cached_cards) == cards
+
+
+def test_card_cache_extend(card_cache, translation_card, cards):
+    """Test that extending the cache appends the cards to the cached cards."""
+
+    async def extend_and_get():
+        await card_cache.extend("test", translation_card, cards[:1])
+        await card_cache.extend("test", translation_card, cards[1:])
+        return await card_cache.get("test", translation_card)
+
+    cached_cards = asyncio.run(extend_and_get())
+
+    assert list(cached_cards) == cards
+
+
+def test_card_cache_popleft_and_count(card_cache, translation_card, cards):
+    """Test that popleft consumes the cards in order until the cache is empty."""
+
+    async def pop_all():
+        await card_cache.extend("test", translation_card, cards)
+        popped = []
+        counts = [await card_cache.count("test", translation_card)]
+        while True:
+            popped_card = await card_cache.popleft("test", translation_card)
+            if popped_card is None:
+                return popped, counts
+            popped.append(popped_card)
+            counts.append(await card_cache.count("test", translation_card))
+
+    popped, counts = asyncio.run(pop_all())
+
+    assert popped == cards
+    assert counts == [3, 2, 1, 0]
+
+
+def test_card_cache_popleft_then_extend(card_cache, translation_card, cards):
+    """Test that cards added after consuming some cards end up after the remaining
+    cards."""
+
+    async def pop_and_extend():
+        await card_cache.extend("test", translation_card, cards[:2])
+        await card_cache.popleft("test", translation_card)
+        await card_cache.extend("test", translation_card, cards[2:])
+        return await card_cache.get("test", translation_card)
+
+    cached_cards = asyncio.run(pop_and_extend())
+
+    assert list(cached_cards) == cards[1:]
+
+
+def test_append_log_card_cache_compacts(tmp_path, translation_card, cards):
+    """Test that the log is compacted once the consumed part gets too big."""
+    card_cache = AppendLogCardCache(directory=tmp_path, compact_bytes=1)
+    log_path, _ = card_cache.get_paths("test", translation_card)
+
+    async def pop_one():
+        await card_cache.extend("test", translation_card, cards)
+        size_before = log_path.stat().st_size
+        popped_card = await card_cache.popleft("test", translation_card)
+        size_after = log_path.stat().st_size
+        remaining = await card_cache.get("test", translation_card)
+        return popped_card, remaining, size_before, size_after
+
+    popped_card, remaining, size_before, size_after = asyncio.run(pop_one())
+
+    assert popped_card == cards[0]
+    assert list(remaining) == cards[1:]
+    assert size_after < size_before
+
+
+def test_card_cache_clear(card_cache, translation_card, cards):
+    """Test that clearing the cache for one name keeps the cards for other names."""
+
+    async def write(name):
+        await card_cache.write(name, translation_card, cards)
+
+    asyncio.run(write("test"))
+    asyncio.run(write("other"))
+    card_cache.clear("test")
+
+    assert list(asyncio.run(card_cache.get("test", translation_card))) == []
+    assert list(asyncio.run(card_cache.get("other", translation_card))) == cards
+
+
+def test_card_cache_key(card_cache, translation_card):
+    """Test that the cache key is the same for equal cards and differs between
+    names."""
+    card_copy = TranslationCard(
+        source=translation_card.source, target=translation_card.target
+    )
+
+    assert card_cache.get_key("test", translation_card) == card_cache.get_key(
+        "test", card_copy
+    )
+    assert card_cache.get_key("test", translation_card) != card_cache.get_key(
+        "other", translation_card
+    )
+
+
+@pytest.mark.parametrize("cache_class", [JSONFileCardCache, AppendLogCardCache])
+def test_file_card_cache_paths_are_sharded(cache_class, tmp_path, translation_card):
+    """Test that the cache files are named after a digest and sharded by its prefix."""
+    card_cache = cache_class(directory=tmp_path)
+    name = "gpt-3.5-turbo_vocab-to-sentence_English_Ukrainian"
+    digest = get_cache_digest(name, translation_card)
+    path = card_cache.get_key(name, translation_card)
+
+    assert len(digest) == 32
+    assert path == tmp_path / name / digest[:2] / f"{digest}{cache_class.suffix}"
+
+
+def test_get_name_directory_name():
+    assert get_name_directory_name("gpt-4_vocab") == "gpt-4_vocab"
+    assert get_name_directory_name("a/b").startswith("a_b-")
+    assert get_name_directory_name("a/b") != get_name_directory_name("a:b")
+
+
+@pytest.mark.parametrize("cache_class", [JSONFileCardCache, AppendLogCardCache])
+def test_file_card_cache_list_cards(cache_class, tmp_path, cards):
+    """Test that the index lists each input card with cached cards once."""
+    card_cache = cache_class(directory=tmp_path)
+
+    async def fill():
+        for input_card in cards:
+            await card_cache.write("test", input_card, cards)
+        await card_cache.extend("test", cards[0], cards)
+
+    asyncio.run(fill())
+
+    assert card_cache.list_cards("test") == cards
+    assert card_cache.list_cards("other") == []
+
+    card_cache.clear("test")
+
+    assert card_cache.list_cards("test") == []
+    assert not (tmp_path / "test").exists()
+
+
+def test_write_back_card_cache_flush(tmp_path, translation_card, cards):
+    """Test that changes are only written to the backend when flushing."""
+    backend = JSONFileCardCache(directory=tmp_path)
+    card_cache = WriteBackCardCache(backend, flush_interval=60.0)
+
+    async def extend_pop_and_flush():
+        await card_cache.extend("test", translation_card, cards)
+        await card_cache.popleft("test", translation_card)
+        before_flush = await backend.get("test", translation_card)
+        n_dirty = card_cache.n_dirty
+        await card_cache.flush()
+        after_flush = await backend.get("test", translation_card)
+        return before_flush, n_dirty, after_flush
+
+    before_flush, n_dirty, after_flush = asyncio.run(extend_pop_and_flush())
+
+    assert list(before_flush) == []
+    assert n_dirty == 1
+    assert list(after_flush) == cards[1:]
+    assert card_cache.n_dirty == 0
+
+
+def test_write_back_card_cache_flushes_changes(
+    tmp_path, translation_card, cards, mocker
+):
+    """Test that only the changes are written back to an incremental backend, also
+    when cards are taken before the new cards were written back."""
+    backend = AppendLogCardCache(directory=tmp_path)
+    card_cache = WriteBackCardCache(backend, flush_interval=60.0)
+    write = mocker.spy(backend, "write")
+    new_cards = [TranslationCard(source="New source", target="New target")]
+
+    async def change_and_flush():
+        await backend.extend("test", translation_card, cards[:1])
+        await card_cache.extend("test", translation_card, cards[1:])
+        await card_cache.flush()
+        await card_cache.popleft("test", translation_card)
+        await card_cache.extend("test", translation_card, new_cards)
+        await card_cache.popleft("test", translation_card)
+        await card_cache.flush()
+        return await backend.get("test", translation_card)
+
+    backend_cards = asyncio.run(change_and_flush())
+
+    assert list(backend_cards) == cards[2:] + new_cards
+    write.assert_not_called()
+
+
+def test_write_back_card_cache_flush_threshold(tmp_path, cards):
+    """Test that the changes are written back once enough entries have changed."""
+    backend = JSONFileCardCache(directory=tmp_path)
+    card_cache = WriteBackCardCache(backend, flush_interval=60.0, flush_threshold=2)
+    input_cards = [TranslationCard(source=f"word {i}") for i in range(2)]
+
+    async def extend_and_wait():
+        for input_card in input_cards:
+            await card_cache.extend("test", input_card, cards)
+        await asyncio.sleep(0.1)
+        return [await backend.get("test", input_card) for input_card in input_cards]
+
+    backend_cards = asyncio.run(extend_and_wait())
+
+    assert [list(c) for c in backend_cards] == [cards, cards]
+
+
+def test_write_back_card_cache_flush_interval(tmp_path, translation_card, cards):
+    """Test that the changes are written back after the flush interval."""
+    backend = JSONFileCardCache(directory=tmp_path)
+    card_cache = WriteBackCardCache(backend, flush_interval=0.05)
+
+    async def extend_and_wait():
+        await card_cache.extend("test", translation_card, cards)
+        await asyncio.sleep(0.2)
+        return await backend.get("test", translation_card)
+
+    backend_cards = asyncio.run(extend_and_wait())
+
+    assert list(backend_cards) == cards
+
+
+def test_write_back_card_cache_flush_at_shutdown(tmp_path, translation_card, cards):
+    """Test that the changes are written back when the background event loop stops."""
+    backend = JSONFileCardCache(directory=tmp_path)
+    card_cache = WriteBackCardCache(backend, flush_interval=60.0)
+    add_shutdown_callback(card_cache.flush)
+    event_loop = create_event_loop_thread()
+
+    asyncio.run_coroutine_threadsafe(
+        card_cache.extend("test", translation_card, cards), event_loop
+    ).result()
+    stop_event_loop_thread(event_loop)
+
+    assert list(asyncio.run(backend.get("test", translation_card))) == cards
+
+
+def _fill_cache_with_ages(card_cache, name, ages, cards):
+    """Fill the cache with an entry for each age (in seconds since last use)."""
+    input_cards = [TranslationCard(source=f"word {i}") for i in range(len(ages))]
+    now = time.time()
+    for input_card, age in zip(input_cards, ages):
+        asyncio.run(card_cache.extend(name, input_card, cards))
+        for path in card_cache.get_paths(name, input_card):
+            os.utime(path, (now - age, now - age))
+
+    return input_cards
+
+
+def _run_full_pass(evictor):
+    while not evictor.step():
+        pass
+
+
+def _count(card_cache, name, input_cards):
+    return [asyncio.run(card_cache.count(name, c)) for c in input_cards]
+
+
+def test_cache_evictor_max_entries(tmp_path, cards):
+    """Test that the least recently used entries are evicted beyond max_entries."""
+    card_cache = AppendLogCardCache(directory=tmp_path)
+    input_cards = _fill_cache_with_ages(card_cache, "test", [30, 10, 20, 40], cards)
+    evictor = CacheEvictor(tmp_path, EvictionPolicy(max_entries=2), batch_size=3)
+
+    _run_full_pass(evictor)
+
+    assert evictor.n_entries == 2
+    assert _count(card_cache, "test", input_cards) == [0, 3, 3, 0]
+
+
+def test_cache_evictor_max_total_bytes(tmp_path, cards):
+    """Test that the least recently used entries are evicted until the cache fits."""
+    card_cache = AppendLogCardCache(directory=tmp_path)
+    input_cards = _fill_cache_with_ages(card_cache, "test", [10, 20, 30], cards)
+    evictor = CacheEvictor(tmp_path, EvictionPolicy(max_total_bytes=1))
+    _run_full_pass(evictor)
+    assert evictor.n_entries == 0
+
+    input_cards = _fill_cache_with_ages(card_cache, "test", [10, 20, 30], cards)
+    entry_bytes = sum(
+        p.stat().st_size for p in card_cache.get_paths("test", input_cards[0])
+    )
+    evictor.policy = EvictionPolicy(max_total_bytes=2 * entry_bytes)
+    _run_full_pass(evictor)
+
+    assert evictor.total_bytes <= 2 * entry_bytes
+    assert _count(card_cache, "test", input_cards) == [3, 3, 0]
+
+
+def test_cache_evictor_max_total_bytes_many_entries(tmp_path, cards):
+    """Test that the total size is kept track of while evicting many entries."""
+    card_cache = AppendLogCardCache(directory=tmp_path)
+    input_cards = _fill_cache_with_ages(card_cache, "test", range(20, 0, -1), cards)
+    entry_bytes = sum(
+        p.stat().st_size for p in card_cache.get_paths("test", input_cards[0])
+    )
+    evictor = CacheEvictor(tmp_path, EvictionPolicy(max_total_bytes=5 * entry_bytes))
+
+    _run_full_pass(evictor)
+
+    assert evictor.n_entries == 5
+    assert evictor.total_bytes == 5 * entry_bytes
+    assert _count(card_cache, "test", input_cards) == [0] * 15 + [3] * 5
+
+
+def test_cache_evictor_ttl_per_name(tmp_path, cards):
+    """Test that the entries that were not used within the TTL for their name are
+    evicted."""
+    card_cache = AppendLogCardCache(directory=tmp_path)
+    short_cards = _fill_cache_with_ages(card_cache, "short", [5, 50], cards)
+    long_cards = _fill_cache_with_ages(card_cache, "long", [5, 50], cards)
+    policy = EvictionPolicy(ttl={"short": 10.0}, default_ttl=100.0)
+    evictor = CacheEvictor(tmp_path, policy)
+
+    _run_full_pass(evictor)
+
+    assert _count(card_cache, "short", short_cards) == [3, 0]
+    assert _count(card_cache, "long", long_cards) == [3, 3]
+
+
+def test_eviction_policy_from_config():
+    policy = EvictionPolicy.from_config(
+        {"maxSizeMB": 1, "maxEntries": 10, "ttlDays": {"*": 2, "test": 1}}
+    )
+
+    assert policy == EvictionPolicy(
+        max_total_bytes=2**20,
+        max_entries=10,
+        ttl={"test": 24 * 60 * 60},
+        default_ttl=2 * 24 * 60 * 60,
+    )
+    assert not EvictionPolicy.from_config({}).is_bounded
+
+
+def test_response_cache_get_and_set(tmp_path):
+    response_cache = ResponseCache(path=tmp_path / "responses.sqlite3")
+    key = response_cache.get_key("OpenAI:gpt-4", None, "What is the meaning of life?")
+
+    assert response_cache.get(key) is None
+    response_cache.set(key, "42")
+    assert response_cache.get(key) == "42"
+    assert asyncio.run(response_cache.aget(key)) == "42"
+    assert len(response_cache) == 1
+
+    response_cache.clear()
+    assert response_cache.get(key) is None
+    response_cache.close()
+
+
+def test_response_cache_key():
+    key = ResponseCache.get_key("Ollama:mistral", None, "Prompt")
+
+    assert key == ResponseCache.get_key("Ollama:mistral", None, "Prompt")
+    assert key != ResponseCache.get_key("Ollama:llama2", None, "Prompt")
+    assert key != ResponseCache.get_key("Ollama:mistral", "json", "Prompt")
+    assert key != ResponseCache.get_key("Ollama:mistral", None, "Other prompt")
+
+
+def test_response_cache_ttl(tmp_path):
+    response_cache = ResponseCache(path=tmp_path / "responses.sqlite3", ttl=0.01)
+    response_cache.set("key", "response")
+    time.sleep(0.02)
+
+    assert response_cache.get("key") is None
+    assert len(response_cache) == 0
+    response_cache.close()
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path):
+    response_cache = ResponseCache(path=tmp_path / "responses.sqlite3", max_entries=2)
+    for key in ("a", "b"):
+        response_cache.set(key, f"Response {key}")
+        time.sleep(0.001)
+    response_cache.get("a")
+    time.sleep(0.001)
+    response_cache.set("c", "Response c")
+
+    assert len(response_cache) == 2
+    assert response_cache.get("a") == "Response a"
+    assert response_cache.get("b") is None
+    response_cache.close()
+
+
+def test_response_cache_from_config():
+    assert ResponseCache.from_config(None) == ResponseCache()
+    assert ResponseCache.from_config(
+        {"enabled": True, "ttlDays": 1, "maxEntries": None}
+    ) == ResponseCache(ttl=24 * 60 * 60, max_entries=None)
@@ -1,12 +1,29 @@
 import asyncio
 import itertools
+import json
+import time
+from typing import List, Optional, Union
 
 import pytest
 
+from phrasify.caches.json_file import JSONFileCardCache
 from phrasify.card import TranslationCard
-from phrasify.card_gen import JSONCachedCardGenerator
+from phrasify.card_gen import (
+    CachedCardGenerator,
+    CardGeneratorConfig,
+    JSONCachedCardGenerator,
+    RemoteCardGenerator,
+    TranslationCardStreamParser,
+)
 from phrasify.error import CardGenerationError, ChainError
 from phrasify.event_loop import run_coroutine_in_thread
+from phrasify.normalize import CardNormalizer
+from tests.mocks import (
+    CountingBatchCardGenerator,
+    CountingCardGenerator,
+    MockAPIServer,
+    get_closed_url,
+)
 
 
 def test_llm_translation_card_generator(
@@ -112,3 +129,524 @@ def test_json_cached_card_generator_gets_fewer_cards_first(
         for i in range(5)
     ]
     assert actual_cards == expected_cards
+
+
+def test_cached_card_generator_normalizes_cache_key(tmp_path):
+    """Test that input cards that only differ in markup share their cached cards,
+    while the card generator still gets the original input card."""
+    card_generator = CountingCardGenerator(n_cards=3)
+    generator = CachedCardGenerator(
+        card_generator,
+        min_cards=1,
+        name="test",
+        cache=JSONFileCardCache(directory=tmp_path),
+        normalizer=CardNormalizer(),
+    )
+    card = TranslationCard(source="<b>friend</b>", target="друг")
+    variant = TranslationCard(source="friend&nbsp;", target=" друг")
+
+    async def take_cards():
+        first_card = await generator.acall(card).__anext__()
+        # Let the background task fill up the cache
+        await asyncio.sleep(0.1)
+        variant_card = await generator.acall(variant).__anext__()
+        return first_card, variant_card
+
+    first_card, variant_card = asyncio.run(take_cards())
+
+    assert str(card) in first_card.source
+    assert str(card) in variant_card.source
+    assert card_generator.n_times_called == 2
+    assert generator.n_llm_calls_saved == 1
+    assert generator.get_cache_key(card) == generator.get_cache_key(variant)
+
+
+def _split_into_chunks(text: str, chunk_size: int) -> List[str]:
+    return [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7])
+def test_translation_card_stream_parser(
+    llm_response, llm_expected_cards, chunk_size: int
+):
+    """Test that the stream parser gets the same cards from the chunks of a response
+    as parsing the whole response at once."""
+    parser = TranslationCardStreamParser()
+    cards = []
+    for chunk in _split_into_chunks(llm_response, chunk_size):
+        cards.extend(parser.feed(chunk))
+
+    assert cards == llm_expected_cards
+    assert parser.n_cards == len(llm_expected_cards)
+
+
+def test_translation_card_stream_parser_emits_closed_cards():
+    """Test that the stream parser emits each card as soon as it closes, and isn't
+    confused by braces and escaped quotes in the strings."""
+    parser = TranslationCardStreamParser()
+
+    assert parser.feed('Sure! {"cards": [{"source": "Use {braces}", ') == []
+    assert parser.feed('"target": "Use \\"quotes\\" }"}, {"source": "Se') == [
+        TranslationCard(source="Use {braces}", target='Use "quotes" }')
+    ]
+    assert parser.feed('cond", "target": "Друга"}]}') == [
+        TranslationCard(source="Second", target="Друга")
+    ]
+
+
+class StreamingChain:
+    """Chain that streams a response in chunks, waiting for `next_chunk` to be set
+    before each chunk after the first."""
+
+    def __init__(self, response: str, chunk_size: int = 10):
+        self.chunks = _split_into_chunks(response, chunk_size)
+        self._next_chunk: Optional[asyncio.Event] = None
+
+    @property
+    def next_chunk(self) -> asyncio.Event:
+        # Created in the running event loop, which Python < 3.10 needs
+        if self._next_chunk is None:
+            self._next_chunk = asyncio.Event()
+        return self._next_chunk
+
+    async def astream(self, chain_inputs):  # noqa: ARG002
+        for i, chunk in enumerate(self.chunks):
+            if i > 0:
+                await self.next_chunk.wait()
+                self.next_chunk.clear()
+            yield chunk
+
+
+def test_llm_translation_card_generator_astream_yields_first_card_early(
+    llm_translation_card_generator,
+):
+    cards = [
+        TranslationCard(source=f"Source {i}", target=f"Target {i}") for i in range(3)
+    ]
+    response = json.dumps([card.to_dict() for card in cards])
+    chain = StreamingChain(response, chunk_size=len(response) // 3)
+    llm_translation_card_generator.chain = chain
+
+    async def stream_cards():
+        stream = llm_translation_card_generator.astream(TranslationCard())
+        n_chunks_for_first_card = 0
+        first_card_task = asyncio.create_task(stream.__anext__())
+        while not first_card_task.done():
+            n_chunks_for_first_card += 1
+            chain.next_chunk.set()
+            await asyncio.sleep(0.01)
+
+        other_cards = []
+        while True:
+            chain.next_chunk.set()
+            try:
+                other_cards.append(await stream.__anext__())
+            except StopAsyncIteration:
+                break
+
+        return first_card_task.result(), other_cards, n_chunks_for_first_card
+
+    first_card, other_cards, n_chunks_for_first_card = asyncio.run(stream_cards())
+
+    assert [first_card, *other_cards] == cards
+    assert n_chunks_for_first_card < len(chain.chunks)
+
+
+def test_llm_translation_card_generator_astream_invalid_response(
+    llm_translation_card_generator,
+):
+    llm_translation_card_generator.chain = StreamingChain(
+        '[{"front": "friend", "back": "друг"}]', chunk_size=1000
+    )
+
+    async def stream_cards():
+        return [card async for card in llm_translation_card_generator.astream(None)]
+
+    with pytest.raises(CardGenerationError, match="Error parsing response from chain"):
+        asyncio.run(stream_cards())
+
+
+class BlockingStreamingCardGenerator:
+    """Card generator that streams its first card right away, then waits for
+    `unblock` to be set before streaming the rest."""
+
+    def __init__(self, n_cards: int = 3):
+        self.n_cards = n_cards
+        self._unblock: Optional[asyncio.Event] = None
+
+    @property
+    def unblock(self) -> asyncio.Event:
+        # Created in the running event loop, which Python < 3.10 needs
+        if self._unblock is None:
+            self._unblock = asyncio.Event()
+        return self._unblock
+
+    async def acall(self, card, n_cards=None):
+        return [new_card async for new_card in self.astream(card, n_cards=n_cards)]
+
+    async def astream(self, card, n_cards=None):
+        if n_cards is None:
+            n_cards = self.n_cards
+
+        for i in range(n_cards):
+            if i > 0:
+                await self.unblock.wait()
+            yield TranslationCard(source=f"{card.source} {i}", target=card.target)
+
+
+def test_cached_card_generator_streams_first_card(tmp_path, translation_card):
+    """Test that a streaming CachedCardGenerator serves the first card while the
+    others are still being generated."""
+    card_generator = BlockingStreamingCardGenerator(n_cards=3)
+    generator = CachedCardGenerator(
+        card_generator,
+        min_cards=1,
+        name="test",
+        cache=JSONFileCardCache(directory=tmp_path),
+        stream=True,
+    )
+
+    async def take_cards():
+        card_iterator = generator.acall(translation_card)
+        first_card = await asyncio.wait_for(card_iterator.__anext__(), timeout=1.0)
+        card_generator.unblock.set()
+        other_cards = [await card_iterator.__anext__() for _ in range(2)]
+        return first_card, other_cards
+
+    first_card, other_cards = asyncio.run(take_cards())
+
+    assert [first_card, *other_cards] == [
+        TranslationCard(
+            source=f"{translation_card.source} {i}", target=translation_card.target
+        )
+        for i in range(3)
+    ]
+
+
+class RecordingChain:
+    """Chain that returns the given responses in turn, or raises them if they are
+    errors, recording its inputs."""
+
+    def __init__(self, responses: List[Union[str, Exception]]):
+        self.responses = responses
+        self.inputs = []
+
+    async def acall(self, chain_inputs):
+        self.inputs.append(chain_inputs)
+        response = self.responses[len(self.inputs) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def _cards_json(prefix: str, n_cards: int = 2) -> str:
+    return json.dumps(
+        [{"source": f"{prefix} {i}", "target": f"{prefix} {i}"} for i in range(n_cards)]
+    )
+
+
+def _cards(prefix: str, n_cards: int = 2) -> List[TranslationCard]:
+    return [
+        TranslationCard(source=f"{prefix} {i}", target=f"{prefix} {i}")
+        for i in range(n_cards)
+    ]
+
+
+def test_llm_translation_card_generator_abatch_retries_failed_cards(
+    llm_translation_card_generator,
+):
+    """Test that abatch packs the input cards into a single call, retries only the
+    cards that failed in a smaller batch and generates the last ones one by one."""
+    cards = [TranslationCard(source=f"word {i}", target=f"слово {i}") for i in range(5)]
+    batch_chain = RecordingChain(
+        [
+            # Cards 2, 4 and 5 are missing or invalid
+            (
+                f'```json\n{{"1": {_cards_json("a")}, "2": "oops", '
+                f'"3": {_cards_json("c")}}}\n```'
+            ),
+            # In the retry, cards 2, 4 and 5 are keys 1, 2 and 3
+            f'{{"1": {_cards_json("b")}, "2": {_cards_json("d")}}}',
+        ]
+    )
+    chain = RecordingChain([_cards_json("e")])
+    llm_translation_card_generator.batch_chain = batch_chain
+    llm_translation_card_generator.chain = chain
+
+    results = asyncio.run(llm_translation_card_generator.abatch(cards, n_cards=2))
+
+    assert results == [_cards(prefix) for prefix in "abcde"]
+    assert [json.loads(inputs["cards"]) for inputs in batch_chain.inputs] == [
+        {
+            str(i + 1): {"target": card.target, "source": card.source}
+            for i, card in enumerate(cards)
+        },
+        {
+            str(i + 1): {"target": card.target, "source": card.source}
+            for i, card in enumerate([cards[1], cards[3], cards[4]])
+        },
+    ]
+    assert [inputs["card"] for inputs in chain.inputs] == [cards[4]]
+
+
+def test_llm_translation_card_generator_abatch_batch_chain_error(
+    llm_translation_card_generator,
+):
+    """Test that abatch generates the cards one by one if the batch chain fails."""
+    cards = [TranslationCard(source=f"word {i}", target=f"слово {i}") for i in range(2)]
+    batch_chain = RecordingChain([ChainError("Mock error")])
+    llm_translation_card_generator.batch_chain = batch_chain
+    llm_translation_card_generator.chain = RecordingChain(
+        [_cards_json("a"), _cards_json("b")]
+    )
+
+    results = asyncio.run(llm_translation_card_generator.abatch(cards, n_cards=2))
+
+    assert results == [_cards("a"), _cards("b")]
+    assert len(batch_chain.inputs) == 1
+
+
+def test_llm_translation_card_generator_abatch_without_batch_chain(
+    llm_translation_card_generator,
+):
+    """Test that abatch generates the cards one by one without a batch chain, and
+    returns no cards for the input cards that fail."""
+    cards = [TranslationCard(source=f"word {i}", target=f"слово {i}") for i in range(2)]
+    llm_translation_card_generator.chain = RecordingChain(
+        [_cards_json("a"), "Not JSON"]
+    )
+
+    results = asyncio.run(llm_translation_card_generator.abatch(cards, n_cards=2))
+
+    assert results == [_cards("a"), []]
+
+
+def test_cached_card_generator_fill_cache_batch(tmp_path):
+    card_generator = CountingBatchCardGenerator(n_cards=3)
+    generator = CachedCardGenerator(
+        card_generator,
+        min_cards=3,
+        name="test",
+        cache=JSONFileCardCache(directory=tmp_path),
+    )
+    cards = [TranslationCard(source=f"Source {i}", target="Target") for i in range(3)]
+
+    assert asyncio.run(generator.fill_cache(cards[0])) == 3
+    # The first card already has enough cards, the others are filled at once
+    assert asyncio.run(generator.fill_cache_batch([*cards, cards[1]])) == 6
+    assert card_generator.batches == [cards[1:]]
+    assert asyncio.run(generator.fill_cache_batch(cards)) == 0
+    assert len(asyncio.run(generator.get_from_cache(cards[2]))) == 3
+
+
+def test_remote_card_generator_batch():
+    """Test that the batch of a remote card generator sends the input cards with
+    their configs in a single request, and returns no cards for the ones that
+    failed."""
+    cards = [TranslationCard(f"source {i}", f"target {i}") for i in range(3)]
+    configs = [None, CardGeneratorConfig(n_cards=2), None]
+    results = [
+        {"cards": [{"source": "a", "target": "b"}], "error": None},
+        {"cards": [{"source": "c", "target": "d"}] * 2, "error": None},
+        {"cards": [], "error": "Mock error"},
+    ]
+    server = MockAPIServer({"/v1/cards/batch": results})
+    with server.serve_sync():
+        card_generator = RemoteCardGenerator(f"{server.url}/v1/cards")
+        actual = card_generator.batch(cards, configs=configs)
+
+    assert actual == [
+        [TranslationCard("a", "b")],
+        [TranslationCard("c", "d")] * 2,
+        [],
+    ]
+    (request,) = server.requests
+    assert request["card_generator"]["n_cards"] == card_generator.n_cards
+    items = request["items"]
+    assert [item["card"]["source"] for item in items] == [c.source for c in cards]
+    assert "card_generator" not in items[0]
+    assert items[1]["card_generator"]["n_cards"] == 2
+
+
+def test_remote_card_generator_batch_splits_large_batches(mocker):
+    """Test that a remote card generator sends large batches in several requests."""
+    mocker.patch("phrasify.card_gen.MAX_REMOTE_BATCH_SIZE", 2)
+    cards = [TranslationCard(f"source {i}") for i in range(3)]
+    result = {"cards": [{"source": "a", "target": "b"}], "error": None}
+    server = MockAPIServer({"/batch": [result, result]})
+    with server.serve_sync():
+        card_generator = RemoteCardGenerator(server.url)
+        with pytest.raises(CardGenerationError, match="Expected results for 1"):
+            card_generator.batch(cards)
+
+    assert [len(request["items"]) for request in server.requests] == [2, 1]
+
+
+def test_remote_card_generator_abatch(mocker):
+    """Test that the async batch of a remote card generator sends a request per
+    chunk of input cards, with the number of cards to generate."""
+    mocker.patch("phrasify.card_gen.MAX_REMOTE_BATCH_SIZE", 2)
+    cards = [TranslationCard(f"source {i}") for i in range(4)]
+    results = [
+        {"cards": [{"source": "a", "target": "b"}], "error": None},
+        {"cards": [], "error": "Mock error"},
+    ]
+    server = MockAPIServer({"/batch": results})
+
+    async def call():
+        async with server.serve():
+            card_generator = RemoteCardGenerator(server.url)
+            try:
+                return await card_generator.abatch(cards, n_cards=2)
+            finally:
+                await card_generator.sessions.close()
+
+    assert asyncio.run(call()) == [[TranslationCard("a", "b")], []] * 2
+    assert [len(request["items"]) for request in server.requests] == [2, 2]
+    assert all(r["card_generator"]["n_cards"] == 2 for r in server.requests)
+
+
+def test_remote_card_generator_abatch_chunk_fails(mocker):
+    """Test that the async batch of a remote card generator keeps the cards of the
+    chunks whose requests succeed if another one fails."""
+    mocker.patch("phrasify.card_gen.MAX_REMOTE_BATCH_SIZE", 2)
+    cards = [TranslationCard(f"source {i}") for i in range(4)]
+    result = {"cards": [{"source": "a", "target": "b"}], "error": None}
+    server = MockAPIServer({"/batch": [result, result]}, failures=[(500, {})])
+
+    async def call():
+        async with server.serve():
+            card_generator = RemoteCardGenerator(server.url)
+            try:
+                return await card_generator.abatch(cards)
+            finally:
+                await card_generator.sessions.close()
+
+    results = asyncio.run(call())
+
+    assert sorted(len(cards) for cards in results) == [0, 0, 1, 1]
+    assert results[0] == results[1]
+    assert results[2] == results[3]
+
+
+def test_remote_card_generator_batch_timeout(mocker):
+    """Test that the batch of a remote card generator raises a card generation error
+    if the server doesn't respond in time."""
+    mocker.patch("phrasify.card_gen.REMOTE_BATCH_TIMEOUT", 0.05)
+    result = {"cards": [], "error": None}
+    server = MockAPIServer({"/batch": [result]}, delay=0.3)
+    with server.serve_sync():
+        card_generator = RemoteCardGenerator(server.url)
+        with pytest.raises(CardGenerationError, match="didn't respond"):
+            card_generator.batch([TranslationCard("source")])
+
+
+def test_remote_card_generator_stream():
+    """Test that a remote card generator yields the streamed cards one by one and
+    raises the error that the server sends after them."""
+    lines = [
+        json.dumps({"source": "a", "target": "b"}),
+        "",
+        json.dumps({"source": "c", "target": "d"}),
+        json.dumps({"error": "Mock error"}),
+    ]
+    server = MockAPIServer({"/stream": lines})
+    with server.serve_sync():
+        card_generator = RemoteCardGenerator(server.url)
+        stream = card_generator.stream(TranslationCard("source"))
+        assert next(stream) == TranslationCard("a", "b")
+        assert next(stream) == TranslationCard("c", "d")
+        with pytest.raises(CardGenerationError, match="Mock error"):
+            next(stream)
+
+    (request,) = server.requests
+    assert request["card"] == {"source": "source", "target": ""}
+
+
+def test_remote_card_generator_acall():
+    """Test that a remote card generator sends the number of cards to generate and
+    the number of seconds it waits for them, and raises errors of the server."""
+    cards_json = [{"source": "a", "target": "b"}]
+    server = MockAPIServer({"/": cards_json}, failures=[(500, {})])
+
+    async def call():
+        async with server.serve():
+            card_generator = RemoteCardGenerator(f"{server.url}/", timeout=10.0)
+            with pytest.raises(CardGenerationError, match="500"):
+                await card_generator.acall(TranslationCard("source"))
+            cards = await card_generator.acall(TranslationCard("source"), n_cards=1)
+            await card_generator.sessions.close()
+            return cards
+
+    assert asyncio.run(call()) == [TranslationCard("a", "b")]
+    assert server.requests[-1]["card_generator"]["n_cards"] == 1
+    assert 0 < float(server.headers[-1]["X-Phrasify-Timeout"]) <= 10.0
+
+
+def test_remote_card_generator_acall_deadline():
+    """Test that a remote card generator gives up at its deadline, and doesn't send
+    a request once it has passed."""
+    server = MockAPIServer({"/": []}, delay=0.3)
+
+    async def call(seconds_left: float):
+        async with server.serve():
+            card_generator = RemoteCardGenerator(f"{server.url}/")
+            try:
+                deadline = time.monotonic() + seconds_left
+                await card_generator.acall(TranslationCard("source"), deadline=deadline)
+            finally:
+                await card_generator.sessions.close()
+
+    with pytest.raises(CardGenerationError, match="didn't respond"):
+        asyncio.run(call(0.05))
+    with pytest.raises(CardGenerationError, match="Deadline passed"):
+        asyncio.run(call(-1.0))
+
+    assert len(server.requests) == 1
+
+
+def test_remote_card_generator_connection_refused():
+    """Test that a remote card generator raises a card generation error if it can't
+    connect to the server."""
+    card_generator = RemoteCardGenerator(get_closed_url())
+
+    async def call():
+        try:
+            await card_generator.acall(TranslationCard("source"))
+        finally:
+            await card_generator.sessions.close()
+
+    async def stream():
+        try:
+            return [card async for card in card_generator.astream(TranslationCard())]
+        finally:
+            await card_generator.sessions.close()
+
+    with pytest.raises(CardGenerationError, match="Error connecting"):
+        asyncio.run(call())
+    with pytest.raises(CardGenerationError, match="Error connecting"):
+        asyncio.run(stream())
+    with pytest.raises(CardGenerationError, match="Error connecting"):
+        card_generator(TranslationCard("source"))
+
+
+def test_remote_card_generator_astream():
+    """Test that a remote card generator streams the cards asynchronously."""
+    lines = [json.dumps({"source": "a", "target": "b"}), json.dumps({"error": "Oops"})]
+    server = MockAPIServer({"/stream": lines})
+
+    cards = []
+
+    async def collect():
+        async with server.serve():
+            card_generator = RemoteCardGenerator(server.url)
+            try:
+                async for card in card_generator.astream(TranslationCard("source")):
+                    cards.append(card)
+            finally:
+                await card_generator.sessions.close()
+
+    with pytest.raises(CardGenerationError, match="Oops"):
+        asyncio.run(collect())
+
+    assert cards == [TranslationCard("a", "b")]
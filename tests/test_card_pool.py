@@ -0,0 +1,180 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from phrasify.caches.redis import RedisCardCache
+from phrasify.caches.sqlite import SQLiteCardCache
+from phrasify.card import TranslationCard
+from phrasify.card_gen import CardGeneratorConfig
+from phrasify.card_pool import CardPool
+from phrasify.factory import get_shared_card_cache
+from tests.mocks import CountingCardGenerator
+
+
+class FakeRedisPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def delete(self, *keys):
+        self.commands.append(("delete", keys))
+
+    def rpush(self, key, *values):
+        self.commands.append(("rpush", (key, *values)))
+
+    async def execute(self):
+        for command, args in self.commands:
+            await getattr(self.client, command)(*args)
+
+
+class FakeRedis:
+    """In-memory stand-in for the `redis.asyncio` client, with the commands that
+    RedisCardCache uses."""
+
+    def __init__(self):
+        self.lists = defaultdict(list)
+        self.values = {}
+
+    async def lrange(self, key, start, end):
+        assert (start, end) == (0, -1)
+        return [value.encode() for value in self.lists[key]]
+
+    async def rpush(self, key, *values):
+        self.lists[key].extend(values)
+        return len(self.lists[key])
+
+    async def lpop(self, key):
+        if not self.lists[key]:
+            return None
+        return self.lists[key].pop(0).encode()
+
+    async def llen(self, key):
+        return len(self.lists[key])
+
+    async def set(self, key, value, *, nx=False, px=None):  # noqa: ARG002
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.lists.pop(key, None)
+            self.values.pop(key, None)
+
+    def pipeline(self, *, transaction=True):  # noqa: ARG002
+        return FakeRedisPipeline(self)
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def shared_card_cache(request, tmp_path):
+    if request.param == "sqlite":
+        card_cache = SQLiteCardCache(path=tmp_path / "pool.sqlite3")
+        yield card_cache
+        card_cache.close()
+    else:
+        yield RedisCardCache(client=FakeRedis())
+
+
+@pytest.fixture()
+def config():
+    return CardGeneratorConfig(n_cards=2)
+
+
+def test_shared_card_cache_popleft_and_count(shared_card_cache, translation_card):
+    cards = [TranslationCard(source=f"Source {i}", target="Target") for i in range(3)]
+
+    async def fill_and_take():
+        await shared_card_cache.write("test", translation_card, cards)
+        await shared_card_cache.extend("test", translation_card, cards[:1])
+        first_card = await shared_card_cache.popleft("test", translation_card)
+        return first_card, await shared_card_cache.count("test", translation_card)
+
+    assert asyncio.run(fill_and_take()) == (cards[0], 3)
+    assert list(asyncio.run(shared_card_cache.get("test", translation_card))) == [
+        *cards[1:],
+        cards[0],
+    ]
+
+
+def test_shared_card_cache_claim_refill(shared_card_cache, translation_card):
+    async def claim_twice():
+        first = await shared_card_cache.claim_refill("test", translation_card)
+        second = await shared_card_cache.claim_refill("test", translation_card)
+        await shared_card_cache.release_refill("test", translation_card)
+        third = await shared_card_cache.claim_refill("test", translation_card)
+        return first, second, third
+
+    assert asyncio.run(claim_twice()) == (True, False, True)
+
+
+def test_card_pool_serves_distinct_cards(shared_card_cache, config, translation_card):
+    """Test that pools sharing a cache, like replicas of the API, never hand out the
+    same card and refill the shared pool in the background."""
+    card_generator = CountingCardGenerator()
+    pools = [
+        CardPool(
+            shared_card_cache,
+            reserve=2,
+            create_card_generator=lambda config: card_generator,  # noqa: ARG005
+        )
+        for _ in range(2)
+    ]
+
+    async def take_cards():
+        taken = []
+        for i in range(5):
+            pool = pools[i % 2]
+            taken.extend(await pool.take(config, translation_card))
+            await pool.wait_for_refills()
+        return taken
+
+    taken = asyncio.run(take_cards())
+
+    assert len(taken) == 10
+    assert len(set(taken)) == 10
+    # The first request generates its cards directly, after which every request is
+    # served from the pool and followed by a refill.
+    assert card_generator.n_times_called == 6
+    assert (
+        asyncio.run(
+            shared_card_cache.count(config.to_path_friendly_str(), translation_card)
+        )
+        == 2 * config.n_cards
+    )
+
+
+def test_card_pool_refill_is_claimed_once(shared_card_cache, config, translation_card):
+    card_generator = CountingCardGenerator(sleep_interval=0.1)
+    pool = CardPool(
+        shared_card_cache,
+        create_card_generator=lambda config: card_generator,  # noqa: ARG005
+    )
+
+    async def refill_concurrently():
+        return await asyncio.gather(
+            *(pool.refill(config, translation_card) for _ in range(3))
+        )
+
+    assert sorted(asyncio.run(refill_concurrently())) == [0, 0, 4]
+    assert card_generator.n_times_called == 1
+
+
+def test_get_shared_card_cache(tmp_path):
+    assert get_shared_card_cache() is None
+
+    card_cache = get_shared_card_cache(f"sqlite:///{tmp_path}/cards.sqlite3")
+    assert card_cache == SQLiteCardCache(path=tmp_path / "cards.sqlite3")
+
+    card_cache = get_shared_card_cache("redis://redis:6379/0")
+    assert card_cache == RedisCardCache(url="redis://redis:6379/0")
+
+    with pytest.raises(ValueError, match="Invalid card store URL"):
+        get_shared_card_cache("ftp://example.com")
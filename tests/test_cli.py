@@ -0,0 +1,164 @@
+import io
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+from phrasify.card import TranslationCard
+from phrasify.card_gen import CardGeneratorConfig
+from phrasify.hooks.phrasify_filter import LanguageFieldNames
+from phrasify_cli.generate import (
+    GenerationItem,
+    GenerationOptions,
+    generate,
+    read_apkg,
+    read_delimited,
+    read_progress,
+)
+from tests.mocks import CountingBatchCardGenerator, CountingCardGenerator
+
+FILTER_NAME = (
+    "phrasify vocab-to-sentence source_lang=English target_lang=Ukrainian "
+    "source_field=Front target_field=Back"
+)
+
+
+@pytest.fixture()
+def config():
+    return CardGeneratorConfig(source_language="English", target_language="Ukrainian")
+
+
+def test_read_delimited_tsv(tmp_path, config):
+    path = tmp_path / "notes.txt"
+    path.write_text(
+        "#separator:tab\n#html:true\nfriend\tдруг\nto give\tдавати\nincomplete\n",  # noqa: RUF001
+        encoding="utf-8",
+    )
+
+    items = read_delimited(path, config)
+
+    assert items == [
+        GenerationItem(config, TranslationCard(source="friend", target="друг")),
+        GenerationItem(config, TranslationCard(source="to give", target="давати")),
+    ]
+
+
+def test_read_delimited_csv_columns(tmp_path, config):
+    path = tmp_path / "notes.csv"
+    path.write_text('1,"love, care",любов\n', encoding="utf-8")
+
+    items = read_delimited(path, config, source_column=1, target_column=2)
+
+    assert items == [
+        GenerationItem(config, TranslationCard(source="love, care", target="любов"))
+    ]
+
+
+def _write_apkg(path, models, notes):
+    collection_path = path.parent / "collection.anki2"
+    connection = sqlite3.connect(collection_path)
+    connection.execute("create table col (models text)")
+    connection.execute("create table notes (id integer, mid integer, flds text)")
+    connection.execute("insert into col values (?)", (json.dumps(models),))
+    connection.executemany(
+        "insert into notes values (?, ?, ?)",
+        [(i, mid, "\x1f".join(fields)) for i, (mid, fields) in enumerate(notes)],
+    )
+    connection.commit()
+    connection.close()
+
+    with zipfile.ZipFile(path, "w") as apkg:
+        apkg.write(collection_path, "collection.anki2")
+
+
+def test_read_apkg(tmp_path, config):
+    fields = [{"name": "Front", "ord": 0}, {"name": "Back", "ord": 1}]
+    models = {
+        "1": {
+            "flds": fields,
+            "tmpls": [{"qfmt": f"{{{{{FILTER_NAME}:Front}}}}", "afmt": "{{Back}}"}],
+        },
+        "2": {"flds": fields, "tmpls": [{"qfmt": "{{Front}}", "afmt": "{{Back}}"}]},
+    }
+    notes = [(1, ["friend", "друг"]), (2, ["love", "любов"])]
+    path = tmp_path / "deck.apkg"
+    _write_apkg(path, models, notes)
+
+    filter_config = CardGeneratorConfig(
+        prompt_name="vocab-to-sentence",
+        source_language="English",
+        target_language="Ukrainian",
+    )
+    friend = TranslationCard(source="friend", target="друг")
+    love = TranslationCard(source="love", target="любов")
+
+    assert read_apkg(path, config) == [GenerationItem(filter_config, friend)]
+    assert read_apkg(
+        path, config, LanguageFieldNames(source="Front", target="Back")
+    ) == [GenerationItem(filter_config, friend), GenerationItem(config, love)]
+
+
+def test_generate_resumes_from_progress(tmp_path, mocker, config):
+    card_generator = CountingCardGenerator(n_cards=3)
+    mocker.patch(
+        "phrasify_cli.generate.create_card_generator", return_value=card_generator
+    )
+    items = [
+        GenerationItem(
+            config, TranslationCard(source=f"cli source {i}", target=f"target {i}")
+        )
+        for i in range(5)
+    ]
+    progress_path = tmp_path / "progress.jsonl"
+    options = GenerationOptions(min_cards=3, cache_backend="json")
+
+    throughput = generate(
+        items[:3], progress_path, options, workers=0, chunk_size=2, out=io.StringIO()
+    )
+
+    assert throughput.n_cards == 9
+    assert throughput.n_requests == 3
+    assert read_progress(progress_path) == {item.key for item in items[:3]}
+
+    # Simulate an interrupted write of the progress file
+    with open(progress_path, "a", encoding="utf-8") as f:
+        f.write('{"key": "partial')
+
+    throughput = generate(
+        items, progress_path, options, workers=0, chunk_size=2, out=io.StringIO()
+    )
+
+    assert throughput.n_items == 2
+    assert throughput.n_requests == 2
+    assert card_generator.n_times_called == 5
+
+
+def test_generate_in_batches(tmp_path, mocker, config):
+    """Test that the items with the same config are generated in batches, without
+    evicting from the cache until all items are done."""
+    card_generator = CountingBatchCardGenerator(n_cards=3)
+    mocker.patch(
+        "phrasify_cli.generate.create_card_generator", return_value=card_generator
+    )
+    get_cache_evictor = mocker.patch("phrasify.factory.get_cache_evictor")
+    evict_card_cache = mocker.patch("phrasify_cli.generate.evict_card_cache")
+    other_config = CardGeneratorConfig(n_cards=2)
+    items = [
+        GenerationItem(
+            config if i < 3 else other_config,
+            TranslationCard(source=f"batch source {i}", target=f"target {i}"),
+        )
+        for i in range(5)
+    ]
+    options = GenerationOptions(min_cards=3, batch_size=2, cache_backend="log")
+
+    throughput = generate(
+        items, tmp_path / "progress.jsonl", options, workers=0, out=io.StringIO()
+    )
+
+    assert sorted(len(batch) for batch in card_generator.batches) == [1, 2, 2]
+    assert throughput.n_cards == 15
+    assert throughput.n_requests == 3
+    get_cache_evictor.assert_not_called()
+    evict_card_cache.assert_called_once_with("log")
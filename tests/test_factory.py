@@ -1,6 +1,15 @@
 import pytest
 
-from phrasify.factory import get_llm
+from phrasify.caches.responses import ResponseCache
+from phrasify.factory import (
+    get_batch_prompt,
+    get_llm,
+    get_ollama_pool,
+    get_response_cache_enabled,
+)
+from phrasify.llms.cached import CachedLLM
+from phrasify.llms.fallback import FallbackLLM
+from phrasify.llms.ollama_pool import OllamaPool
 
 
 @pytest.mark.parametrize("llm_name", ["gpt-3.5-turbo", "gpt-4"])
@@ -12,3 +21,62 @@ def test_get_llm_with_valid_name(llm_name):
 def test_get_llm_with_invalid_name():
     with pytest.raises(ValueError):
         get_llm("invalid-llm")
+
+
+def test_get_batch_prompt():
+    batch_prompt = get_batch_prompt("vocab-to-sentence")
+    prompt = batch_prompt.format(
+        n_cards=2,
+        source_language="English",
+        target_language="Ukrainian",
+        cards='{"1": {"target": "друг", "source": "friend"}}',
+    )
+
+    assert '{"1": {"target": "друг", "source": "friend"}}' in prompt
+    assert get_batch_prompt("vocab-to-sentence-csv") is None
+
+
+def test_get_response_cache_enabled(monkeypatch):
+    monkeypatch.delenv("PHRASIFY_RESPONSE_CACHE", raising=False)
+    assert get_response_cache_enabled() is False
+    assert get_response_cache_enabled(enabled=True) is True
+
+    monkeypatch.setenv("PHRASIFY_RESPONSE_CACHE", "true")
+    assert get_response_cache_enabled() is True
+    assert get_response_cache_enabled(enabled=False) is False
+
+
+def test_get_llm_with_response_cache(mocker, tmp_path):
+    response_cache = ResponseCache(path=tmp_path / "responses.sqlite3")
+    mocker.patch("phrasify.factory.get_response_cache", return_value=response_cache)
+
+    llm = get_llm("gpt-4")
+
+    assert isinstance(llm, CachedLLM)
+    assert llm.llm.model == "gpt-4"
+    assert llm.cache is response_cache
+
+
+def test_get_llm_with_fallback():
+    llm = get_llm("gpt-4, ollama-mistral")
+
+    assert isinstance(llm, FallbackLLM)
+    assert [llm.model for llm in llm.llms] == ["gpt-4", "mistral"]
+    # The circuit breakers are shared with the other fallback LLMs
+    assert get_llm("ollama-mistral,gpt-4").breakers == llm.breakers[::-1]
+
+
+def test_get_llm_with_ollama_pool(mocker):
+    urls = ["http://ollama-0:11434", "http://ollama-1:11434"]
+    mocker.patch("phrasify.factory.get_ollama_urls", return_value=urls)
+    start_health_checks = mocker.patch.object(OllamaPool, "start_health_checks")
+    get_ollama_pool.cache_clear()
+
+    try:
+        llm = get_llm("ollama-mistral")
+        assert isinstance(llm, OllamaPool)
+        assert (llm.urls, llm.model) == (urls, "mistral")
+        assert get_llm("ollama-mistral") is llm
+        start_health_checks.assert_called_once()
+    finally:
+        get_ollama_pool.cache_clear()
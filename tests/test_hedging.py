@@ -0,0 +1,209 @@
+import asyncio
+import time
+
+import pytest
+
+from phrasify.caches.json_file import JSONFileCardCache
+from phrasify.card import TranslationCard
+from phrasify.card_gen import CachedCardGenerator
+from phrasify.error import CardGenerationError
+from phrasify.hedging import HedgedCardGenerator, HedgingPolicy, LatencyTracker
+
+from .mocks import CountingCardGenerator, ErrorCardGenerator, StreamingCardGenerator
+
+
+@pytest.fixture
+def card():
+    return TranslationCard(source="friend", target="друг")
+
+
+def test_hedging_policy_from_config():
+    assert HedgingPolicy.from_config(None) is None
+    assert HedgingPolicy.from_config({}) == HedgingPolicy()
+    assert HedgingPolicy.from_config(
+        {"percentile": 90, "initialDelay": 1.0, "llm": "ollama-mistral"}
+    ) == HedgingPolicy(percentile=90, initial_delay=1.0, llm="ollama-mistral")
+
+
+def test_latency_tracker_percentile():
+    latencies = LatencyTracker(window=10)
+    assert latencies.percentile(95) is None
+
+    for seconds in range(1, 21):
+        latencies.add(seconds)
+
+    # Only the last 10 latencies are kept
+    assert len(latencies) == 10
+    assert latencies.percentile(50) == 15
+    assert latencies.percentile(95) == 20
+    assert latencies.percentile(0) == 11
+
+
+def test_hedge_delay():
+    policy = HedgingPolicy(
+        percentile=50, initial_delay=2.0, min_delay=0.5, max_delay=5.0, min_samples=3
+    )
+    hedged = HedgedCardGenerator(CountingCardGenerator(), policy=policy)
+    assert hedged.hedge_delay == 2.0
+
+    for seconds in (1.0, 3.0, 4.0):
+        hedged._latencies.add(seconds)
+    assert hedged.hedge_delay == 3.0
+
+    for seconds in (0.1, 0.1, 0.1, 0.1):
+        hedged._latencies.add(seconds)
+    assert hedged.hedge_delay == 0.5
+
+
+def test_hedged_card_generator_fast_call_is_not_hedged(card):
+    card_generator = CountingCardGenerator()
+    hedge_card_generator = CountingCardGenerator()
+    hedged = HedgedCardGenerator(
+        card_generator, hedge_card_generator, HedgingPolicy(initial_delay=1.0)
+    )
+
+    cards = asyncio.run(hedged.acall(card))
+
+    assert len(cards) == 1
+    assert card_generator.n_times_called == 1
+    assert hedge_card_generator.n_times_called == 0
+    assert (hedged.n_calls, hedged.hedge_rate) == (1, 0.0)
+
+
+def test_hedged_card_generator_slow_call_is_hedged(card):
+    """Test that the hedge wins from a slow call, which is cancelled."""
+    card_generator = CountingCardGenerator(sleep_interval=5.0)
+    hedge_card_generator = CountingCardGenerator()
+    hedged = HedgedCardGenerator(
+        card_generator, hedge_card_generator, HedgingPolicy(initial_delay=0.05)
+    )
+
+    start = time.monotonic()
+    cards = asyncio.run(hedged.acall(card))
+
+    assert time.monotonic() - start < 1.0
+    assert len(cards) == 1
+    assert card_generator.n_times_called == 0
+    assert hedge_card_generator.n_times_called == 1
+    assert (hedged.hedge_rate, hedged.win_rate) == (1.0, 1.0)
+    # The latency of the slow call is at least the time until the hedge won
+    assert hedged._latencies.percentile(100) >= 0.05
+
+
+def test_hedged_card_generator_original_can_still_win(card):
+    card_generator = CountingCardGenerator(sleep_interval=0.1)
+    hedge_card_generator = CountingCardGenerator(sleep_interval=5.0)
+    hedged = HedgedCardGenerator(
+        card_generator, hedge_card_generator, HedgingPolicy(initial_delay=0.05)
+    )
+
+    cards = asyncio.run(hedged.acall(card))
+
+    assert len(cards) == 1
+    assert card_generator.n_times_called == 1
+    assert hedge_card_generator.n_times_called == 0
+    assert (hedged.hedge_rate, hedged.win_rate) == (1.0, 0.0)
+
+
+def test_hedged_card_generator_failed_call_is_hedged_right_away(card):
+    hedged = HedgedCardGenerator(
+        ErrorCardGenerator(CardGenerationError("Mock error")),
+        CountingCardGenerator(),
+        HedgingPolicy(initial_delay=5.0),
+    )
+
+    start = time.monotonic()
+    assert len(asyncio.run(hedged.acall(card))) == 1
+    assert time.monotonic() - start < 1.0
+    assert (hedged.hedge_rate, hedged.win_rate) == (1.0, 1.0)
+
+
+def test_hedged_card_generator_raises_if_all_calls_fail(card):
+    hedged = HedgedCardGenerator(ErrorCardGenerator(CardGenerationError("Mock error")))
+
+    with pytest.raises(CardGenerationError):
+        asyncio.run(hedged.acall(card))
+
+
+def test_cached_card_generator_uses_fast_card_generator(tmp_path, card):
+    card_generator = CountingCardGenerator(n_cards=3, sleep_interval=0.1)
+    fast_card_generator = CountingCardGenerator()
+    generator = CachedCardGenerator(
+        card_generator,
+        min_cards=1,
+        name="test",
+        cache=JSONFileCardCache(directory=tmp_path),
+        fast_card_generator=fast_card_generator,
+    )
+
+    async def take_first_card():
+        return await generator.acall(card).__anext__()
+
+    first_card = asyncio.run(take_first_card())
+
+    assert first_card.source.endswith("after 1 call(s) with 1 card(s) (card 0)")
+    assert fast_card_generator.n_times_called == 1
+
+
+async def _collect(stream):
+    return [new_card async for new_card in stream]
+
+
+def test_hedged_card_generator_astream_slow_first_card_is_hedged(card):
+    """Test that the hedge stream wins if the first card of the original stream is
+    slow, and that all cards come from the hedge stream."""
+    card_generator = StreamingCardGenerator(n_cards=3, first_card_delay=5.0)
+    hedge_card_generator = StreamingCardGenerator(n_cards=3)
+    hedged = HedgedCardGenerator(
+        card_generator, hedge_card_generator, HedgingPolicy(initial_delay=0.05)
+    )
+
+    start = time.monotonic()
+    cards = asyncio.run(_collect(hedged.astream(card)))
+
+    assert time.monotonic() - start < 1.0
+    assert len(cards) == 3
+    assert card_generator.n_times_called == 0
+    assert hedge_card_generator.n_times_called == 1
+    assert (hedged.hedge_rate, hedged.win_rate) == (1.0, 1.0)
+
+
+def test_hedged_card_generator_astream_fast_first_card_is_not_hedged(card):
+    card_generator = StreamingCardGenerator(n_cards=3)
+    hedge_card_generator = StreamingCardGenerator(n_cards=3)
+    hedged = HedgedCardGenerator(
+        card_generator, hedge_card_generator, HedgingPolicy(initial_delay=1.0)
+    )
+
+    cards = asyncio.run(_collect(hedged.astream(card)))
+
+    assert len(cards) == 3
+    assert hedge_card_generator.n_times_called == 0
+    assert hedged.hedge_rate == 0.0
+
+
+def test_cached_card_generator_hedges_first_streamed_card(tmp_path, card):
+    """Test that a streaming cached card generator streams the cards that the
+    reviewer waits for from the hedged card generator."""
+    card_generator = StreamingCardGenerator(n_cards=3, first_card_delay=5.0)
+    hedge_card_generator = StreamingCardGenerator(n_cards=3)
+    generator = CachedCardGenerator(
+        card_generator,
+        min_cards=1,
+        name="test",
+        cache=JSONFileCardCache(directory=tmp_path),
+        stream=True,
+        fast_card_generator=HedgedCardGenerator(
+            card_generator, hedge_card_generator, HedgingPolicy(initial_delay=0.05)
+        ),
+    )
+
+    async def take_first_card():
+        return await generator.acall(card).__anext__()
+
+    start = time.monotonic()
+    first_card = asyncio.run(take_first_card())
+
+    assert time.monotonic() - start < 1.0
+    assert first_card.source.endswith("after 1 call(s) with 3 card(s) (card 0)")
+    assert hedge_card_generator.n_times_called == 1
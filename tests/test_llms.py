@@ -1,12 +1,32 @@
+import asyncio
+import json
+import threading
+
 import pytest
 import requests
 
+from phrasify.caches.responses import ResponseCache
 from phrasify.error import LLMError
+from phrasify.llms.cached import CachedLLM
+from phrasify.llms.fallback import (
+    CircuitBreaker,
+    CircuitBreakerConfig,
+    CircuitState,
+    FallbackLLM,
+)
 from phrasify.llms.ollama import Ollama
-from phrasify.llms.openai import OpenAI
+from phrasify.llms.ollama_pool import OllamaPool
+from phrasify.llms.openai import ESTIMATED_RESPONSE_TOKENS, OpenAI
 from phrasify.openai import OPENAI_CHAT_COMPLETIONS_URL
+from phrasify.rate_limit import RateLimit, RateLimiter, estimate_tokens
+from phrasify.sessions import (
+    ClientSessionConfig,
+    ClientSessionPool,
+    ConnectionPoolStats,
+    RequestsSessionPool,
+)
 
-from .mocks import MockResponse
+from .mocks import CountingLLM, MockAPIServer, MockResponse, get_closed_url
 
 
 @pytest.fixture
@@ -48,7 +68,7 @@ def test_openai_call(openai_llm, mocker):
     response_json = {"choices": [{"message": {"content": "Hello, world!"}}]}
     mock_response = MockResponse(json=response_json, status_code=200)
 
-    mock_post = mocker.patch("requests.post", return_value=mock_response)
+    mock_post = mocker.patch("requests.Session.post", return_value=mock_response)
 
     prompt = "What is the meaning of life?"
     response = openai_llm(prompt)
@@ -61,7 +81,7 @@ def test_openai_error(openai_llm, mocker):
     """Test that a HTTPError is raised as an LLMError."""
     mock_response = MockResponse(json={}, status_code=500)
 
-    mock_post = mocker.patch("requests.post", return_value=mock_response)
+    mock_post = mocker.patch("requests.Session.post", return_value=mock_response)
 
     prompt = "What is the meaning of life?"
     with pytest.raises(LLMError):
@@ -72,7 +92,7 @@ def test_openai_error(openai_llm, mocker):
 
 def test_openai_timeout(openai_llm, mocker):
     """Test that a TimeoutError is raised as an LLMError."""
-    mock_post = mocker.patch("requests.post", side_effect=requests.ReadTimeout)
+    mock_post = mocker.patch("requests.Session.post", side_effect=requests.ReadTimeout)
 
     prompt = "What is the meaning of life?"
     with pytest.raises(LLMError):
@@ -85,7 +105,7 @@ def test_ollama_call(ollama_llm, mocker):
     response_json = {"response": "Hello, world!"}
     mock_response = MockResponse(json=response_json, status_code=200)
 
-    mock_post = mocker.patch("requests.post", return_value=mock_response)
+    mock_post = mocker.patch("requests.Session.post", return_value=mock_response)
 
     prompt = "What is the meaning of life?"
     response = ollama_llm(prompt)
@@ -97,7 +117,7 @@ def test_ollama_call(ollama_llm, mocker):
 def test_ollama_error(ollama_llm, mocker):
     mock_response = MockResponse(json={}, status_code=500)
 
-    mock_post = mocker.patch("requests.post", return_value=mock_response)
+    mock_post = mocker.patch("requests.Session.post", return_value=mock_response)
 
     prompt = "What is the meaning of life?"
     with pytest.raises(LLMError):
@@ -108,10 +128,693 @@ def test_ollama_error(ollama_llm, mocker):
 
 def test_ollama_timeout(ollama_llm, mocker):
     """Test that a TimeoutError is raised as an LLMError."""
-    mock_post = mocker.patch("requests.post", side_effect=requests.ReadTimeout)
+    mock_post = mocker.patch("requests.Session.post", side_effect=requests.ReadTimeout)
 
     prompt = "What is the meaning of life?"
     with pytest.raises(LLMError):
         ollama_llm(prompt)
 
     _assert_requests_post_called_ollama(mock_post, prompt)
+
+
+def test_openai_acall_reuses_connection():
+    """Test that the async calls on the same event loop share one connection."""
+    response_json = {"choices": [{"message": {"content": "Hello, world!"}}]}
+    server = MockAPIServer({"/v1/chat/completions": response_json})
+
+    async def call_three_times():
+        async with server.serve():
+            openai_llm = OpenAI(
+                model="test-model",
+                api_key="sk-xxx",
+                url=f"{server.url}/v1/chat/completions",
+            )
+            try:
+                return [await openai_llm.acall(f"Prompt {i}") for i in range(3)]
+            finally:
+                await openai_llm.sessions.close()
+
+    assert asyncio.run(call_three_times()) == ["Hello, world!"] * 3
+    assert server.requests == [
+        {
+            "model": "test-model",
+            "messages": [{"role": "user", "content": f"Prompt {i}"}],
+        }
+        for i in range(3)
+    ]
+    assert len(server.connections) == 1
+
+
+def test_openai_acall_error():
+    """Test that a HTTP error of an async call is raised as an LLMError."""
+    server = MockAPIServer({"/v1/chat/completions": {}}, status=500)
+
+    async def call():
+        async with server.serve():
+            openai_llm = OpenAI(
+                model="test-model",
+                api_key="sk-xxx",
+                url=f"{server.url}/v1/chat/completions",
+            )
+            try:
+                await openai_llm.acall("What is the meaning of life?")
+            finally:
+                await openai_llm.sessions.close()
+
+    with pytest.raises(LLMError):
+        asyncio.run(call())
+
+
+def test_client_session_pool_per_event_loop():
+    sessions = ClientSessionPool(ClientSessionConfig(limit_per_host=2))
+
+    async def get_twice():
+        session = sessions.get()
+        assert sessions.get() is session
+        assert session.connector.limit_per_host == 2
+        return session
+
+    first_session = asyncio.run(get_twice())
+    second_session = asyncio.run(get_twice())
+
+    # The session of the closed event loop was forgotten
+    assert second_session is not first_session
+    assert first_session.closed
+    assert len(sessions) == 1
+
+    async def get_and_close():
+        session = sessions.get()
+        await sessions.close()
+        return session
+
+    assert asyncio.run(get_and_close()).closed
+    assert len(sessions) == 0
+
+
+def test_client_session_config_from_config():
+    assert ClientSessionConfig.from_config(None) == ClientSessionConfig()
+    assert ClientSessionConfig.from_config(
+        {"limit": 0, "limitPerHost": 4, "dnsCacheTtl": None}
+    ) == ClientSessionConfig(limit=0, limit_per_host=4, dns_cache_ttl=None)
+
+
+def test_ollama_call_reuses_connection():
+    """Test that the sync calls share one connection, from any thread."""
+    server = MockAPIServer({"/api/generate": {"response": "Hello, world!"}})
+    requests_sessions = RequestsSessionPool()
+
+    with server.serve_sync():
+        ollama_llm = Ollama(
+            model="test-model", url=server.url, requests_sessions=requests_sessions
+        )
+        assert ollama_llm("First prompt") == "Hello, world!"
+        thread = threading.Thread(target=ollama_llm, args=("Second prompt",))
+        thread.start()
+        thread.join()
+        assert ollama_llm("Third prompt") == "Hello, world!"
+
+    assert len(server.requests) == 3
+    assert len(server.connections) == 1
+    assert requests_sessions.stats() == [
+        ConnectionPoolStats(host=server.url, n_connections=1, n_requests=3, n_idle=1)
+    ]
+    assert requests_sessions.stats()[0].n_reused == 2
+    requests_sessions.close()
+
+
+def test_requests_session_pool_per_host():
+    requests_sessions = RequestsSessionPool(ClientSessionConfig(limit_per_host=2))
+
+    session = requests_sessions.get("https://api.openai.com/v1/chat/completions")
+    assert requests_sessions.get("https://api.openai.com/v1/other") is session
+    assert requests_sessions.get("http://localhost:11434/api/generate") is not session
+    assert len(requests_sessions) == 2
+    assert session.get_adapter("https://api.openai.com")._pool_maxsize == 2
+
+    requests_sessions.close()
+    assert len(requests_sessions) == 0
+
+
+def _ollama_server(status=200, delay=0.0):
+    return MockAPIServer(
+        {"/api/generate": {"response": "Hello, world!"}}, status=status, delay=delay
+    )
+
+
+def _run_ollama_acall(server, prompts, **kwargs):
+    async def call():
+        async with server.serve():
+            ollama_llm = Ollama(model="test-model", url=server.url, **kwargs)
+            try:
+                return await asyncio.gather(
+                    *(ollama_llm.acall(prompt) for prompt in prompts)
+                )
+            finally:
+                await ollama_llm.sessions.close()
+
+    return asyncio.run(call())
+
+
+def test_ollama_acall_does_not_block_threads(mocker):
+    """Test that concurrent async calls don't go through the thread pool."""
+    mocker.patch(
+        "asyncio.BaseEventLoop.run_in_executor",
+        side_effect=AssertionError("The async call used a thread"),
+    )
+    server = _ollama_server(delay=0.05)
+    prompts = [f"Prompt {i}" for i in range(20)]
+
+    responses = _run_ollama_acall(server, prompts, format="json")
+
+    assert responses == ["Hello, world!"] * 20
+    assert sorted(server.requests, key=lambda data: data["prompt"]) == [
+        {"prompt": prompt, "model": "test-model", "stream": False, "format": "json"}
+        for prompt in sorted(prompts)
+    ]
+
+
+def test_ollama_acall_error():
+    with pytest.raises(LLMError):
+        _run_ollama_acall(_ollama_server(status=500), ["Prompt"])
+
+
+def test_ollama_acall_timeout(mocker):
+    mocker.patch("phrasify.llms.ollama.OLLAMA_TIMEOUT", 0.05)
+
+    with pytest.raises(LLMError):
+        _run_ollama_acall(_ollama_server(delay=0.5), ["Prompt"])
+
+
+def test_ollama_acall_cancel():
+    """Test that cancelling an async call aborts it, instead of raising an error."""
+    server = _ollama_server(delay=0.5)
+
+    async def cancel_call():
+        async with server.serve():
+            ollama_llm = Ollama(model="test-model", url=server.url)
+            call = asyncio.create_task(ollama_llm.acall("Prompt"))
+            await asyncio.sleep(0.1)
+            call.cancel()
+            try:
+                await call
+            finally:
+                await ollama_llm.sessions.close()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(cancel_call())
+    assert len(server.requests) == 1
+
+
+async def _collect_stream(llm, prompt):
+    try:
+        return [chunk async for chunk in llm.astream(prompt)]
+    finally:
+        await llm.sessions.close()
+
+
+def test_openai_astream():
+    chunks = ["Hello", ", ", "world!"]
+    events = [
+        f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n"
+        for chunk in chunks
+    ]
+    server = MockAPIServer(
+        {"/v1/chat/completions": [*events, "data: [DONE]"]},
+    )
+
+    async def stream():
+        async with server.serve():
+            openai_llm = OpenAI(
+                model="test-model",
+                api_key="sk-xxx",
+                url=f"{server.url}/v1/chat/completions",
+            )
+            return await _collect_stream(openai_llm, "What is the meaning of life?")
+
+    assert asyncio.run(stream()) == chunks
+    assert server.requests[0]["stream"] is True
+
+
+def test_ollama_astream():
+    chunks = ["Hello", ", ", "world!"]
+    lines = [json.dumps({"response": chunk, "done": False}) for chunk in chunks]
+    server = MockAPIServer(
+        {"/api/generate": [*lines, json.dumps({"response": "", "done": True})]}
+    )
+
+    async def stream():
+        async with server.serve():
+            ollama_llm = Ollama(model="test-model", url=server.url)
+            return await _collect_stream(ollama_llm, "What is the meaning of life?")
+
+    assert asyncio.run(stream()) == chunks
+    assert server.requests[0]["stream"] is True
+
+
+def test_ollama_astream_error():
+    server = MockAPIServer({"/api/generate": [json.dumps({"error": "Out of memory"})]})
+
+    async def stream():
+        async with server.serve():
+            ollama_llm = Ollama(model="test-model", url=server.url)
+            return await _collect_stream(ollama_llm, "What is the meaning of life?")
+
+    with pytest.raises(LLMError, match="Out of memory"):
+        asyncio.run(stream())
+
+
+def test_openai_call_retries_rate_limited():
+    """Test that a rate limited call is retried after the delay in its headers."""
+    response_json = {"choices": [{"message": {"content": "Hello, world!"}}]}
+    server = MockAPIServer(
+        {"/v1/chat/completions": response_json},
+        failures=[(429, {"retry-after-ms": "10"}), (503, {})],
+    )
+    openai_llm = OpenAI(
+        model="test-model",
+        api_key="sk-xxx",
+        rate_limiter=RateLimiter(RateLimit(initial_backoff=0.01)),
+    )
+
+    with server.serve_sync():
+        openai_llm.url = f"{server.url}/v1/chat/completions"
+        assert openai_llm("What is the meaning of life?") == "Hello, world!"
+
+    assert len(server.requests) == 3
+
+
+def test_openai_acall_retries_rate_limited():
+    response_json = {"choices": [{"message": {"content": "Hello, world!"}}]}
+    server = MockAPIServer(
+        {"/v1/chat/completions": response_json},
+        failures=[(429, {"retry-after-ms": "10"}), (500, {})],
+    )
+
+    async def call():
+        async with server.serve():
+            openai_llm = OpenAI(
+                model="test-model",
+                api_key="sk-xxx",
+                url=f"{server.url}/v1/chat/completions",
+                rate_limiter=RateLimiter(RateLimit(initial_backoff=0.01)),
+            )
+            try:
+                return await openai_llm.acall("What is the meaning of life?")
+            finally:
+                await openai_llm.sessions.close()
+
+    assert asyncio.run(call()) == "Hello, world!"
+    assert len(server.requests) == 3
+
+
+def test_openai_acall_gives_up_after_max_retries():
+    server = MockAPIServer(
+        {"/v1/chat/completions": {}},
+        failures=[(429, {"retry-after-ms": "10"})] * 3,
+    )
+
+    async def call():
+        async with server.serve():
+            openai_llm = OpenAI(
+                model="test-model",
+                api_key="sk-xxx",
+                url=f"{server.url}/v1/chat/completions",
+                rate_limiter=RateLimiter(RateLimit(max_retries=2)),
+            )
+            try:
+                await openai_llm.acall("What is the meaning of life?")
+            finally:
+                await openai_llm.sessions.close()
+
+    with pytest.raises(LLMError):
+        asyncio.run(call())
+    assert len(server.requests) == 3
+
+
+def test_openai_astream_retries_rate_limited():
+    events = [f"data: {json.dumps({'choices': [{'delta': {'content': 'Hi'}}]})}\n"]
+    server = MockAPIServer(
+        {"/v1/chat/completions": [*events, "data: [DONE]"]},
+        failures=[(429, {"retry-after-ms": "10"})],
+    )
+
+    async def stream():
+        async with server.serve():
+            openai_llm = OpenAI(
+                model="test-model",
+                api_key="sk-xxx",
+                url=f"{server.url}/v1/chat/completions",
+                rate_limiter=RateLimiter(RateLimit()),
+            )
+            return await _collect_stream(openai_llm, "What is the meaning of life?")
+
+    assert asyncio.run(stream()) == ["Hi"]
+    assert len(server.requests) == 2
+
+
+def test_openai_astream_settles_tokens(mocker):
+    """Test that a streamed call corrects its estimated tokens with an estimate of the
+    tokens of the prompt and the streamed response."""
+    chunks = ["Hello", ", world!"]
+    events = [
+        f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n"
+        for chunk in chunks
+    ]
+    server = MockAPIServer({"/v1/chat/completions": [*events, "data: [DONE]"]})
+    rate_limiter = RateLimiter(RateLimit(tokens_per_minute=10_000))
+    settle = mocker.spy(rate_limiter, "settle")
+    prompt = "What is the meaning of life?"
+
+    async def stream():
+        async with server.serve():
+            openai_llm = OpenAI(
+                model="test-model",
+                api_key="sk-xxx",
+                url=f"{server.url}/v1/chat/completions",
+                rate_limiter=rate_limiter,
+            )
+            try:
+                return await _collect_stream(openai_llm, prompt)
+            finally:
+                await openai_llm.sessions.close()
+
+    assert asyncio.run(stream()) == chunks
+    settle.assert_called_once_with(
+        estimate_tokens(prompt) + ESTIMATED_RESPONSE_TOKENS,
+        estimate_tokens(prompt) + estimate_tokens("".join(chunks)),
+    )
+
+
+@pytest.fixture
+def response_cache(tmp_path):
+    response_cache = ResponseCache(path=tmp_path / "responses.sqlite3")
+    yield response_cache
+    response_cache.close()
+
+
+def test_cached_llm_call(response_cache):
+    llm = CountingLLM()
+    cached_llm = CachedLLM(llm, response_cache)
+
+    assert cached_llm("Prompt") == "Response 1 to Prompt"
+    assert cached_llm("Prompt") == "Response 1 to Prompt"
+    assert asyncio.run(cached_llm.acall("Prompt")) == "Response 1 to Prompt"
+    assert cached_llm("Other prompt") == "Response 2 to Other prompt"
+    assert llm.n_times_called == 2
+
+
+def test_cached_llm_astream(response_cache):
+    llm = CountingLLM()
+    cached_llm = CachedLLM(llm, response_cache)
+
+    async def stream():
+        return [chunk async for chunk in cached_llm.astream("Prompt")]
+
+    assert asyncio.run(stream()) == [
+        "Response",
+        " 1",
+        " to",
+        " Prompt",
+    ]
+    # The cached response is a single chunk
+    assert asyncio.run(stream()) == ["Response 1 to Prompt"]
+    assert llm.n_times_called == 1
+
+
+def test_cached_llm_does_not_cache_errors(response_cache):
+    llm = CountingLLM(error=LLMError("Mock error"))
+    cached_llm = CachedLLM(llm, response_cache)
+
+    for _ in range(2):
+        with pytest.raises(LLMError):
+            asyncio.run(cached_llm.acall("Prompt"))
+
+    assert llm.n_times_called == 2
+    assert len(response_cache) == 0
+
+
+def test_circuit_breaker_opens_and_closes(mocker):
+    breaker = CircuitBreaker(
+        "test", CircuitBreakerConfig(min_calls=2, window=4, open_seconds=30)
+    )
+    mock_time = mocker.patch("phrasify.llms.fallback.time.monotonic", return_value=0)
+
+    breaker.record_success(1.0)
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+    assert not breaker.allow_call()
+
+    mock_time.return_value = 30
+    assert breaker.state is CircuitState.HALF_OPEN
+    assert breaker.allow_call()
+    # Only one trial call at a time
+    assert not breaker.allow_call()
+
+    breaker.record_failure()
+    assert breaker.state is CircuitState.OPEN
+
+    mock_time.return_value = 60
+    assert breaker.allow_call()
+    breaker.record_success(1.0)
+    assert breaker.state is CircuitState.CLOSED
+
+
+def test_circuit_breaker_counts_slow_calls():
+    breaker = CircuitBreaker(
+        "test", CircuitBreakerConfig(min_calls=2, slow_call_seconds=5.0)
+    )
+
+    breaker.record_success(1.0)
+    assert breaker.state is CircuitState.CLOSED
+    breaker.record_success(10.0)
+    assert breaker.state is CircuitState.OPEN
+
+
+def test_circuit_breaker_cancelled_trial_call(mocker):
+    breaker = CircuitBreaker("test", CircuitBreakerConfig(min_calls=1))
+    mock_time = mocker.patch("phrasify.llms.fallback.time.monotonic", return_value=0)
+    breaker.record_failure()
+
+    mock_time.return_value = 60
+    assert breaker.allow_call()
+    breaker.record_cancelled()
+    assert breaker.allow_call()
+
+
+@pytest.fixture
+def fallback_llms():
+    failing_llm = CountingLLM(error=LLMError("Mock error"))
+    llm = CountingLLM()
+    breakers = [
+        CircuitBreaker(name, CircuitBreakerConfig(min_calls=2))
+        for name in ("failing", "healthy")
+    ]
+    return failing_llm, llm, FallbackLLM([failing_llm, llm], breakers=breakers)
+
+
+def test_fallback_llm_skips_unhealthy_llm(fallback_llms):
+    failing_llm, _, fallback_llm = fallback_llms
+
+    responses = [fallback_llm(f"Prompt {i}") for i in range(3)]
+    responses.append(asyncio.run(fallback_llm.acall("Prompt 3")))
+
+    assert responses == [f"Response {i + 1} to Prompt {i}" for i in range(4)]
+    # The failing LLM is skipped once its circuit is open
+    assert failing_llm.n_times_called == 2
+    assert fallback_llm.breakers[0].state is CircuitState.OPEN
+    assert fallback_llm.model == "counting,counting"
+
+
+def test_fallback_llm_astream(fallback_llms):
+    failing_llm, _, fallback_llm = fallback_llms
+
+    async def stream():
+        return [chunk async for chunk in fallback_llm.astream("Prompt")]
+
+    assert asyncio.run(stream()) == ["Response", " 1", " to", " Prompt"]
+    assert failing_llm.n_times_called == 1
+
+
+def test_fallback_llm_all_failed():
+    fallback_llm = FallbackLLM(
+        [CountingLLM(error=LLMError("Mock error")) for _ in range(2)]
+    )
+
+    with pytest.raises(LLMError, match="All LLMs failed"):
+        fallback_llm("Prompt")
+    with pytest.raises(LLMError, match="All LLMs failed"):
+        asyncio.run(fallback_llm.acall("Prompt"))
+
+
+def test_fallback_llm_connection_refused():
+    refusing_llm = Ollama(url=get_closed_url(), model="test-model")
+    llm = CountingLLM()
+    breakers = [
+        CircuitBreaker(name, CircuitBreakerConfig(min_calls=2))
+        for name in ("refusing", "healthy")
+    ]
+    fallback_llm = FallbackLLM([refusing_llm, llm], breakers=breakers)
+
+    async def acall():
+        try:
+            return await fallback_llm.acall("Prompt 1")
+        finally:
+            await refusing_llm.sessions.close()
+
+    responses = [fallback_llm("Prompt 0"), asyncio.run(acall())]
+
+    assert responses == ["Response 1 to Prompt 0", "Response 2 to Prompt 1"]
+    assert fallback_llm.breakers[0].state is CircuitState.OPEN
+
+
+def test_fallback_llm_raises_unexpected_error():
+    fallback_llm = FallbackLLM([CountingLLM(error=ValueError("Bug")), CountingLLM()])
+
+    with pytest.raises(ValueError, match="Bug"):
+        fallback_llm("Prompt")
+    assert fallback_llm.llms[1].n_times_called == 0
+
+
+def test_ollama_pool_balances_calls():
+    servers = [
+        MockAPIServer({"/api/generate": {"response": f"Server {i}"}}, delay=0.05)
+        for i in range(2)
+    ]
+
+    async def call_concurrently():
+        async with servers[0].serve(), servers[1].serve():
+            pool = OllamaPool(
+                [server.url for server in servers],
+                model="test-model",
+                strategy="least-outstanding",
+            )
+            try:
+                return await asyncio.gather(
+                    *(pool.acall(f"Prompt {i}") for i in range(4))
+                )
+            finally:
+                await pool.sessions.close()
+
+    responses = asyncio.run(call_concurrently())
+
+    assert sorted(responses) == ["Server 0", "Server 0", "Server 1", "Server 1"]
+    assert [len(server.requests) for server in servers] == [2, 2]
+
+
+def test_ollama_pool_ewma_balances_concurrent_calls():
+    servers = [
+        MockAPIServer({"/api/generate": {"response": f"Server {i}"}}, delay=0.05)
+        for i in range(2)
+    ]
+
+    async def call_concurrently():
+        async with servers[0].serve(), servers[1].serve():
+            pool = OllamaPool(
+                [server.url for server in servers], model="test-model", strategy="ewma"
+            )
+            pool.endpoints[0].latency = 0.05
+            try:
+                return await asyncio.gather(
+                    *(pool.acall(f"Prompt {i}") for i in range(4))
+                )
+            finally:
+                await pool.sessions.close()
+
+    responses = asyncio.run(call_concurrently())
+
+    # The server without a latency yet doesn't get all calls in progress
+    assert sorted(responses) == ["Server 0", "Server 0", "Server 1", "Server 1"]
+    assert [len(server.requests) for server in servers] == [2, 2]
+
+
+def test_ollama_pool_prior_latency():
+    pool = OllamaPool(["http://a:11434", "http://b:11434", "http://c:11434"])
+    endpoints = pool.endpoints
+    endpoints[0].latency = 1.0
+    endpoints[0].n_outstanding = 1
+    endpoints[1].latency = 3.0
+    endpoints[2].n_outstanding = 1
+
+    # Scores: 1 * 2 = 2, 3 * 1 = 3 and the mean latency 2 * 2 = 4
+    assert pool._acquire(set()) is endpoints[0]
+    assert pool._acquire({endpoints[0]}) is endpoints[1]
+    assert pool._acquire({endpoints[0], endpoints[1]}) is endpoints[2]
+
+
+def test_ollama_pool_routes_on_latency():
+    pool = OllamaPool(["http://a:11434", "http://b:11434", "http://c:11434"])
+    endpoints = pool.endpoints
+    endpoints[0].latency = 2.0
+    endpoints[1].latency = 1.0
+    endpoints[1].n_outstanding = 2
+    endpoints[2].latency = 4.0
+
+    # Scores: 2 * 1 = 2, 1 * 3 = 3 and 4 * 1 = 4
+    assert pool._acquire(set()) is endpoints[0]
+    assert pool._acquire(set()) is endpoints[1]
+    assert pool._acquire({endpoints[0], endpoints[1]}) is endpoints[2]
+    assert pool._acquire(set(endpoints)) is None
+
+
+def test_ollama_pool_fails_over_and_evicts():
+    server = MockAPIServer({"/api/generate": {"response": "Hello, world!"}})
+    closed_url = get_closed_url()
+
+    async def call_three_times():
+        async with server.serve():
+            pool = OllamaPool(
+                [closed_url, server.url], model="test-model", max_failures=1
+            )
+            try:
+                responses = [await pool.acall(f"Prompt {i}") for i in range(3)]
+                return pool, responses
+            finally:
+                await pool.sessions.close()
+
+    pool, responses = asyncio.run(call_three_times())
+
+    assert responses == ["Hello, world!"] * 3
+    assert len(server.requests) == 3
+    assert [endpoint.healthy for endpoint in pool.endpoints] == [False, True]
+    assert [endpoint.n_outstanding for endpoint in pool.endpoints] == [0, 0]
+
+
+def test_ollama_pool_call_fails_over():
+    server = MockAPIServer({"/api/generate": {"response": "Hello, world!"}})
+
+    with server.serve_sync():
+        pool = OllamaPool([get_closed_url(), server.url], model="test-model")
+        assert [pool("Prompt") for _ in range(2)] == ["Hello, world!"] * 2
+
+    assert pool.endpoints[0].n_failures >= 1
+
+
+def test_ollama_pool_all_failed():
+    pool = OllamaPool([get_closed_url(), get_closed_url()], model="test-model")
+
+    with pytest.raises(LLMError, match="All Ollama servers failed"):
+        pool("Prompt")
+
+
+def test_ollama_pool_health_checks():
+    server = MockAPIServer({"/api/tags": {"models": []}})
+    closed_url = get_closed_url()
+
+    async def check_health():
+        async with server.serve():
+            pool = OllamaPool([closed_url, server.url], model="test-model")
+            pool.endpoints[1].healthy = False
+            try:
+                await pool.check_health()
+            finally:
+                await pool.sessions.close()
+            return pool
+
+    pool = asyncio.run(check_health())
+
+    assert [endpoint.healthy for endpoint in pool.endpoints] == [False, True]
+
+
+def test_ollama_pool_invalid_strategy():
+    with pytest.raises(ValueError, match="Invalid balancing strategy"):
+        OllamaPool(["http://localhost:11434"], strategy="random")
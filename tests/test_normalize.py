@@ -0,0 +1,40 @@
+import pytest
+
+from phrasify.card import TranslationCard
+from phrasify.normalize import CardNormalizer
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["friend", "friend&nbsp;", "<b>friend</b>", " friend\n", "<span>fr</span>iend"],
+)
+def test_card_normalizer_merges_markup(text):
+    assert CardNormalizer().normalize_text(text) == "friend"
+
+
+def test_card_normalizer_keeps_words_apart():
+    normalizer = CardNormalizer()
+
+    assert normalizer.normalize_text("to<br>give") == "to give"
+    assert normalizer.normalize_text("<div>to</div><div>give</div>") == "to give"
+    assert normalizer.normalize_text("bread &amp; butter") == "bread & butter"
+    assert normalizer.normalize_text("1 &lt; 2") == "1 < 2"
+
+
+def test_card_normalizer_lowercase():
+    assert CardNormalizer().normalize_text("Friend") == "Friend"
+    assert CardNormalizer(lowercase=True).normalize_text("Friend ") == "friend"
+
+
+def test_card_normalizer_normalizes_card():
+    card = TranslationCard(source="<i>love</i>&nbsp;", target="любов ")
+
+    assert CardNormalizer()(card) == TranslationCard(source="love", target="любов")
+
+
+def test_card_normalizer_from_config():
+    assert CardNormalizer.from_config(None) is None
+    assert CardNormalizer.from_config({}) == CardNormalizer()
+    assert CardNormalizer.from_config(
+        {"stripHtml": False, "lowercase": True}
+    ) == CardNormalizer(strip_html=False, lowercase=True)
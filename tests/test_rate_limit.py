@@ -0,0 +1,131 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from phrasify.rate_limit import (
+    RateLimit,
+    RateLimiter,
+    TokenBucket,
+    estimate_tokens,
+    parse_duration,
+    parse_retry_after,
+)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+@pytest.mark.parametrize(
+    ("duration", "seconds"),
+    [("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02), ("1h2m3.5s", 3723.5), ("", None)],
+)
+def test_parse_duration(duration, seconds):
+    assert parse_duration(duration) == pytest.approx(seconds)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({}) is None
+    assert parse_retry_after({"retry-after": "2"}) == 2.0
+    assert parse_retry_after({"retry-after-ms": "1500", "retry-after": "2"}) == 1.5
+    assert parse_retry_after({"retry-after": "soon"}) is None
+
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    retry_after = parse_retry_after({"retry-after": format_datetime(retry_at)})
+    assert 25 < retry_after <= 30
+
+
+def test_rate_limit_from_config():
+    assert RateLimit.from_config(None) is None
+    assert RateLimit.from_config({}) == RateLimit()
+    assert RateLimit.from_config(
+        {"requestsPerMinute": 60, "tokensPerMinute": 1000, "maxRetries": 2}
+    ) == RateLimit(requests_per_minute=60, tokens_per_minute=1000, max_retries=2)
+
+
+def test_token_bucket_schedules_in_order():
+    bucket = TokenBucket(rate=10, capacity=20)
+    now = time.monotonic()
+
+    assert bucket.take(20, now) == 0.0
+    # The bucket goes into debt, so every taker waits for the ones before it
+    assert bucket.take(5, now) == pytest.approx(0.5)
+    assert bucket.take(5, now) == pytest.approx(1.0)
+    # The tokens are refilled over time
+    assert bucket.take(10, now + 2.0) == 0.0
+    assert bucket.take(10, now + 2.0) == pytest.approx(1.0)
+
+    bucket.give_back(10)
+    assert bucket.take(0, now + 2.0) == 0.0
+
+
+def test_token_bucket_drain():
+    bucket = TokenBucket(rate=10, capacity=20)
+    now = time.monotonic()
+
+    bucket.drain(now)
+    assert bucket.take(10, now) == pytest.approx(1.0)
+
+
+def test_rate_limiter_reserve():
+    rate_limiter = RateLimiter(RateLimit(requests_per_minute=2, tokens_per_minute=600))
+
+    assert rate_limiter.reserve(100) == 0.0
+    assert rate_limiter.reserve(100) == 0.0
+    # Out of requests: the next one refills at 2 requests per minute
+    assert rate_limiter.reserve(100) == pytest.approx(30.0, abs=0.1)
+
+
+def test_rate_limiter_settle():
+    rate_limiter = RateLimiter(RateLimit(tokens_per_minute=600))
+
+    assert rate_limiter.reserve(600) == 0.0
+    rate_limiter.settle(600, 300)
+    assert rate_limiter.reserve(300) == 0.0
+    assert rate_limiter.reserve(60) == pytest.approx(6.0, abs=0.1)
+
+
+def test_rate_limiter_without_limits():
+    rate_limiter = RateLimiter(RateLimit())
+
+    assert all(rate_limiter.reserve(10_000) == 0.0 for _ in range(100))
+
+
+def test_rate_limiter_update_from_headers():
+    rate_limiter = RateLimiter(RateLimit(requests_per_minute=100))
+
+    rate_limiter.update_from_headers(
+        {"x-ratelimit-remaining-requests": "5", "x-ratelimit-reset-requests": "10s"}
+    )
+    assert rate_limiter.reserve(1) == 0.0
+
+    rate_limiter.update_from_headers(
+        {"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "10s"}
+    )
+    assert rate_limiter.reserve(1) == pytest.approx(10.0, abs=0.1)
+
+
+def test_rate_limiter_get_retry_delay():
+    rate_limiter = RateLimiter(RateLimit(initial_backoff=1.0, max_backoff=4.0))
+
+    assert rate_limiter.get_retry_delay(0, {"retry-after": "20"}) == 20.0
+    for attempt in range(5):
+        delay = rate_limiter.get_retry_delay(attempt, {})
+        assert 0.0 <= delay <= min(2**attempt, 4.0)
+
+
+def test_rate_limiter_aacquire_spreads_requests():
+    rate_limiter = RateLimiter(RateLimit(tokens_per_minute=6000))
+    rate_limiter.reserve(6000)  # Empty the bucket, which refills 10 tokens per 0.1s
+
+    async def acquire_three_times():
+        start = time.monotonic()
+        await asyncio.gather(*(rate_limiter.aacquire(10) for _ in range(3)))
+        return time.monotonic() - start
+
+    assert asyncio.run(acquire_three_times()) == pytest.approx(0.3, abs=0.1)
@@ -0,0 +1,125 @@
+import asyncio
+import gc
+
+from phrasify.card_gen import get_file_lock, get_file_tasks
+from phrasify.registry import BoundedRegistry
+
+
+class Value:
+    """Value that can be weakly referenced and marked as being in use."""
+
+    def __init__(self, key):
+        self.key = key
+        self.in_use = False
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bounded_registry_returns_same_value():
+    registry = BoundedRegistry(Value, maxsize=2)
+
+    assert registry("a") is registry("a")
+    assert registry.cache_info().hits == 1
+    assert registry.cache_info().misses == 1
+
+
+def test_bounded_registry_evicts_least_recently_used():
+    registry = BoundedRegistry(lambda key: [key], maxsize=2)
+    value_a = registry("a")
+    registry("b")
+    registry("a")
+    registry("c")
+
+    assert len(registry) == 2
+    assert "a" in registry
+    assert "b" not in registry
+    assert registry("a") is value_a
+    assert registry.cache_info().evictions == 1
+
+
+def test_bounded_registry_size_stays_flat():
+    registry = BoundedRegistry(lambda key: [key], maxsize=10)
+    for i in range(1000):
+        registry(i)
+
+    assert len(registry) == 10
+    assert registry.cache_info().currsize == 10
+
+
+def test_bounded_registry_does_not_evict_values_in_use():
+    registry = BoundedRegistry(Value, maxsize=1, in_use=lambda value: value.in_use)
+    value_a = registry("a")
+    value_a.in_use = True
+    registry("b")
+
+    assert "a" in registry
+    assert "b" in registry
+
+    value_a.in_use = False
+    registry.evict()
+
+    assert "a" not in registry
+    assert "b" in registry
+
+
+def test_bounded_registry_ttl():
+    clock = FakeClock()
+    registry = BoundedRegistry(lambda key: [key], maxsize=10, ttl=10.0, clock=clock)
+    registry("a")
+    clock.now = 5.0
+    registry("b")
+    clock.now = 12.0
+
+    assert registry.evict() == 1
+    assert "a" not in registry
+    assert "b" in registry
+
+
+def test_bounded_registry_keeps_referenced_values():
+    """Test that an evicted value is given back as long as it is still referenced."""
+    registry = BoundedRegistry(Value, maxsize=1)
+    value_a = registry("a")
+    registry("b")
+
+    assert "a" not in registry
+    assert registry("a") is value_a
+
+    registry("b")
+    del value_a
+    gc.collect()
+    n_misses = registry.cache_info().misses
+    registry("a")
+
+    assert registry.cache_info().misses == n_misses + 1
+
+
+def test_get_file_lock_and_tasks_are_shared_per_key():
+    async def get_locks_and_tasks():
+        assert get_file_lock("test-key") is get_file_lock("test-key")
+        assert get_file_lock("test-key") is not get_file_lock("other-key")
+        assert get_file_tasks("test-key") is get_file_tasks("test-key")
+
+    asyncio.run(get_locks_and_tasks())
+
+
+def test_get_file_lock_is_not_evicted_while_locked():
+    registry = BoundedRegistry(
+        lambda key: asyncio.Lock(),  # noqa: ARG005
+        maxsize=1,
+        in_use=lambda lock: lock.locked(),
+    )
+
+    async def lock_and_fill():
+        lock = registry("locked")
+        async with lock:
+            for i in range(10):
+                registry(i)
+            return "locked" in registry
+
+    assert asyncio.run(lock_and_fill())
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from phrasify.card import TranslationCard
+from phrasify.error import CardGenerationError
+from phrasify.singleflight import SingleFlight, SingleFlightCardGenerator
+
+from .mocks import CountingCardGenerator, ErrorCardGenerator
+
+
+@pytest.fixture
+def card():
+    return TranslationCard(source="friend", target="друг")
+
+
+def test_single_flight_merges_concurrent_calls():
+    flight = SingleFlight()
+    n_calls = 0
+
+    async def call(value):
+        nonlocal n_calls
+        n_calls += 1
+        await asyncio.sleep(0.01)
+        return value
+
+    async def call_concurrently():
+        return await asyncio.gather(
+            flight.do("a", lambda: call(1)),
+            flight.do("a", lambda: call(2)),
+            flight.do("b", lambda: call(3)),
+        )
+
+    assert asyncio.run(call_concurrently()) == [1, 1, 3]
+    assert n_calls == 2
+    assert (flight.n_calls, flight.n_coalesced) == (3, 1)
+    assert flight.coalesce_rate == pytest.approx(1 / 3)
+    assert len(flight) == 0
+
+
+def test_single_flight_does_not_merge_sequential_calls():
+    flight = SingleFlight()
+
+    async def call(value):
+        return value
+
+    async def call_sequentially():
+        return [await flight.do("a", lambda v=v: call(v)) for v in range(2)]
+
+    assert asyncio.run(call_sequentially()) == [0, 1]
+    assert flight.n_coalesced == 0
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        message = "Mock error"
+        raise ValueError(message)
+
+    async def call_concurrently():
+        return await asyncio.gather(
+            flight.do("a", fail), flight.do("a", fail), return_exceptions=True
+        )
+
+    errors = asyncio.run(call_concurrently())
+
+    assert [type(error) for error in errors] == [ValueError, ValueError]
+    assert flight.n_coalesced == 1
+
+
+def test_single_flight_cancels_when_all_callers_cancelled():
+    flight = SingleFlight()
+    started = []
+
+    async def call():
+        started.append(True)
+        await asyncio.sleep(10)
+
+    async def cancel_callers():
+        callers = [asyncio.create_task(flight.do("a", call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        callers[0].cancel()
+        await asyncio.sleep(0.01)
+        # The other caller still waits for the call
+        assert len(flight) == 1
+        callers[1].cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return len(flight)
+
+    assert asyncio.run(cancel_callers()) == 0
+    assert started == [True]
+
+
+def test_single_flight_card_generator(card):
+    card_generator = CountingCardGenerator(n_cards=2, sleep_interval=0.01)
+    flight = SingleFlight()
+    generators = [
+        SingleFlightCardGenerator(card_generator, flight, key=key)
+        for key in ("config 1", "config 1", "config 2")
+    ]
+
+    async def call_concurrently():
+        return await asyncio.gather(
+            *(generator.acall(card) for generator in generators),
+            generators[0].acall(card, n_cards=1),
+        )
+
+    cards = asyncio.run(call_concurrently())
+
+    assert cards[0] == cards[1]
+    assert cards[0] is not cards[1]
+    assert [len(cards_i) for cards_i in cards] == [2, 2, 2, 1]
+    assert card_generator.n_times_called == 3
+
+
+def test_single_flight_card_generator_error(card):
+    generator = SingleFlightCardGenerator(
+        ErrorCardGenerator(CardGenerationError("Mock error")), SingleFlight()
+    )
+
+    with pytest.raises(CardGenerationError):
+        asyncio.run(generator.acall(card))
+
+
+def test_single_flight_card_generator_astream(card):
+    """Test that the streamed cards are those of the card generator, also if it
+    can't stream."""
+    card_generator = CountingCardGenerator(n_cards=2)
+    generator = SingleFlightCardGenerator(card_generator, SingleFlight())
+
+    async def collect():
+        return [new_card async for new_card in generator.astream(card)]
+
+    cards = asyncio.run(collect())
+
+    assert len(cards) == 2
+    assert card_generator.n_times_called == 1